@@ -7,11 +7,12 @@ from datetime import datetime
 import sys
 sys.path.append("/home/rno-g/flowerpy")
 
+from result_store import ResultStore, store_path, server_args
 from utils import get_peak2peak, get_coinc_rate
 
 HOST = ''
 PORT = 9000
-JSON_FILE = "full_scan_2Filters_08_04_plane_HiLo.json"
+JSON_FILE, RESUME = server_args("full_scan_2Filters_08_04_plane_HiLo.json")  # output JSON: first command-line argument; --resume continues its stored results
 RATE = 1000  # normalization constant
 
 def run_peak_to_peak_analysis(angle_deg, att_code, percent):
@@ -26,25 +27,24 @@ def run_peak_to_peak_analysis(angle_deg, att_code, percent):
         "efficiency": coinc / RATE
     }
 
-def save_report(results):
-    with open(JSON_FILE, 'w') as f:
-        json.dump(results, f, indent=2)
-
-def handle_command(cmd, reports=None):
-    if reports is None:
-        reports = []
-
+def handle_command(cmd, store):
     try:
         angle_deg, att_code, percent, run_name = cmd.strip().split(',')
         angle_deg = float(angle_deg)
         att_code = float(att_code)
         percent = float(percent)
 
+        # a restarted scan gets the stored result back instead of measuring again
+        if run_name in store:
+            report = store.get(run_name)
+            print(f"[SKIP] {run_name} already stored")
+            return f"Efficiency = {report['efficiency']:.4f} recorded"
+
         print(f"[RUN ] angle {angle_deg}°, att_code {att_code}, {percent:.1f}%")
 
         report = run_peak_to_peak_analysis(angle_deg, att_code, percent)
         report["run_name"] = run_name
-        reports.append(report)
+        store.append(report)
 
         reply = f"Efficiency = {report['efficiency']:.4f} recorded"
 
@@ -52,7 +52,7 @@ def handle_command(cmd, reports=None):
         reply = f"[ERROR] Failed to parse or run: {e}"
         print(reply)
 
-    return reports, reply
+    return reply
 
 def main():
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -61,20 +61,25 @@ def main():
         s.listen(1)
         print(f"[FLOWER] Waiting on port {PORT} …")
 
+        # every result is appended to <JSON_FILE stem>.jsonl right away; the
+        # JSON is written from it at the end (or: python result_store.py <file>.jsonl).
+        # Without --resume an existing store is moved aside, so old results are never replayed
+        store = ResultStore(store_path(JSON_FILE), fresh=not RESUME)
         conn, addr = s.accept()
         with conn:
             print(f"[FLOWER] Connected by {addr}")
-            reports = []
-            while True:
-                data = conn.recv(1024)
-                if not data:
-                    break
-                cmd = data.decode().strip()
-                reports, msg = handle_command(cmd, reports)
-                conn.sendall(msg.encode())
-
-            save_report(reports)
-            print("[FLOWER] Scan complete. Results saved.")
+            try:
+                while True:
+                    data = conn.recv(1024)
+                    if not data:
+                        break
+                    cmd = data.decode().strip()
+                    msg = handle_command(cmd, store)
+                    conn.sendall(msg.encode())
+            finally:
+                store.close()
+                store.export_json(JSON_FILE)
+                print(f"[FLOWER] Scan complete. {store.n_records} results saved to {JSON_FILE}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,157 @@
+import sys
+import json
+import time
+import struct
+import socket
+from pathlib import Path
+
+import numpy as np
+
+# Binary container for captured FLOWER events (.evt).
+#
+#   bytes 0 .. 511    header: struct HEADER_FORMAT (little endian), followed by
+#                     a JSON object with the capture metadata, zero padded
+#   bytes 512 ..      events: (n_events, n_channels, n_samples) uint8, raw ADC
+#                     counts as read from the RAM (pedestal ≈ 127)
+#   after the events  when: (n_events,) float64 unix time of every readout
+#
+# The event block is at a fixed offset, so analysis code memory-maps it with
+# load_events() and never parses the samples. Events are streamed to the file
+# while they are read; n_events and the times are written by close(). A file
+# whose capture was interrupted still loads: its complete events are used and
+# `when` is None.
+#
+#   python event_capture.py capture.evt [legacy.json]    -> legacy events JSON
+
+MAGIC = b"NUDLEVT1"
+VERSION = 1
+HEADER_SIZE = 512
+HEADER_FORMAT = "<8sHHIQhxxdI"  # magic, version, n_channels, n_samples, n_events, pedestal, start_time, meta length
+N_CHANNELS = 4
+PEDESTAL = 127
+
+
+class EventWriter:
+    """
+    Streams RAM readouts into an .evt file.
+
+    Usage:
+        with EventWriter("capture.evt", n_samples=256, meta={"trigger_type": "COINC"}) as writer:
+            writer.write(block, when)       # block: (k, 4, n_samples), when: (k,) times
+    """
+
+    def __init__(self, path, n_samples, n_channels=N_CHANNELS, pedestal=PEDESTAL, meta=None):
+        self.path = Path(path)
+        self.n_channels = n_channels
+        self.n_samples = n_samples
+        self.pedestal = pedestal
+        self.meta = dict({"hostname": socket.gethostname()}, **(meta or {}))
+        self.start_time = time.time()
+        self.n_events = 0
+        self._when = []
+        self._file = open(self.path, "wb")
+        self._file.write(self._header())
+
+    def _header(self):
+        meta = json.dumps(self.meta).encode()
+        header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, self.n_channels, self.n_samples, self.n_events,
+                             self.pedestal, self.start_time, len(meta)) + meta
+        if len(header) > HEADER_SIZE:
+            raise ValueError(f"capture metadata too long for the {HEADER_SIZE}-byte header")
+        return header.ljust(HEADER_SIZE, b"\0")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, block, when=None):
+        """Append events, shape (k, n_channels, n_samples) with values 0–255."""
+        block = np.asarray(block)
+        if block.shape[1:] != (self.n_channels, self.n_samples):
+            raise ValueError(f"expected events of shape (k, {self.n_channels}, {self.n_samples}), got {block.shape}")
+        self._file.write(block.astype(np.uint8, copy=False).tobytes())
+        self._file.flush()
+        k = block.shape[0]
+        self._when.extend(np.full(k, np.nan) if when is None else np.asarray(when, dtype=float)[:k])
+        self.n_events += k
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.write(np.asarray(self._when, dtype="<f8").tobytes())
+        self._file.seek(0)
+        self._file.write(self._header())
+        self._file.close()
+
+
+def read_header(path):
+    """Header fields and metadata of an .evt file."""
+    with open(path, "rb") as f:
+        raw = f.read(HEADER_SIZE)
+    size = struct.calcsize(HEADER_FORMAT)
+    magic, version, n_channels, n_samples, n_events, pedestal, start_time, meta_len = struct.unpack(
+        HEADER_FORMAT, raw[:size])
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a FLOWER event capture")
+    return {"version": version, "n_channels": n_channels, "n_samples": n_samples, "n_events": n_events,
+            "pedestal": pedestal, "start_time": start_time,
+            "meta": json.loads(raw[size:size + meta_len] or b"{}")}
+
+
+def load_events(path, mmap=True):
+    """
+    Events of an .evt file.
+
+    Returns a dict with "events", (n_events, n_channels, n_samples) uint8,
+    memory-mapped unless mmap=False; "when", (n_events,) float64 or None for
+    an interrupted capture; and the header fields of read_header.
+    """
+    header = read_header(path)
+    event_size = header["n_channels"] * header["n_samples"]
+    n_events, complete = header["n_events"], True
+    if n_events == 0:
+        # not closed: use the complete events that made it to disk
+        n_events = (Path(path).stat().st_size - HEADER_SIZE) // event_size
+        complete = False
+    shape = (n_events, header["n_channels"], header["n_samples"])
+
+    if mmap and n_events:
+        events = np.memmap(path, dtype=np.uint8, mode="r", offset=HEADER_SIZE, shape=shape)
+    else:
+        events = np.fromfile(path, dtype=np.uint8, count=n_events * event_size,
+                             offset=HEADER_SIZE).reshape(shape)
+    when = None
+    if complete:
+        when = np.fromfile(path, dtype="<f8", count=n_events, offset=HEADER_SIZE + n_events * event_size)
+    return dict(header, n_events=n_events, events=events, when=when)
+
+
+def to_legacy_json(path, json_file=None, subtract_pedestal=True):
+    """
+    Write an .evt capture in the JSON layout of the alignment_test_* /
+    sample_events_* files ({"hostname", "events": [{"ch0": [...], ...}]}).
+    Samples are pedestal subtracted, as in those files, unless
+    subtract_pedestal=False. Returns the JSON path.
+    """
+    data = load_events(path)
+    json_file = Path(json_file) if json_file else Path(path).with_suffix(".json")
+    offset = data["pedestal"] if subtract_pedestal else 0
+    trigger_type = data["meta"].get("trigger_type")
+    events = []
+    for i, event in enumerate(data["events"]):
+        entry = {"force": trigger_type == "FORCE",
+                 "when": float(data["when"][i]) if data["when"] is not None else None,
+                 "metadata": {"event_counter": i, "trigger_type": trigger_type}}
+        for ch, wave in enumerate(event.astype(np.int16) - offset):
+            entry[f"ch{ch}"] = wave.tolist()
+        events.append(entry)
+    with open(json_file, "w") as f:
+        json.dump({"hostname": data["meta"].get("hostname"), "events": events}, f)
+    return json_file
+
+
+if __name__ == "__main__":
+    out = to_legacy_json(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    print(f"[EVT ] {sys.argv[1]} -> {out}")
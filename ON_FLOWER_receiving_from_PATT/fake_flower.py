@@ -0,0 +1,132 @@
+import time
+import numpy as np
+
+# In-memory stand-ins for flowerpy's flower.Flower and flower_trig.FlowerTrig,
+# with the calls the scan code uses. The trigger scalers follow a binomial
+# model around a settable efficiency, drawn once per scaler gate, and the RAM holds pedestal + Gaussian
+# noise (+ a pulse on triggered reads), so the server, the settle detection
+# and the scans can run and be timed without a board.
+
+COINC_SCALER = 3
+PHASED_SCALER = 18
+
+
+class FakeFlowerTrig:
+    """
+    Parameters
+    ----------
+    efficiency : float
+        Trigger efficiency of the enabled trigger.
+    pulser_rate : float
+        Pulses per scaler gate.
+    noise_rate : float
+        Mean noise triggers per scaler gate (Poisson), added on top.
+    gate_s : float
+        Scaler gate. As on the board, a reading returns the count of the
+        last completed gate, so readings within one gate agree; 0 draws a
+        new count at every reading.
+    settle_tau_s : float
+        After set_efficiency/set_signal the board moves to the new values
+        exponentially with this time constant.
+    signal_p2p, noise_rms : float
+        ADC peak-to-peak of the pulse and RMS of the noise in the RAM.
+    latency_s : float
+        Time taken by every register access.
+    """
+
+    def __init__(self, efficiency=0.5, pulser_rate=1000, noise_rate=0.0, settle_tau_s=0.0,
+                 signal_p2p=40.0, noise_rms=5.0, latency_s=0.0, gate_s=1.0, seed=None):
+        self.pulser_rate = pulser_rate
+        self.noise_rate = noise_rate
+        self.gate_s = gate_s
+        self.settle_tau_s = settle_tau_s
+        self.noise_rms = noise_rms
+        self.latency_s = latency_s
+        self.rng = np.random.default_rng(seed)
+
+        self._old = self._new = (efficiency, signal_p2p)
+        self._changed = self._started = time.time()
+        self._gates = {}  # (scaler, enabled) -> (gate index, count of that gate)
+        self.enabled = None
+        self.scaler = None
+        self.register_accesses = 0
+
+    def _access(self):
+        self.register_accesses += 1
+        if self.latency_s:
+            time.sleep(self.latency_s)
+
+    # === model ===
+    def set_efficiency(self, efficiency, signal_p2p=None):
+        """Move the board to a new operating point (settles with settle_tau_s)."""
+        self._old = self.current()
+        self._new = (efficiency, self._new[1] if signal_p2p is None else signal_p2p)
+        self._changed = time.time()
+
+    def current(self, at=None):
+        """(efficiency, signal_p2p) at time `at` (default: now)."""
+        if self.settle_tau_s <= 0 and at is None:
+            return self._new
+        at = time.time() if at is None else at
+        if at < self._changed:
+            return self._old
+        if self.settle_tau_s <= 0:
+            return self._new
+        w = np.exp(-(at - self._changed) / self.settle_tau_s)
+        return tuple(new + (old - new) * w for old, new in zip(self._old, self._new))
+
+    # === FlowerTrig calls ===
+    def trigEnable(self, coinc_trig=0, phased_trig=0, **kwargs):
+        self._access()
+        self.enabled = "phased" if phased_trig else "coinc" if coinc_trig else None
+
+    def setScalerOut(self, scaler):
+        self._access()
+        self.scaler = scaler
+
+    def readSingleScaler(self):
+        self._access()
+        key = (self.scaler, self.enabled)
+        if self.gate_s <= 0:
+            return [self._gate_count(key, None)]
+        gate = int((time.time() - self._started) // self.gate_s) - 1   # last completed gate
+        if self._gates.get(key, (None,))[0] != gate:
+            # efficiency in the middle of that gate
+            self._gates[key] = (gate, self._gate_count(key, self._started + (gate + 0.5) * self.gate_s))
+        return [self._gates[key][1]]
+
+    def _gate_count(self, key, at):
+        count = self.rng.poisson(self.noise_rate) if self.noise_rate else 0
+        if key in ((COINC_SCALER, "coinc"), (PHASED_SCALER, "phased")):
+            efficiency = min(max(self.current(at)[0], 0.0), 1.0)
+            count += self.rng.binomial(self.pulser_rate, efficiency)
+        return int(count)
+
+
+class FakeFlower:
+    DEV_FLOWER = 0
+
+    def __init__(self, trig, n_channels=4, pedestal=127):
+        self.trig = trig
+        self.n_channels = n_channels
+        self.pedestal = pedestal
+        self._software = False
+
+    def bufferClear(self):
+        self.trig._access()
+        self._software = False
+
+    def softwareTrigger(self):
+        self.trig._access()
+        self._software = True
+
+    def readRam(self, dev, start, n_samples):
+        self.trig._access()
+        rng = self.trig.rng
+        wave = self.pedestal + rng.normal(0, self.trig.noise_rms, (self.n_channels, n_samples))
+        if not self._software:
+            # bipolar pulse in the middle of the buffer
+            t = np.arange(n_samples) - n_samples // 2
+            pulse = np.sin(2 * np.pi * t / 8) * np.exp(-(t / 6.0) ** 2)
+            wave += self.trig.current()[1] / (pulse.max() - pulse.min()) * pulse
+        return np.clip(np.round(wave), 0, 255).astype(int).tolist()
@@ -6,11 +6,12 @@ from datetime import datetime
 import sys
 sys.path.append("/home/rno-g/flowerpy")
 
-from utils import get_peak2peak
+from result_store import ResultStore, store_path, server_args
+from utils import get_ram_stats
 
 HOST = ''
 PORT = 9000
-JSON_FILE = "getting_SNR_from_p2p_08_01_plane_hi_lo.json"
+JSON_FILE, RESUME = server_args("getting_SNR_from_p2p_08_01_plane_hi_lo.json")  # output JSON: first command-line argument; --resume continues its stored results
 
 # ----------------------------
 # Simulated Peak-to-Peak Analysis (replace with your real logic)
@@ -22,49 +23,47 @@ def run_peak_to_peak_analysis(attenuation_percent, attenuation_scale):
     #coinc = get_coinc_rate()
     time.sleep(0.01)
 
-    ptp = get_peak2peak()
+    stats = get_ram_stats()
     time.sleep(0.01)
     return {
         "attenuation_percent": attenuation_percent,
         "attenuation_scale": attenuation_scale,
         #"coincidence_rate": coinc,
-        "peak_to_peak": ptp
+        "peak_to_peak": stats["peak_to_peak"],
+        "peak_to_peak_err": stats["peak_to_peak_err"],
+        "rms": stats["rms"],
 
     }
 
-# ----------------------------
-# Append results to JSON
-# ----------------------------
-def save_report(all_reports):
-    with open(JSON_FILE, 'w') as f:
-        json.dump(all_reports, f, indent=2)
-
 # ----------------------------
 # Command handler
 # ----------------------------
-def handle_command(cmd, all_reports = None):
+def handle_command(cmd, store):
     commands = cmd.split(",")
     attenuation_percent = float(commands[2])
     run_name = str(commands[1])
     attenuation_scale = int(round(float(commands[0])))
-    if all_reports is None:
-       all_reports = []
 
-    if attenuation_percent <= 100:
+    if attenuation_percent <= 100 and run_name in store:
+        # a restarted scan does not measure the stored points again
+        print(f"[SKIP] {run_name} already stored")
+        report = store.get(run_name)
+        reply_message = f"{report['report_name']} ran successfully"
+    elif attenuation_percent <= 100:
         print(f" Running attenuation scan at {attenuation_percent}%")
 
         report = run_peak_to_peak_analysis(attenuation_percent, attenuation_scale)
         
         report["report_name"] = "The efficiency is "
-        #save_report(report)
-        all_reports.append(report)
+        report["run_name"] = run_name
+        store.append(report)
 
         reply_message = f"{report['report_name']} ran successfully"
     else:
         reply_message = "Invalid attenuation. Did not run."
         report = {}
 
-    return all_reports, reply_message
+    return reply_message
 
 # ----------------------------
 # TCP Server Loop
@@ -76,23 +75,27 @@ def main():
         s.listen(1)
         print(f"[FLOWER] Waiting for WaveSynth on port {PORT}...")
 
+        # every result is appended to <JSON_FILE stem>.jsonl right away; the
+        # JSON is written from it at the end (or: python result_store.py <file>.jsonl).
+        # Without --resume an existing store is moved aside, so old results are never replayed
+        store = ResultStore(store_path(JSON_FILE), fresh=not RESUME)
         conn, addr = s.accept()
         with conn:
             print(f"[FLOWER] Connected by {addr}")
-            #print(f"resetting json file")
-            #open(JSON_FILE, 'w').close()
 
-            all_reports = None
-            while True:
-                data = conn.recv(1024)
-                if not data:
-                    save_report(all_reports)
-                    break
-                cmd = data.decode().strip()
-                print(f"[FLOWER] Received command: {cmd}", '\n')
-                time.sleep(0.01)
-                all_reports, return_msg = handle_command(cmd, all_reports=all_reports)
-                conn.sendall(return_msg.encode())
+            try:
+                while True:
+                    data = conn.recv(1024)
+                    if not data:
+                        break
+                    cmd = data.decode().strip()
+                    print(f"[FLOWER] Received command: {cmd}", '\n')
+                    time.sleep(0.01)
+                    return_msg = handle_command(cmd, store)
+                    conn.sendall(return_msg.encode())
+            finally:
+                store.close()
+                store.export_json(JSON_FILE)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,365 @@
+import asyncio
+import json
+import time
+import sys
+import numpy as np
+from pathlib import Path
+
+from flower_session import hardware_session, fake_session, RAM_SAMPLES
+from result_store import ResultStore, store_path
+from event_capture import EventWriter
+
+# Long-running FLOWER measurement server.
+#
+# Protocol: newline-delimited JSON, one object per line in both directions.
+#   request : {"id": 7, "cmd": "measure", "mode": "coinc", "record": {...}}
+#   reply   : {"id": 7, "ok": true, "coincidence_rate": 812.3, "efficiency": 0.8123, ...}
+#             {"id": 7, "ok": false, "error": "..."}
+# Replies carry the request id and can arrive out of order: "ping" and
+# "status" are answered right away, while hardware commands go through one
+# FIFO queue shared by all clients. A client can therefore queue several
+# requests without waiting for each reply (pipelining).
+#
+# Commands:
+#   ping                                   -> {"time": ...}
+#   status                                 -> queue depth, current scan, clients
+#   start_scan  {"json_file": ..., "resume": true}
+#                                          -> saves the running scan, starts (or with
+#                                             "resume", the default, continues) a scan
+#   points      {"fields": [...]}          -> run_names already measured in the scan, with
+#                                             the requested fields of their latest record
+#   measure     {"mode": ..., "n_ave": ..., "settle_s": ..., "settle": {...}, "record": {...}}
+#                                          -> reading, stored with `record` in the scan
+#               "settle_s" waits a fixed time first; "settle": {"source": "scaler" | "p2p",
+#               "n_agree", "n_sigma", "abs_tol", "interval_s", "timeout_s", ...} polls the
+#               trigger scaler or the RAM peak-to-peak until successive readings agree
+#               (flower_session.wait_until_settled) and measures as soon as they do
+#               coinc modes with "target_err" (and optional "max_time_s", "min_reads") read the
+#               scaler until the efficiency is known to target_err (1σ); the reply
+#               then also has coincidence_rate_err, efficiency_err, n_reads (scaler gates,
+#               RATE pulses each) and n_trials
+#               p2p / noise modes reply with the full RAM statistics (peak_to_peak,
+#               rms, pedestal, percentiles, each with *_err; "percentiles" picks the
+#               levels); with "keep_raw" the (n_ave, 4, 256) readout block is saved
+#               next to the scan JSON as .npy and its path returned as raw_file
+#               combined modes take the trigger rate, the triggered-buffer statistics
+#               and the noise RMS in one visit (FlowerSession.point_stats; options
+#               "n_rate", "n_p2p", "n_noise", "target_err", "max_time_s") and reply
+#               with all of them plus snr / snr_err, in one record
+#   capture     {"n_events": ..., "trigger": "coinc" | "phased" | "force", "file": ..., "record": {...}}
+#                                          -> streams n_events raw RAM buffers to a binary .evt
+#                                             file (event_capture.py; default name
+#                                             <json stem>_events_<n>.evt) and records its path
+#   save                                   -> writes the scan JSON now
+#   end_scan                               -> writes the scan JSON and closes the scan
+#
+# All readings go through one FlowerSession, so the board handles are opened
+# once and trigger/scaler registers are only written when they change. Run
+# with --fake (or FAKE_FLOWER = True) to serve the in-memory fake board of
+# fake_flower.py instead of the hardware.
+#
+# Every record is appended to <json_file stem>.jsonl as soon as it is measured
+# (result_store.py, fsync'ed in batches), so a crash loses at most a few
+# points; the scan JSON itself is written from that file by save/end_scan.
+# A scan started again under the same json_file continues the stored records
+# and "points" tells the PATT which ones it can skip.
+#
+# The server keeps running when a client disconnects, so consecutive scans
+# (and a PATT script restarted mid-scan) do not need a server restart.
+
+HOST = ''
+PORT = 9000
+JSON_FILE = "flower_scan.json"  # used when start_scan does not name a file
+RATE = 1000  # pulses per scaler gate (1 kHz pulser, ~1 s gate), normalizes coincidence rates to efficiencies
+FSYNC_EVERY = 20  # records between fsyncs of the scan's .jsonl store
+FAKE_FLOWER = False  # serve the in-memory fake board (also: --fake)
+
+# mode -> (FlowerSession method, its options, key of the reading in the saved
+# records); methods returning a dict (RAM statistics) are merged into the
+# record instead. The keys match the older single-scan servers
+# (coincidence_rate, peak_to_peak, noise_rms) so the analysis scripts read both
+MEASUREMENTS = {
+    "coinc": ("coinc_rate", {"phased": False}, "coincidence_rate"),
+    "coinc_phased": ("coinc_rate", {"phased": True}, "coincidence_rate"),
+    "p2p": ("ram_stats", {"phased": False}, None),
+    "p2p_phased": ("ram_stats", {"phased": True}, None),
+    "noise_rms": ("noise_stats", {}, None),
+    "combined": ("point_stats", {"phased": False, "pulser_rate": RATE}, None),
+    "combined_phased": ("point_stats", {"phased": True, "pulser_rate": RATE}, None),
+}
+RAM_MODES = ("p2p", "p2p_phased", "noise_rms")   # accept "keep_raw" and "percentiles"
+COMBINED_MODES = ("combined", "combined_phased")
+COMBINED_OPTIONS = ("n_rate", "n_p2p", "n_noise", "target_err", "max_time_s", "min_reads", "interval_s", "percentiles")
+
+# modes that support an adaptive, precision-driven reading (FlowerSession.coinc_rate_adaptive)
+ADAPTIVE_MODES = {"coinc": False, "coinc_phased": True}   # mode -> phased
+
+# capture trigger -> (FlowerSession.capture_events options, trigger_type stored in the file)
+CAPTURE_TRIGGERS = {
+    "coinc": ({"phased": False}, "COINC"),
+    "phased": ({"phased": True}, "PHASED"),
+    "force": ({"software_trigger": True}, "FORCE"),
+}
+
+# settle source -> FlowerSession method(phased, **settle options) -> (settled, elapsed_s, readings)
+SETTLE_SOURCES = {
+    "scaler": "wait_for_coinc_settle",
+    "p2p": "wait_for_p2p_settle",
+}
+
+
+class Scan:
+    def __init__(self, json_file, resume=True):
+        self.json_file = json_file
+        self.store = ResultStore(store_path(json_file), fsync_every=FSYNC_EVERY, fresh=not resume)
+
+    @property
+    def n_records(self):
+        return self.store.n_records
+
+    def append(self, record):
+        self.store.append(record)
+
+    def save(self):
+        self.store.sync()
+        self.store.export_json(self.json_file)
+
+    def close(self):
+        self.save()
+        self.store.close()
+
+
+class FlowerScanServer:
+    def __init__(self, session, json_file=JSON_FILE):
+        self.session = session
+        self.default_json_file = json_file
+        self.scan = None
+        self.queue = None
+        self.clients = 0
+        self.busy = None   # request currently on the hardware
+
+    # === scan bookkeeping ===
+    async def _save(self, scan, close=False):
+        # written in a thread, so the server keeps answering clients
+        await asyncio.get_running_loop().run_in_executor(None, scan.close if close else scan.save)
+
+    def _current_scan(self):
+        if self.scan is None:
+            self.scan = Scan(self.default_json_file)
+            print(f"[FLOWER] New scan -> {self.scan.json_file}")
+        return self.scan
+
+    # === command handlers ===
+    async def _measure(self, request):
+        mode = request.get("mode", "coinc")
+        if mode not in MEASUREMENTS:
+            raise ValueError(f"unknown mode '{mode}', expected one of {sorted(MEASUREMENTS)}")
+        method, kwargs, key = MEASUREMENTS[mode]
+        func = getattr(self.session, method)
+        if "n_ave" in request and mode not in COMBINED_MODES:
+            kwargs = dict(kwargs, n_ave=request["n_ave"])
+        if mode in COMBINED_MODES:
+            kwargs = dict(kwargs, **{name: request[name] for name in COMBINED_OPTIONS if name in request})
+        if mode in RAM_MODES:
+            if request.get("keep_raw"):
+                kwargs = dict(kwargs, keep_raw=True)
+            if "percentiles" in request:
+                kwargs = dict(kwargs, percentiles=tuple(request["percentiles"]))
+
+        loop = asyncio.get_running_loop()
+        if request.get("settle_s"):
+            await asyncio.sleep(float(request["settle_s"]))
+        settle = {}
+        if request.get("settle"):
+            options = dict(request["settle"])
+            source = options.pop("source", "scaler")
+            if source not in SETTLE_SOURCES:
+                raise ValueError(f"unknown settle source '{source}', expected one of {sorted(SETTLE_SOURCES)}")
+            wait = getattr(self.session, SETTLE_SOURCES[source])
+            settled, elapsed, readings = await loop.run_in_executor(
+                None, lambda: wait(phased=mode.endswith("_phased"), **options))
+            settle = {"settled": settled, "settle_s": round(elapsed, 4), "settle_reads": len(readings)}
+            if not settled:
+                print(f"[WARN] {source} did not settle within {elapsed:.2f} s, measuring anyway")
+
+        t0 = time.time()
+        adaptive = {}
+        if "target_err" in request and mode in ADAPTIVE_MODES:
+            options = {name: request[name] for name in ("target_err", "max_time_s", "min_reads") if name in request}
+            value, value_err, n_reads = await loop.run_in_executor(
+                None, lambda: self.session.coinc_rate_adaptive(phased=ADAPTIVE_MODES[mode], pulser_rate=RATE, **options))
+            adaptive = {"coincidence_rate_err": value_err, "n_reads": n_reads}
+        else:
+            value = await loop.run_in_executor(None, lambda: func(**kwargs))
+            value = value.tolist() if hasattr(value, "tolist") else value
+
+        reply = dict(settle, mode=mode, duration_s=round(time.time() - t0, 4), **adaptive)
+        scan = self._current_scan()
+        if isinstance(value, dict):
+            raw = value.pop("raw", None)
+            if raw is not None:
+                raw_file = f"{Path(scan.json_file).with_suffix('')}_raw_{scan.n_records:05d}.npy"
+                await loop.run_in_executor(None, np.save, raw_file, raw)
+                reply["raw_file"] = raw_file
+            reply.update(value)
+        else:
+            reply[key] = value
+        if "coincidence_rate" in reply:
+            reply["efficiency"] = reply["coincidence_rate"] / RATE
+            if "coincidence_rate_err" in reply:
+                reply["efficiency_err"] = reply["coincidence_rate_err"] / RATE
+            if "n_reads" in reply:
+                reply["n_trials"] = reply["n_reads"] * RATE
+        scan.append(dict(request.get("record", {}), **reply, time=t0))
+        reply["n_records"] = scan.n_records
+        return reply
+
+    async def _capture(self, request):
+        trigger = request.get("trigger", "coinc")
+        if trigger not in CAPTURE_TRIGGERS:
+            raise ValueError(f"unknown trigger '{trigger}', expected one of {sorted(CAPTURE_TRIGGERS)}")
+        options, trigger_type = CAPTURE_TRIGGERS[trigger]
+        n_events = int(request.get("n_events", 1000))
+        scan = self._current_scan()
+        path = request.get("file") or f"{Path(scan.json_file).with_suffix('')}_events_{scan.n_records:05d}.evt"
+
+        def capture():
+            with EventWriter(path, RAM_SAMPLES, meta={"trigger_type": trigger_type,
+                                                      "record": request.get("record", {})}) as writer:
+                return self.session.capture_events(writer, n_events, **options)
+
+        t0 = time.time()
+        n = await asyncio.get_running_loop().run_in_executor(None, capture)
+        duration = time.time() - t0
+        print(f"[FLOWER] Captured {n} {trigger_type} events in {duration:.1f} s -> {path}")
+        reply = {"capture_file": str(path), "n_events": n, "trigger": trigger,
+                 "duration_s": round(duration, 4), "event_rate_hz": round(n / duration, 2) if duration else None}
+        scan.append(dict(request.get("record", {}), **reply, time=t0))
+        reply["n_records"] = scan.n_records
+        return reply
+
+    async def _start_scan(self, request):
+        if self.scan is not None:
+            await self._save(self.scan, close=True)
+        self.scan = Scan(request.get("json_file", self.default_json_file), request.get("resume", True))
+        print(f"[FLOWER] New scan -> {self.scan.json_file} ({self.scan.n_records} stored records)")
+        return {"json_file": self.scan.json_file, "n_records": self.scan.n_records}
+
+    async def _end_scan(self, request):
+        scan = self._current_scan()
+        await self._save(scan, close=True)
+        self.scan = None
+        print(f"[FLOWER] Scan complete, {scan.n_records} records saved to {scan.json_file}")
+        return {"json_file": scan.json_file, "n_records": scan.n_records}
+
+    async def _save_now(self, request):
+        scan = self._current_scan()
+        await self._save(scan)
+        return {"json_file": scan.json_file, "n_records": scan.n_records}
+
+    async def _points(self, request):
+        store = self._current_scan().store
+        fields = request.get("fields", [])
+        if not fields:
+            return {"points": store.keys()}
+        points = {}
+        for key in store.keys():
+            record = store.get(key)
+            points[key] = {name: record.get(name) for name in fields}
+        return {"points": points}
+
+    def _status(self, request):
+        return {"queued": self.queue.qsize(), "busy": self.busy, "clients": self.clients,
+                "json_file": self.scan.json_file if self.scan else None,
+                "n_records": self.scan.n_records if self.scan else 0}
+
+    # === hardware queue ===
+    async def _worker(self):
+        handlers = {"measure": self._measure, "start_scan": self._start_scan,
+                    "end_scan": self._end_scan, "save": self._save_now, "points": self._points,
+                    "capture": self._capture}
+        while True:
+            request, reply_to = await self.queue.get()
+            self.busy = request.get("id")
+            try:
+                result = await handlers[request["cmd"]](request)
+                reply = dict(result, id=request.get("id"), ok=True)
+            except Exception as e:
+                print(f"[ERROR] {request.get('cmd')} #{request.get('id')}: {e}")
+                reply = {"id": request.get("id"), "ok": False, "error": str(e)}
+            await reply_to(reply)
+            self.busy = None
+
+    # === connections ===
+    async def _handle_client(self, reader, writer):
+        addr = writer.get_extra_info("peername")
+        self.clients += 1
+        print(f"[FLOWER] Connected by {addr}")
+        lock = asyncio.Lock()
+
+        async def reply_to(message):
+            # a client that left keeps its measurements in the scan, only the reply is lost
+            if writer.is_closing():
+                return
+            async with lock:
+                try:
+                    writer.write((json.dumps(message) + "\n").encode())
+                    await writer.drain()
+                except ConnectionError:
+                    pass
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    cmd = request["cmd"]
+                except (ValueError, KeyError, TypeError) as e:
+                    await reply_to({"id": None, "ok": False, "error": f"bad request: {e}"})
+                    continue
+
+                if cmd == "ping":
+                    await reply_to({"id": request.get("id"), "ok": True, "time": time.time()})
+                elif cmd == "status":
+                    await reply_to(dict(self._status(request), id=request.get("id"), ok=True))
+                elif cmd in ("measure", "start_scan", "end_scan", "save", "points", "capture"):
+                    await self.queue.put((request, reply_to))
+                else:
+                    await reply_to({"id": request.get("id"), "ok": False, "error": f"unknown command '{cmd}'"})
+        except ConnectionError:
+            pass
+        finally:
+            self.clients -= 1
+            writer.close()
+            print(f"[FLOWER] {addr} disconnected")
+
+    async def serve(self, host=HOST, port=PORT):
+        self.queue = asyncio.Queue()
+        worker = asyncio.create_task(self._worker())
+        server = await asyncio.start_server(self._handle_client, host or None, port, reuse_address=True)
+        print(f"[FLOWER] Waiting on port {port} …")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            worker.cancel()
+            if self.scan is not None:
+                self.scan.close()
+                print(f"[FLOWER] Saved {self.scan.n_records} records to {self.scan.json_file}")
+
+
+def main():
+    if FAKE_FLOWER or "--fake" in sys.argv:
+        print("[FLOWER] Using the fake in-memory board")
+        session = fake_session()
+    else:
+        session = hardware_session()
+    try:
+        asyncio.run(FlowerScanServer(session).serve())
+    except KeyboardInterrupt:
+        print("\n[FLOWER] Server stopped.")
+
+if __name__ == "__main__":
+    main()
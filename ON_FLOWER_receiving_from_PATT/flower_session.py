@@ -0,0 +1,416 @@
+import sys
+import time
+import numpy as np
+
+FLOWERPY_PATH = '/home/rno-g/flowerpy'
+COINC_SCALER = 3  #replace 3 by 0 if it doesn't work (it changes with FLOWER firmware updates)
+PHASED_SCALER = 18
+SCALER_GATE_S = 1.0  # the trigger scalers count over ~1 s gates; a reading returns the last completed gate
+N_CHANNELS = 4
+RAM_SAMPLES = 256
+PEDESTAL = 127
+RAM_PERCENTILES = (5, 50, 95)
+CAPTURE_CHUNK = 100  # events read between two writes of a capture
+
+
+# === statistics helpers ===
+def readings_agree(readings, n_sigma=2.0, poisson=True, abs_tol=0.0, rel_tol=0.0):
+    """
+    True if all readings (one row per reading, channels along the columns)
+    agree within the tolerance: their spread is at most n_sigma Poisson
+    sigmas of the mean count (if `poisson`) plus abs_tol plus rel_tol * mean,
+    for every channel.
+    """
+    readings = np.atleast_2d(np.asarray(readings, dtype=float).T).T
+    mean = np.abs(readings.mean(axis=0))
+    spread = readings.max(axis=0) - readings.min(axis=0)
+    tol = abs_tol + rel_tol * mean
+    if poisson:
+        tol = tol + n_sigma * np.sqrt(2 * np.maximum(mean, 1.0))
+    return bool(np.all(spread <= tol))
+
+def wait_until_settled(read, interval_s=0.05, n_agree=3, timeout_s=5.0, first_read_s=0.0, **tolerance):
+    """
+    Poll read() every interval_s, starting first_read_s after the call,
+    until the last n_agree readings agree (see readings_agree) or
+    timeout_s has passed.
+
+    Returns (settled, elapsed_s, readings).
+    """
+    t0 = time.time()
+    time.sleep(first_read_s)
+    readings = []
+    while True:
+        readings.append(read())
+        if len(readings) >= n_agree and readings_agree(readings[-n_agree:], **tolerance):
+            return True, time.time() - t0, readings
+        if time.time() - t0 > timeout_s:
+            return False, time.time() - t0, readings
+        time.sleep(interval_s)
+
+def efficiency_error(k, n):
+    """
+    Binomial 1σ error on the efficiency after k triggers in n pulses. The
+    estimate is pulled slightly off 0 and 1, so points at 0% or 100% get a
+    small but non-zero error.
+    """
+    p = min(max((k + 0.5) / (n + 1), 0.0), 1.0)
+    return np.sqrt(p * (1 - p) / n)
+
+def ram_statistics(block, percentiles=RAM_PERCENTILES, pedestal=PEDESTAL):
+    """
+    Per-channel statistics of a block of RAM readouts, in one vectorised pass.
+
+    Every quantity is computed per buffer and then averaged over the
+    buffers; the *_err entries are the standard errors of those means.
+
+    Parameters
+    ----------
+    block : ndarray
+        Shape (n_buffers, n_channels, n_samples), see FlowerSession.read_ram_block.
+    percentiles : sequence of float
+        Sample percentiles to compute in every buffer.
+    pedestal : float
+        Nominal pedestal the RMS is taken around (as in the older noise RMS).
+
+    Returns
+    -------
+    stats : dict of lists
+        peak_to_peak, rms, pedestal, std (around the measured pedestal),
+        each (n_channels,), with matching *_err; percentiles and
+        percentiles_err, (n_percentiles, n_channels); percentile_levels;
+        n_buffers.
+    """
+    block = np.asarray(block)
+    n = block.shape[0]
+    x = block.astype(np.float32)
+
+    per_buffer = {
+        "peak_to_peak": (block.max(axis=-1) - block.min(axis=-1)).astype(np.float32),
+        "rms": np.sqrt(np.mean((x - pedestal) ** 2, axis=-1)),
+        "pedestal": x.mean(axis=-1),
+        "std": x.std(axis=-1),
+    }
+    stats = {}
+    for name, values in per_buffer.items():                  # (n_buffers, n_channels)
+        stats[name] = values.mean(axis=0).tolist()
+        stats[name + "_err"] = (values.std(axis=0, ddof=1) / np.sqrt(n) if n > 1
+                                else np.zeros(values.shape[1])).tolist()
+
+    pct = np.percentile(x, percentiles, axis=-1)              # (n_percentiles, n_buffers, n_channels)
+    stats["percentile_levels"] = list(percentiles)
+    stats["percentiles"] = pct.mean(axis=1).tolist()
+    stats["percentiles_err"] = (pct.std(axis=1, ddof=1) / np.sqrt(n) if n > 1
+                                else np.zeros(pct.mean(axis=1).shape)).tolist()
+    stats["n_buffers"] = n
+    return stats
+
+
+class FlowerSession:
+    """
+    Long-lived handle on one FLOWER board.
+
+    Owns the `flower.Flower` and `flower_trig.FlowerTrig` objects and keeps
+    the trigger enable and the selected scaler it last wrote, so a
+    measurement only writes those registers when they actually change.
+    `register_writes` counts the writes that were made.
+
+    Use `hardware_session()` on the FLOWER, or pass the fake devices from
+    fake_flower.py to run without hardware.
+    """
+
+    def __init__(self, dev, trig):
+        self.dev = dev
+        self.trig = trig
+        self._trigger = None
+        self._scaler = None
+        self._ram_block = None
+        self.register_writes = 0
+
+    # === cached register state ===
+    def enable_trigger(self, phased=False):
+        trigger = "phased" if phased else "coinc"
+        if trigger != self._trigger:
+            if phased:
+                self.trig.trigEnable(phased_trig=1)
+            else:
+                self.trig.trigEnable(coinc_trig=1)
+            self._trigger = trigger
+            self.register_writes += 1
+
+    def select_scaler(self, scaler):
+        if scaler != self._scaler:
+            self.trig.setScalerOut(scaler)
+            self._scaler = scaler
+            self.register_writes += 1
+
+    def invalidate(self):
+        """Forget the cached state, e.g. after the board was reset by something else."""
+        self._trigger = None
+        self._scaler = None
+
+    def read_scaler(self, scaler):
+        self.select_scaler(scaler)
+        return self.trig.readSingleScaler()[0]
+
+    # === measurements ===
+    def coinc_rate(self, n_ave=10, phased=False, interval_s=0.05):
+        """Mean of n_ave scaler readings of the coincidence (or phased) trigger."""
+        self.enable_trigger(phased)
+        scaler = PHASED_SCALER if phased else COINC_SCALER
+        ave_rate = 0
+        for i in range(n_ave):
+            time.sleep(interval_s)
+            ave_rate += self.read_scaler(scaler) / n_ave
+        return ave_rate
+
+    def coinc_rate_adaptive(self, phased=False, target_err=0.01, max_time_s=5.0, min_reads=1,
+                            interval_s=SCALER_GATE_S, pulser_rate=1000, gate_s=SCALER_GATE_S):
+        """
+        Coincidence (or phased) trigger rate, read until the efficiency
+        rate/pulser_rate is known to target_err (1σ, binomial) or max_time_s
+        is reached.
+
+        pulser_rate is the number of pulses in one scaler gate (gate_s).
+        Consecutive readings within one gate return the same count, so only
+        readings taken at least gate_s after the last counted one are
+        counted as new gates; polling faster than gate_s adds nothing.
+
+        Points far from threshold (efficiency near 0 or 1) stop after
+        min_reads gates (one by default); points on the threshold read
+        longest (target_err 0.005 takes about 10 gates at 50%).
+
+        Returns (rate, rate_err, n_reads), n_reads being the gates counted.
+        """
+        self.enable_trigger(phased)
+        scaler = PHASED_SCALER if phased else COINC_SCALER
+        t0 = time.time()
+        total, n_reads = 0.0, 0
+        last_gate = -np.inf
+        err = np.inf
+        while True:
+            time.sleep(interval_s)
+            count = self.read_scaler(scaler)
+            if time.time() - last_gate >= gate_s:
+                last_gate = time.time()
+                total += count
+                n_reads += 1
+                err = efficiency_error(total, n_reads * pulser_rate)
+            if n_reads >= min_reads and (err <= target_err or time.time() - t0 >= max_time_s):
+                break
+        return total / n_reads, float(err * pulser_rate), n_reads
+
+    def read_ram_block(self, n_ave, software_trigger=False, keep=False, when=None):
+        """
+        n_ave RAM readouts in one (n_ave, N_CHANNELS, RAM_SAMPLES) int16
+        array. The array is preallocated once and reused by the next call
+        unless `keep` (then a fresh array is returned for the caller).
+        If given, `when` (n_ave,) is filled with the time of every readout.
+        """
+        shape = (n_ave, N_CHANNELS, RAM_SAMPLES)
+        if keep:
+            block = np.empty(shape, dtype=np.int16)
+        else:
+            if self._ram_block is None or self._ram_block.shape != shape:
+                self._ram_block = np.empty(shape, dtype=np.int16)
+            block = self._ram_block
+        for i in range(n_ave):
+            self._read_buffer(block[i], software_trigger)
+            if when is not None:
+                when[i] = time.time()
+        self.dev.bufferClear()
+        return block
+
+    def _read_buffer(self, out, software_trigger=False):
+        self.dev.bufferClear()
+        if software_trigger:
+            self.dev.softwareTrigger()
+        else:
+            time.sleep(0.005)
+        out[:] = self.dev.readRam(self.dev.DEV_FLOWER, 0, RAM_SAMPLES)[:N_CHANNELS]
+
+    def ram_stats(self, n_ave=50, phased=False, software_trigger=False, keep_raw=False,
+                  percentiles=RAM_PERCENTILES):
+        """
+        Read n_ave buffers (triggered by the coincidence/phased trigger, or
+        software-triggered) and return ram_statistics of the block; with
+        keep_raw the block itself is returned as stats["raw"].
+        """
+        if not software_trigger:
+            self.enable_trigger(phased)
+        block = self.read_ram_block(n_ave, software_trigger, keep=keep_raw)
+        stats = ram_statistics(block, percentiles)
+        if keep_raw:
+            stats["raw"] = block
+        return stats
+
+    def noise_stats(self, n_ave=100, keep_raw=False, percentiles=RAM_PERCENTILES):
+        """ram_stats of software-triggered (noise) buffers, plus noise_rms/noise_rms_err."""
+        stats = self.ram_stats(n_ave, software_trigger=True, keep_raw=keep_raw, percentiles=percentiles)
+        stats["noise_rms"], stats["noise_rms_err"] = stats["rms"], stats["rms_err"]
+        return stats
+
+    def peak2peak(self, n_ave=50, phased=False):
+        """Per-channel peak-to-peak of the triggered RAM buffer, averaged over n_ave reads."""
+        return self.ram_stats(n_ave, phased)["peak_to_peak"]
+
+    def noise_rms(self, n_ave=100):
+        """Per-channel RMS around the pedestal of software-triggered buffers."""
+        return self.ram_stats(n_ave, software_trigger=True)["rms"]
+
+    def point_stats(self, phased=False, n_rate=3, n_p2p=50, n_noise=100, interval_s=SCALER_GATE_S,
+                    target_err=None, max_time_s=5.0, min_reads=1, pulser_rate=1000,
+                    percentiles=RAM_PERCENTILES):
+        """
+        Trigger rate, triggered-buffer statistics and noise statistics of one
+        configuration in a single visit.
+
+        The scaler needs a gate (interval_s, at least SCALER_GATE_S) to
+        refresh between readings; instead of sleeping, the triggered and
+        software-triggered RAM buffers are read (interleaved) in that time,
+        so the three measurements share one settling and most of their time.
+        With target_err the scaler is read until the efficiency is known to
+        target_err, as in coinc_rate_adaptive, instead of n_rate gates.
+        Each gate counts as pulser_rate pulses.
+
+        Returns the ram_statistics of the n_p2p triggered buffers;
+        noise_rms and noise_pedestal (with *_err) of the n_noise
+        software-triggered ones; snr = peak_to_peak / (2 noise_rms) per
+        channel with snr_err; coincidence_rate, coincidence_rate_err and
+        n_reads (gates).
+        """
+        interval_s = max(interval_s, SCALER_GATE_S)
+        self.enable_trigger(phased)
+        scaler = PHASED_SCALER if phased else COINC_SCALER
+        self.select_scaler(scaler)
+        signal = np.empty((n_p2p, N_CHANNELS, RAM_SAMPLES), dtype=np.int16)
+        noise = np.empty((n_noise, N_CHANNELS, RAM_SAMPLES), dtype=np.int16)
+        i_signal = i_noise = 0
+        total, n_reads = 0.0, 0
+        t0 = time.time()
+        next_read = t0 + interval_s
+
+        def rate_done():
+            if target_err is None:
+                return n_reads >= n_rate
+            if n_reads < max(min_reads, 1):
+                return False
+            return (efficiency_error(total, n_reads * pulser_rate) <= target_err
+                    or time.time() - t0 >= max_time_s)
+
+        while not rate_done() or i_signal < n_p2p or i_noise < n_noise:
+            # RAM reads while the scaler refreshes (all remaining ones once the rate is done)
+            while (i_signal < n_p2p or i_noise < n_noise) and (rate_done() or time.time() < next_read):
+                if i_noise >= n_noise or (i_signal < n_p2p and i_signal * n_noise <= i_noise * n_p2p):
+                    self._read_buffer(signal[i_signal])
+                    i_signal += 1
+                else:
+                    self._read_buffer(noise[i_noise], software_trigger=True)
+                    i_noise += 1
+            if not rate_done():
+                time.sleep(max(0.0, next_read - time.time()))
+                total += self.read_scaler(scaler)
+                n_reads += 1
+                next_read = time.time() + interval_s
+        self.dev.bufferClear()
+
+        stats = ram_statistics(signal, percentiles) if n_p2p else {}
+        if n_noise:
+            noise_stats = ram_statistics(noise, percentiles)
+            for name in ("rms", "rms_err", "pedestal", "pedestal_err"):
+                stats["noise_" + name] = noise_stats[name]
+            if n_p2p:
+                p2p, p2p_err = np.array(stats["peak_to_peak"]), np.array(stats["peak_to_peak_err"])
+                rms, rms_err = np.array(stats["noise_rms"]), np.array(stats["noise_rms_err"])
+                snr = p2p / (2 * rms)
+                stats["snr"] = snr.tolist()
+                stats["snr_err"] = (snr * np.sqrt((p2p_err / np.maximum(p2p, 1e-9)) ** 2
+                                                  + (rms_err / rms) ** 2)).tolist()
+        if n_reads:
+            stats["coincidence_rate"] = total / n_reads
+            stats["coincidence_rate_err"] = float(efficiency_error(total, n_reads * pulser_rate) * pulser_rate)
+            stats["n_reads"] = n_reads
+        return stats
+
+    def capture_events(self, writer, n_events, phased=False, software_trigger=False, chunk=CAPTURE_CHUNK):
+        """
+        Read n_events RAM buffers (triggered by the coincidence/phased
+        trigger, or software-triggered) and stream them to `writer`, an
+        event_capture.EventWriter, `chunk` events at a time.
+        """
+        if not software_trigger:
+            self.enable_trigger(phased)
+        when = np.empty(chunk)
+        done = 0
+        while done < n_events:
+            n = min(chunk, n_events - done)
+            block = self.read_ram_block(n, software_trigger, when=when)
+            writer.write(block, when[:n])
+            done += n
+        return done
+
+    # === settle detection ===
+    def wait_for_coinc_settle(self, phased=False, interval_s=SCALER_GATE_S, n_agree=2, gate_s=SCALER_GATE_S,
+                              **settle):
+        """
+        Settle on the coincidence (or phased) trigger scaler: Poisson
+        tolerance. Readings within one gate repeat the same count and would
+        agree trivially, so the scaler is read once per gate (interval_s is
+        raised to gate_s), and the first reading is taken one gate after
+        the call, when the scaler has refreshed since the change.
+        """
+        self.enable_trigger(phased)
+        scaler = PHASED_SCALER if phased else COINC_SCALER
+        return wait_until_settled(lambda: self.read_scaler(scaler), interval_s=max(interval_s, gate_s),
+                                  n_agree=n_agree, first_read_s=gate_s, **settle)
+
+    def wait_for_p2p_settle(self, phased=False, n_ave=5, abs_tol=None, n_sigma=2.0, **settle):
+        """
+        Settle on the RAM peak-to-peak of all channels, each reading
+        averaged over n_ave buffers. Readings agree within abs_tol ADC
+        counts; by default n_sigma standard errors of the difference of two
+        readings, estimated from the buffer-to-buffer scatter of the first.
+        """
+        self.enable_trigger(phased)
+        def read_buffers():
+            block = self.read_ram_block(n_ave)
+            return (block.max(axis=-1) - block.min(axis=-1)).astype(float)
+        first = read_buffers()
+        if abs_tol is None:
+            sem = first.std(axis=0, ddof=1) / np.sqrt(n_ave) if n_ave > 1 else np.zeros(N_CHANNELS)
+            abs_tol = max(n_sigma * np.sqrt(2) * float(sem.max()), 1.0)
+        pending = [first.mean(axis=0)]
+        def read():
+            return pending.pop() if pending else read_buffers().mean(axis=0)
+        return wait_until_settled(read, poisson=False, abs_tol=abs_tol, **settle)
+
+
+def hardware_session():
+    """FlowerSession on the real board (needs flowerpy)."""
+    sys.path.append(FLOWERPY_PATH)
+    import flower, flower_trig
+    return FlowerSession(flower.Flower(), flower_trig.FlowerTrig())
+
+def fake_session(**model):
+    """FlowerSession on the in-memory fake board, see fake_flower.FakeFlowerTrig."""
+    from fake_flower import FakeFlower, FakeFlowerTrig
+    trig = FakeFlowerTrig(**model)
+    return FlowerSession(FakeFlower(trig), trig)
+
+
+if __name__ == "__main__":
+    # benchmark on the fake board: cached register state vs a fresh session per call
+    session = fake_session(latency_s=0.001)
+    t0 = time.time()
+    for i in range(20):
+        session.coinc_rate(interval_s=0)
+    cached = time.time() - t0, session.register_writes
+
+    t0 = time.time()
+    writes = 0
+    for i in range(20):
+        fresh = fake_session(latency_s=0.001)
+        fresh.coinc_rate(interval_s=0)
+        writes += fresh.register_writes
+    print(f"[BENCH] 20 coinc_rate calls: persistent {cached[0]:.3f} s / {cached[1]} register writes, "
+          f"fresh per call {time.time() - t0:.3f} s / {writes} register writes")
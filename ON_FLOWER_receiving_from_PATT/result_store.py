@@ -0,0 +1,187 @@
+import os
+import sys
+import json
+import time
+import threading
+from pathlib import Path
+
+# Append-only, crash-safe store for scan results.
+#
+# Every measurement is appended to a line-delimited JSON file (one record per
+# line) as soon as it is taken, and the file is fsync'ed every FSYNC_EVERY
+# records or FSYNC_INTERVAL_S seconds after the first unsynced one (a timer
+# takes care of it when no more records come), whichever comes first. A
+# crash or power cut loses at most the records since the last fsync instead
+# of the whole scan; a half-written last line is cut off when the store is
+# reopened.
+#
+# Reopening a store rebuilds an index run_name -> byte offset of its record,
+# so a restarted scan can ask which points are already done and skip them.
+# The scan servers only do that when started with --resume; otherwise the
+# old store is moved aside and the scan starts fresh.
+# export_json() writes the records as the single JSON list the analysis
+# scripts read, e.g. after a crash:
+#
+#   python result_store.py full_scan.jsonl            -> full_scan.json
+
+FSYNC_EVERY = 20  # records between fsyncs
+FSYNC_INTERVAL_S = 5.0  # longest time a record stays unsynced
+KEY = "run_name"  # record field identifying a scan point
+RESUME_FLAG = "--resume"  # scan server argument: continue the stored results instead of starting fresh
+
+
+def store_path(json_file):
+    """Store file belonging to a scan JSON: same name with the .jsonl suffix."""
+    return Path(json_file).with_suffix(".jsonl")
+
+
+def server_args(default_json, argv=None):
+    """
+    (json_file, resume) of a scan server's command line: the output JSON
+    is the first argument (default_json if there is none), and RESUME_FLAG
+    anywhere continues its store.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    names = [arg for arg in argv if arg != RESUME_FLAG]
+    return (names[0] if names else default_json), RESUME_FLAG in argv
+
+
+def load_records(path):
+    """All complete records of a store file, in the order they were taken."""
+    records = []
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                pass   # a line cut by a crash
+    return records
+
+
+class ResultStore:
+    """
+    Append-only line-delimited JSON file of scan records.
+
+    With fresh=True an existing file is moved aside (to <name>.<time>.bak)
+    instead of being continued.
+    """
+
+    def __init__(self, path, key=KEY, fsync_every=FSYNC_EVERY, fsync_interval_s=FSYNC_INTERVAL_S,
+                 fresh=False):
+        self.path = Path(path)
+        self.key = key
+        self.fsync_every = fsync_every
+        self.fsync_interval_s = fsync_interval_s
+        self.index = {}   # key -> byte offset of the latest record with that key
+        self.n_records = 0
+
+        if fresh and self.path.exists() and self.path.stat().st_size:
+            backup = self.path.with_name(f"{self.path.name}.{time.strftime('%Y%m%d_%H%M%S')}.bak")
+            self.path.rename(backup)
+            print(f"[STORE] Moved the previous {self.path} to {backup}")
+        if self.path.exists():
+            self._recover()
+        self._file = open(self.path, "ab")
+        self._unsynced = 0
+        self._synced_at = time.time()
+        self._lock = threading.RLock()
+        self._timer = None
+
+    def _recover(self):
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    self._index(json.loads(line), offset)
+                except ValueError:
+                    print(f"[STORE] Skipping an unreadable line at byte {offset} of {self.path}")
+                offset += len(line)
+        if offset < self.path.stat().st_size:
+            print(f"[STORE] Dropping {self.path.stat().st_size - offset} bytes of an incomplete record in {self.path}")
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+        if self.n_records:
+            print(f"[STORE] Resuming {self.path}: {self.n_records} records, {len(self.index)} points")
+
+    def _index(self, record, offset):
+        if self.key in record:
+            self.index[record[self.key]] = offset
+        self.n_records += 1
+
+    # === writing ===
+    def append(self, record):
+        with self._lock:
+            offset = self._file.tell()
+            self._file.write((json.dumps(record) + "\n").encode())
+            self._file.flush()
+            self._index(record, offset)
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.time() - self._synced_at >= self.fsync_interval_s:
+                self.sync()
+            elif self._timer is None:
+                # sync the record even if nothing else is appended
+                self._timer = threading.Timer(self.fsync_interval_s, self.sync)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _flush(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def sync(self):
+        """Flush and fsync the records appended so far."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._file.closed:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+            self._synced_at = time.time()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self.sync()
+                self._file.close()
+
+    # === reading ===
+    def __contains__(self, key):
+        return key in self.index
+
+    def keys(self):
+        return list(self.index)
+
+    def get(self, key):
+        """Latest record stored for `key`, None if there is none."""
+        if key not in self.index:
+            return None
+        self._flush()
+        with open(self.path, "rb") as f:
+            f.seek(self.index[key])
+            return json.loads(f.readline())
+
+    def records(self):
+        self._flush()
+        return load_records(self.path)
+
+    def export_json(self, json_file=None):
+        """Write all records as one JSON list (the format of the analysis scripts)."""
+        json_file = json_file or self.path.with_suffix(".json")
+        records = self.records()
+        with open(json_file, "w") as f:
+            json.dump(records, f, indent=2)
+        return len(records)
+
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        json_file = Path(path).with_suffix(".json")
+        with open(json_file, "w") as f:
+            json.dump(load_records(path), f, indent=2)
+        print(f"[STORE] {path} -> {json_file}")
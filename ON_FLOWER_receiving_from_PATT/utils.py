@@ -3,74 +3,49 @@ sys.path.append('/home/rno-g/flowerpy')
 import flower_trig, flower
 import time
 import numpy as np
+from flower_session import FlowerSession, readings_agree, wait_until_settled, efficiency_error, SCALER_GATE_S
+
+_session = None
+
+def get_session():
+    """FlowerSession shared by all functions below, so the devices are opened once."""
+    global _session
+    if _session is None:
+        _session = FlowerSession(flower.Flower(), flower_trig.FlowerTrig())
+    return _session
 
 def get_coinc_rate(n_ave = 10):
-    trig = flower_trig.FlowerTrig()
-    trig.trigEnable(coinc_trig=1)
-    ave_rate = 0
-    for i in range(n_ave):
-        time.sleep(0.05)
-        trig.setScalerOut(3)  #replace 3 by 0 if it doesn't work (it changes with FLOWER firmware updates)
-        ave_rate += trig.readSingleScaler()[0]/n_ave
-    return ave_rate
+    return get_session().coinc_rate(n_ave)
 
 def get_coinc_rate_phased(n_ave = 10):
-    trig = flower_trig.FlowerTrig()
-    trig.trigEnable(phased_trig=1)
-    ave_rate = 0
-    for i in range(n_ave):
-        time.sleep(0.05)
-        trig.setScalerOut(18)
-        ave_rate += trig.readSingleScaler()[0]/n_ave
-    return ave_rate
+    return get_session().coinc_rate(n_ave, phased=True)
+
+def get_coinc_rate_adaptive(phased=False, target_err=0.01, max_time_s=5.0, min_reads=1,
+                            interval_s=SCALER_GATE_S, pulser_rate=1000):
+    """See FlowerSession.coinc_rate_adaptive; returns (rate, rate_err, n_reads)."""
+    return get_session().coinc_rate_adaptive(phased, target_err, max_time_s, min_reads,
+                                             interval_s, pulser_rate)
 
 def get_peak2peak(n_ave = 50):
-    dev = flower.Flower()
-    trig = flower_trig.FlowerTrig()
-    trig.trigEnable(coinc_trig=1)
-    
-    nchans = 4
-    peak2peak = [0, 0, 0, 0]
-    for i in range(n_ave):
-        dev.bufferClear() 
-        time.sleep(0.005)
-        dat= dev.readRam(dev.DEV_FLOWER, 0, 256)
-        for ch in range(nchans):
-            peak2peak[ch] += (np.max(dat[ch]) - np.min(dat[ch]))/n_ave
-    
-    dev.bufferClear()
-    return(peak2peak)
+    return get_session().peak2peak(n_ave)
 
 def get_peak2peak_phased(n_ave = 50):
-    dev = flower.Flower()
-    trig = flower_trig.FlowerTrig()
-    trig.trigEnable(phased_trig=1)
-    
-    nchans = 4
-    peak2peak = [0, 0, 0, 0]
-    for i in range(n_ave):
-        dev.bufferClear() 
-        time.sleep(0.005)
-        dat= dev.readRam(dev.DEV_FLOWER, 0, 256)
-        for ch in range(nchans):
-            peak2peak[ch] += (np.max(dat[ch]) - np.min(dat[ch]))/n_ave
-    
-    dev.bufferClear()
-    return(peak2peak)
+    return get_session().peak2peak(n_ave, phased=True)
 
 def get_noise_rms(n_ave = 100):
-    dev = flower.Flower()
+    return get_session().noise_rms(n_ave)
+
+def get_ram_stats(n_ave = 50, phased=False, keep_raw=False):
+    return get_session().ram_stats(n_ave, phased=phased, keep_raw=keep_raw)
 
-    nchans = 4
-    ave_rms = [0, 0, 0, 0]
-    for i in range(n_ave):
-        dev.bufferClear()
-        dev.softwareTrigger()
-        dat= dev.readRam(dev.DEV_FLOWER, 0, 256)
-        for ch in range(nchans):
-            ave_rms[ch] += np.sqrt(np.mean((np.array(dat[ch])-127)**2))/n_ave
-    dev.bufferClear()
-    return(ave_rms)
+def get_noise_stats(n_ave = 100, keep_raw=False):
+    return get_session().noise_stats(n_ave, keep_raw=keep_raw)
+
+def wait_for_coinc_settle(phased=False, **settle):
+    return get_session().wait_for_coinc_settle(phased, **settle)
+
+def wait_for_p2p_settle(phased=False, n_ave=5, abs_tol=None, **settle):
+    return get_session().wait_for_p2p_settle(phased, n_ave, abs_tol, **settle)
 
 if __name__ == "__main__":
     #print(get_peak2peak_phased())
@@ -78,4 +53,3 @@ if __name__ == "__main__":
     #print(get_peak2peak())
     print(get_coinc_rate())
     print(get_noise_rms())
-
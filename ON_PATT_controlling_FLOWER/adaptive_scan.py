@@ -0,0 +1,188 @@
+import re
+import numpy as np
+from typing import Optional, Sequence
+
+
+def _logistic(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+class AdaptiveSigmoidScan:
+    """
+    Propose/observe planner for efficiency-vs-signal scans.
+
+    Starts with a coarse grid over [x_min, x_max], then fits a binomial
+    sigmoid eff = 1 / (1 + exp(-slope * (x - x50))) to everything observed so
+    far and places the next points around x50, where they constrain x50 and
+    the slope best, until the uncertainty on x50 drops below `target_x50_err`
+    or `max_points` measurements have been made.
+
+    x must grow with the signal (SNR, attenuation percent, pulse amplitude).
+    If `candidates` is given, proposals are snapped to the nearest allowed
+    value (e.g. the percentages of the available attenuation codes).
+
+    Usage:
+        scan = AdaptiveSigmoidScan(x_min, x_max, target_x50_err=0.05)
+        x = scan.propose()
+        while x is not None:
+            scan.observe(x, n_pass, n_trials)
+            x = scan.propose()
+        x50, x50_err, slope = scan.fit()
+    """
+
+    def __init__(self, x_min: float, x_max: float, *, n_coarse: int = 6,
+                 target_x50_err: float = 0.05, max_points: int = 30,
+                 candidates: Optional[Sequence[float]] = None):
+        self.x_min, self.x_max = float(x_min), float(x_max)
+        self.target_x50_err = target_x50_err
+        self.max_points = max_points
+        self.candidates = None if candidates is None else np.unique(np.asarray(candidates, dtype=float))
+
+        self._queue = [self._snap(x) for x in np.linspace(self.x_min, self.x_max, n_coarse)]
+        self._round = 0
+        self.x, self.k, self.n = [], [], []
+
+    # --- bookkeeping ---
+    def _snap(self, x):
+        x = float(np.clip(x, self.x_min, self.x_max))
+        if self.candidates is not None:
+            x = float(self.candidates[np.argmin(np.abs(self.candidates - x))])
+        return x
+
+    def observe(self, x: float, n_pass: float, n_trials: float) -> None:
+        """Record n_pass triggered out of n_trials at x."""
+        self.x.append(float(x))
+        self.k.append(float(n_pass))
+        self.n.append(float(n_trials))
+
+    def observe_fraction(self, x: float, efficiency: float, n_trials: float) -> None:
+        """Record a measured efficiency (pass fraction) based on n_trials."""
+        self.observe(x, float(np.clip(efficiency, 0, 1)) * n_trials, n_trials)
+
+    # --- fit ---
+    def fit(self):
+        """
+        Maximum-likelihood binomial sigmoid fit.
+
+        Returns
+        -------
+        x50 : float
+        x50_err : float
+            1σ from the inverse Fisher information (inf if unconstrained).
+        slope : float
+        """
+        x, k, n = np.array(self.x), np.array(self.k), np.array(self.n)
+        if len(x) < 2 or np.all(k == 0) or np.all(k == n):
+            return np.nan, np.inf, np.nan
+
+        # logistic regression in (a, b), eff = logistic(a + b x); a weak ridge on
+        # b keeps it finite when the data are still perfectly separated
+        span = max(self.x_max - self.x_min, 1e-12)
+        ridge = 1e-2 * span**2
+        beta = np.array([-np.mean(x) * 4 / span, 4 / span])
+        X = np.stack([np.ones_like(x), x], axis=1)
+        for _ in range(50):
+            p = np.clip(_logistic(X @ beta), 1e-9, 1 - 1e-9)
+            grad = X.T @ (k - n * p) - np.array([0.0, ridge * beta[1]])
+            fisher = (X * (n * p * (1 - p))[:, None]).T @ X + np.diag([0.0, ridge])
+            step = np.linalg.solve(fisher, grad)
+            beta = beta + step
+            if np.max(np.abs(step)) < 1e-10:
+                break
+
+        a, b = beta
+        if b <= 0:
+            return np.nan, np.inf, b
+        cov = np.linalg.inv(fisher)
+        x50 = -a / b
+        # delta method for x50 = -a/b
+        g = np.array([-1 / b, a / b**2])
+        x50_err = float(np.sqrt(max(g @ cov @ g, 0.0)))
+        return float(x50), x50_err, float(b)
+
+    # --- proposal ---
+    def done(self) -> bool:
+        if self._queue:
+            return False
+        if len(self.x) >= self.max_points:
+            return True
+        _, x50_err, _ = self.fit()
+        return x50_err < self.target_x50_err
+
+    def propose(self) -> Optional[float]:
+        """Next x to measure, or None when the scan is finished."""
+        if self._queue:
+            return self._queue.pop(0)
+        if self.done():
+            return None
+
+        x50, x50_err, slope = self.fit()
+        if not np.isfinite(x50_err):
+            # no transition bracketed yet: bisect between the last all-fail
+            # and first all-pass points
+            eff = np.array(self.k) / np.array(self.n)
+            x = np.array(self.x)
+            lo = x[eff < 0.5].max() if np.any(eff < 0.5) else self.x_min
+            hi = x[eff >= 0.5].min() if np.any(eff >= 0.5) else self.x_max
+            return self._snap(0.5 * (lo + hi))
+
+        # alternate x50 and the points where the sigmoid is at ~18% / 82%,
+        # which carry the most information on the slope
+        offset = 1.5 / slope
+        choice = [0.0, -offset, offset][self._round % 3]
+        self._round += 1
+        return self._snap(np.clip(x50, self.x_min, self.x_max) + choice)
+
+
+def parse_efficiency_reply(reply: str) -> Optional[float]:
+    """Efficiency from a FLOWER 'Efficiency = 0.1234 recorded' reply, None on errors."""
+    match = re.search(r"Efficiency = ([-+0-9.eE]+)", reply)
+    return float(match.group(1)) if match else None
+
+def adaptive_attenuation_scan(attenuation_codes, measure, to_percent, *, n_trials: float = 1000,
+                              target_x50_err: float = 0.5, n_coarse: int = 6,
+                              max_points: Optional[int] = None):
+    """
+    Adaptive scan over the available attenuation codes at one angle.
+
+    The sigmoid is fitted in attenuation percent (proportional to SNR), and
+    every proposal is mapped back to the closest available code.
+
+    Parameters
+    ----------
+    attenuation_codes : array-like
+        Allowed attenuation codes (0–127).
+    measure : callable
+        measure(att_code) -> efficiency in [0, 1], or (efficiency, n_trials)
+        when the FLOWER reports how many pulses it integrated, or None if the
+        point failed.
+    to_percent : callable
+        Attenuation code -> signal percentage (attenuation_to_percent).
+    n_trials : float
+        Effective number of pulses behind one efficiency measurement, when
+        `measure` does not report it.
+    target_x50_err : float
+        Stop once the 50% point is known to this many percent (1σ).
+
+    Returns
+    -------
+    scan : AdaptiveSigmoidScan
+        With all observations; scan.fit() gives (x50 %, error, slope).
+    """
+    codes = np.asarray(attenuation_codes)
+    percents = np.array([to_percent(code) for code in codes], dtype=float)
+    scan = AdaptiveSigmoidScan(percents.min(), percents.max(), n_coarse=n_coarse,
+                               target_x50_err=target_x50_err,
+                               max_points=max_points or len(codes), candidates=percents)
+    attempts = 0   # failed points are not observed, so bound the retries
+    x = scan.propose()
+    while x is not None and attempts < 2 * scan.max_points:
+        attempts += 1
+        att_code = codes[np.argmin(np.abs(percents - x))]
+        efficiency = measure(att_code)
+        if isinstance(efficiency, tuple):
+            scan.observe_fraction(x, *efficiency)
+        elif efficiency is not None:
+            scan.observe_fraction(x, efficiency, n_trials)
+        x = scan.propose()
+    return scan
@@ -1,45 +1,18 @@
-import smbus
 import numpy as np
+from pe43713 import PE43713Bank, CHANNEL_ADDRESSES, CHANNEL_LABELS
+from sim_backends import simulation_requested, bench
 
-# I2C setup
-bus = smbus.SMBus(2)
-output_reg = 0x01
-config_reg = 0x03
+# I2C setup: expanders are configured on the first write, then only changed codes are sent
+# (`--sim`: the simulated attenuator board of sim_backends.py)
+attenuators = PE43713Bank(bench().i2c if simulation_requested() else None, addresses=CHANNEL_ADDRESSES)
 
 # Channel mappings
 CHANNEL_INDEXES = [0, 1, 2, 3]
-CHANNEL_ADDRESSES = [0x3e, 0x3c, 0x3a, 0x38]
-CHANNEL_LABELS = ['A', 'B', 'C', 'D']
 
 # Fit parameters from exponential model
 A = 91.916
 k = 0.026
 
-# --- I2C functions
-def write(i2c_address, register, cmd):
-    bus.write_byte_data(i2c_address, register, cmd)
-
-def read(i2c_address, register):
-    return bus.read_byte_data(i2c_address, register)
-
-def setup(address):
-    write(address, output_reg, 0x00)
-    write(address, config_reg, 0x00)
-
-def getOutputRegisterValue(address):
-    return read(address, output_reg)
-
-def setOutput(address):
-    val = getOutputRegisterValue(address)
-    write(address, output_reg, val | 0x02)
-
-def setAttenuation(address, atten_value=0):
-    atten_value = int(round(atten_value))
-    atten_bits = '{:07b}'.format(atten_value)
-    mapped = "0" + atten_bits[0:3] + atten_bits[7:2:-1]
-    value = int(mapped, 2)
-    write(address, output_reg, value)
-
 # --- Reverse model: attenuation to percentage
 def attenuation_to_percent(atten_value):
     try:
@@ -52,11 +25,7 @@ def apply_attenuation_to_all_channels(atten_value):
     percent = attenuation_to_percent(atten_value)
     print(f"Applying attenuation value = {atten_value} → Estimated signal strength = {percent:.2f}%")
 
-    for i in CHANNEL_INDEXES:
-        addr = CHANNEL_ADDRESSES[i]
-        setup(addr)
-        setOutput(addr)
-        setAttenuation(addr, atten_value)
+    attenuators.set_all(atten_value)
 
     return percent
 
@@ -0,0 +1,126 @@
+import json
+import hashlib
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from t660 import format_presets, CHANNEL_MAP, CHANNEL_ORDER, PULSE_WIDTH
+
+# Angle -> T660 delay presets for the PATT channels, compiled for a whole
+# scan at once and cached on disk.
+#
+# The beam delay of channel i is i * step with step = n d |sin θ| / c,
+# rounded to DECIMALS ns, in channel order for one sign of the angle and
+# reversed for the other (`reverse` picks which: the phased scripts use the
+# `-` convention because ch3 is on top). The calibration offsets and cable
+# delays are added on top. Custom beam delays (e.g. the
+# delay_presets_pulser_drop_*.json lists) can be given instead of the
+# geometry. The result holds the (n_angles, 4) delays and the formatted T660
+# command list of every angle, so the scan loop only looks them up.
+
+N_ICE = 1.78  # index of refraction in ice
+SPACING_M = 1.0  # vertical distance between channels
+C = 299792458  # speed of light in vacuum, m/s
+DECIMALS = 2  # beam delays rounded to 10 ps
+CACHE_DIR = Path(__file__).resolve().parent / "preset_cache"
+
+
+def beam_delays(angles_deg, n_ice: float = N_ICE, spacing_m: float = SPACING_M, reverse: bool = False,
+                decimals: int = DECIMALS) -> np.ndarray:
+    """(n_angles, 4) beam delays in ns, without offsets."""
+    angles = np.atleast_1d(np.asarray(angles_deg, dtype=float))
+    dt = n_ice * spacing_m * np.sin(np.deg2rad(angles)) / C * 1e9
+    if reverse:
+        dt = -dt
+    delays = np.round(np.arange(4) * np.abs(dt)[:, None], decimals)
+    delays[dt < 0] = delays[dt < 0, ::-1]
+    return delays
+
+
+class DelayPresets:
+    """
+    Compiled presets: `angles` (n,), `delays` (n, 4) in ns, `commands` (one
+    T660 command list per angle) and the `params` they were compiled from.
+    """
+
+    def __init__(self, angles: np.ndarray, delays: np.ndarray, commands: List[List[str]], params: Dict):
+        self.angles = angles
+        self.delays = delays
+        self.commands = commands
+        self.params = params
+        self._by_delays = {tuple(np.round(row, 3)): cmds for row, cmds in zip(delays, commands)}
+
+    def __len__(self) -> int:
+        return len(self.angles)
+
+    def __iter__(self) -> Iterator[Tuple[float, List[float], List[str]]]:
+        """(angle, delays, commands) of every angle."""
+        for angle, delays, cmds in zip(self.angles, self.delays, self.commands):
+            yield float(angle), delays.tolist(), cmds
+
+    def format(self, delays_ns: Sequence[float]) -> List[str]:
+        """Commands of a compiled delay set (formatted on the spot if it is not one)."""
+        key = tuple(np.round(np.asarray(delays_ns, dtype=float), 3))
+        if key in self._by_delays:
+            return self._by_delays[key]
+        return format_presets([delays_ns], self.params["width"], self.params["channel_map"],
+                              self.params["channel_order"])[0]
+
+
+def compile_presets(angles_deg, *, beam: Optional[Sequence[Sequence[float]]] = None, n_ice: float = N_ICE,
+                    spacing_m: float = SPACING_M, reverse: bool = False, offsets_ns: Sequence[float] = (0, 0, 0, 0),
+                    cable_delays_ns: Sequence[float] = (0, 0, 0, 0), decimals: int = DECIMALS,
+                    width: str = PULSE_WIDTH, channel_map: Dict[str, str] = CHANNEL_MAP,
+                    channel_order: Sequence[str] = CHANNEL_ORDER, cache: bool = True) -> DelayPresets:
+    """
+    Delays and T660 commands for every angle.
+
+    Parameters
+    ----------
+    angles_deg : array-like
+        Angles in scan order.
+    beam : array-like, optional
+        (n_angles, 4) custom beam delays in ns, used instead of the geometry
+        (n_ice, spacing_m, reverse, decimals).
+    offsets_ns, cable_delays_ns : sequence of float
+        Per-channel calibration offsets and cable delays added to the beam.
+    cache : bool
+        Keep the compiled presets in CACHE_DIR, keyed by all the
+        parameters, and load them from there next time.
+    """
+    angles = np.atleast_1d(np.asarray(angles_deg, dtype=float))
+    params = {"angles": angles.tolist(), "offsets_ns": [float(v) for v in offsets_ns],
+              "cable_delays_ns": [float(v) for v in cable_delays_ns], "width": width,
+              "channel_map": dict(channel_map), "channel_order": list(channel_order)}
+    if beam is not None:
+        params["beam"] = np.asarray(beam, dtype=float).tolist()
+    else:
+        params.update(n_ice=n_ice, spacing_m=spacing_m, reverse=reverse, decimals=decimals)
+    key = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+    path = CACHE_DIR / f"presets_{key}.npz"
+
+    if cache and path.exists():
+        with np.load(path) as data:
+            return DelayPresets(data["angles"], data["delays"], data["commands"].tolist(), params)
+
+    if beam is None:
+        beam = beam_delays(angles, n_ice, spacing_m, reverse, decimals)
+    beam = np.asarray(beam, dtype=float)
+    if beam.shape != (len(angles), 4):
+        raise ValueError(f"expected beam delays of shape ({len(angles)}, 4), got {beam.shape}")
+    delays = beam + np.asarray(params["offsets_ns"]) + np.asarray(params["cable_delays_ns"])
+    commands = format_presets(delays, width, channel_map, channel_order)
+    if cache:
+        CACHE_DIR.mkdir(exist_ok=True)
+        tmp = path.with_name(path.stem + ".tmp.npz")
+        np.savez(tmp, angles=angles, delays=delays, commands=np.array(commands))
+        tmp.replace(path)
+    return DelayPresets(angles, delays, commands, params)
+
+
+def load_custom_presets(json_path, **kwargs) -> DelayPresets:
+    """compile_presets for a {"angles": [...], "delays": [[4 ns] ...]} file of custom beam delays."""
+    with open(json_path) as f:
+        data = json.load(f)
+    return compile_presets(data["angles"], beam=data["delays"], **kwargs)
@@ -0,0 +1,198 @@
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+class LatencyStats:
+    """Queue wait and service time of every command a DeviceWorker ran."""
+
+    def __init__(self):
+        self.queued: List[float] = []
+        self.service: List[float] = []
+        self.errors = 0
+
+    def add(self, queued_s: float, service_s: float) -> None:
+        self.queued.append(queued_s)
+        self.service.append(service_s)
+
+    def summary(self, name: str) -> str:
+        if not self.service:
+            return f"[TIME]   {name:<7s} no commands"
+        service = np.array(self.service) * 1e3
+        return (f"[TIME]   {name:<7s} {len(service):5d} cmds  service mean {service.mean():7.2f} ms  "
+                f"p95 {np.percentile(service, 95):7.2f} ms  max {service.max():7.2f} ms  "
+                f"queued mean {1e3 * np.mean(self.queued):6.2f} ms  errors {self.errors}")
+
+
+class DeviceWorker:
+    """
+    One device (serial port, I2C bus, FLOWER socket) behind a command queue.
+
+    Commands are blocking driver calls; the worker runs them one at a time,
+    in the order they were queued, on its own thread, so a device never sees
+    two commands at once while different devices work in parallel. `call`
+    queues a command and returns its result (or raises its exception) when
+    it has run.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stats = LatencyStats()
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            await self._queue.put(None)
+            await self._task
+            self._task = None
+        self._executor.shutdown(wait=True)
+
+    async def call(self, func: Callable, *args, **kwargs):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((func, args, kwargs, future, time.perf_counter()))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                break
+            func, args, kwargs, future, queued_at = item
+            t0 = time.perf_counter()
+            try:
+                result = await loop.run_in_executor(self._executor, lambda: func(*args, **kwargs))
+            except Exception as e:
+                self.stats.errors += 1
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            self.stats.add(t0 - queued_at, time.perf_counter() - t0)
+
+
+class Orchestrator:
+    """
+    Drives the T660, the attenuator board and the FLOWER concurrently.
+
+    Each device gets a DeviceWorker. A configuration change writes the delay
+    batch and the attenuation codes at the same time (serial and I2C are
+    independent), so it costs the slower of the two instead of their sum;
+    the FLOWER request of a point is only sent once both are applied and
+    have settled. Latencies per device are kept in the workers' stats and
+    printed by `summary`.
+
+    Usage:
+        async with Orchestrator(t660, attenuators, flower) as hw:
+            reply = await hw.measure_point(delays, att_code, settle=SettlePolicy(),
+                                           measure_params={"mode": "coinc"})
+
+    Parameters
+    ----------
+    t660 : T660
+    attenuators : PE43713Bank
+    flower : FlowerClient, optional
+        Needed only for measure / measure_point.
+    """
+
+    def __init__(self, t660, attenuators, flower=None):
+        self.t660 = t660
+        self.attenuators = attenuators
+        self.flower = flower
+        self.workers: Dict[str, DeviceWorker] = {"t660": DeviceWorker("t660"), "i2c": DeviceWorker("i2c")}
+        if flower is not None:
+            self.workers["flower"] = DeviceWorker("flower")
+        self._started = time.perf_counter()
+
+    async def __aenter__(self):
+        for worker in self.workers.values():
+            worker.start()
+        self._started = time.perf_counter()
+        return self
+
+    async def __aexit__(self, *exc):
+        for worker in self.workers.values():
+            await worker.stop()
+
+    # === devices ===
+    async def send_t660(self, cmds: Sequence[str]) -> Dict[str, str]:
+        return await self.workers["t660"].call(self.t660.transaction, list(cmds))
+
+    async def set_delays(self, delays_ns: Sequence[float]) -> Dict[str, str]:
+        return await self.send_t660(self.t660.preset_commands(delays_ns))
+
+    async def set_attenuation(self, codes) -> List[int]:
+        """One code for every channel, or a sequence with one code per channel."""
+        if np.ndim(codes) == 0:
+            return await self.workers["i2c"].call(self.attenuators.set_all, codes)
+        return await self.workers["i2c"].call(self.attenuators.set_codes, list(codes))
+
+    async def request(self, cmd: str, **params) -> dict:
+        return await self.workers["flower"].call(self.flower.request, cmd, **params)
+
+    # === scan steps ===
+    async def apply(self, delays_ns: Optional[Sequence[float]] = None, codes=None,
+                    t660_cmds: Optional[Sequence[str]] = None) -> List[str]:
+        """
+        Apply delays (a preset, or raw T660 commands) and attenuation codes
+        concurrently. Returns what changed ("delays", "attenuation").
+        """
+        jobs, kinds = [], []
+        if delays_ns is not None:
+            jobs.append(self.set_delays(delays_ns)); kinds.append("delays")
+        elif t660_cmds:
+            jobs.append(self.send_t660(t660_cmds)); kinds.append("delays")
+        if codes is not None:
+            jobs.append(self.set_attenuation(codes)); kinds.append("attenuation")
+        results = await asyncio.gather(*jobs)
+        return [kind for kind, result in zip(kinds, results) if result]
+
+    async def measure_point(self, delays_ns: Sequence[float], att_code, settle=None,
+                            measure_params: Optional[Dict] = None, record: Optional[Dict] = None) -> dict:
+        """
+        apply → settle → measure for one point. `att_code` is one code for
+        every channel or one per channel, as in set_attenuation, and is
+        recorded as attenuation_code (a list in the second case). `settle`
+        is a scan_scheduler SettlePolicy (or FlowerSettle); nothing is
+        waited if nothing changed.
+        """
+        changed = await self.apply(delays_ns, att_code)
+        params = dict(measure_params or {})
+        if settle is not None:
+            await asyncio.sleep(settle.wait_time(changed))
+            params.update(settle.request_params(changed))
+        code = float(att_code) if np.ndim(att_code) == 0 else [float(c) for c in att_code]
+        record = dict(record or {}, attenuation_code=code)
+        return await self.request("measure", record=record, **params)
+
+    async def paced(self, steps, period_s: float) -> int:
+        """
+        Apply `steps` (dicts of apply() keyword arguments) one every
+        `period_s` on a fixed schedule, so the time the devices take is not
+        added to the period. Returns the number of steps that ran late.
+        """
+        loop = asyncio.get_running_loop()
+        start, late = loop.time(), 0
+        for i, step in enumerate(steps):
+            await self.apply(**step)
+            wait = start + (i + 1) * period_s - loop.time()
+            if wait < 0:
+                late += 1
+            await asyncio.sleep(max(wait, 0.0))
+        return late
+
+    def summary(self) -> str:
+        wall = time.perf_counter() - self._started
+        lines = [f"[TIME] devices over {wall:.1f} s"]
+        lines += [worker.stats.summary(name) for name, worker in self.workers.items()]
+        return "\n".join(lines)
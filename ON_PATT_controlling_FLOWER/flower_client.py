@@ -0,0 +1,79 @@
+import json
+import socket
+from typing import Dict, List, Optional, Set
+
+
+class FlowerClient:
+    """
+    Client for ON_FLOWER_receiving_from_PATT/flower_scan_server.py.
+
+    Messages are newline-delimited JSON with request ids, so several
+    requests can be in flight at once: `send` returns immediately with the
+    request id and `result` waits for the reply to that id, keeping replies
+    to other requests for later.
+
+    Usage:
+        with FlowerClient(FLOWER_IP, PORT) as flower:
+            flower.request("start_scan", json_file="scan.json")
+            rid = flower.send("measure", mode="coinc", record={"angle_deg": 10})
+            ...                                   # prepare the next point meanwhile
+            reply = flower.result(rid)            # {"ok": True, "efficiency": ..., ...}
+    """
+
+    def __init__(self, host: str, port: int = 9000, timeout: Optional[float] = None):
+        self.sock = socket.create_connection((host, port))
+        self.sock.settimeout(timeout)
+        self._file = self.sock.makefile("rwb")
+        self._next_id = 0
+        self._replies: Dict[int, dict] = {}
+        self._outstanding: Set[int] = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        self._file.close()
+        self.sock.close()
+
+    def send(self, cmd: str, **params) -> int:
+        """Queue a request on the server; returns its id."""
+        self._next_id += 1
+        message = dict(params, id=self._next_id, cmd=cmd)
+        self._file.write((json.dumps(message) + "\n").encode())
+        self._file.flush()
+        self._outstanding.add(self._next_id)
+        return self._next_id
+
+    def result(self, request_id: int) -> dict:
+        """Block until the reply to `request_id` arrives."""
+        while request_id not in self._replies:
+            line = self._file.readline()
+            if not line:
+                raise ConnectionError("FLOWER server closed the connection")
+            reply = json.loads(line)
+            self._replies[reply.get("id")] = reply
+        self._outstanding.discard(request_id)
+        return self._replies.pop(request_id)
+
+    def request(self, cmd: str, **params) -> dict:
+        """Send one request and wait for its reply."""
+        return self.result(self.send(cmd, **params))
+
+    def points(self, fields: Optional[List[str]] = None) -> Dict[str, dict]:
+        """
+        Points (run_name -> requested fields of the stored record) already in
+        the current scan on the FLOWER, so a restarted scan can skip them.
+        """
+        reply = self.request("points", fields=list(fields or []))
+        if not reply["ok"]:
+            raise RuntimeError(f"FLOWER: {reply['error']}")
+        points = reply["points"]
+        return points if isinstance(points, dict) else {key: {} for key in points}
+
+    @property
+    def pending(self) -> int:
+        """Requests sent whose replies have not been collected."""
+        return len(self._outstanding)
@@ -1,11 +1,15 @@
 import time
-import serial
 import socket
 import json
 from pathlib import Path
 import numpy as np
 from typing import List
-from attenuation_control import apply_attenuation_to_all_channels
+from attenuation_control import apply_attenuation_to_all_channels, attenuation_to_percent
+from adaptive_scan import adaptive_attenuation_scan, parse_efficiency_reply
+from t660 import T660
+from delay_presets import compile_presets
+from sim_backends import simulation_requested, sim_path, bench
+from scan_plan import ScanPlan, Checkpoint, checkpointed, resume_requested, run_name
 
 
 # === opening angles and delays ===
@@ -25,21 +29,32 @@ print("Loaded", len(angles), "angles, delays shape:", delays.shape)
 # === Parameters ===
 in_angles = angles  # degrees
 attenuation_codes = np.arange(40, 105, 2)  # DAC values for attenuation (0–127)
+ADAPTIVE_SCAN = True  # concentrate codes around the 50% point; False scans every code
+TARGET_X50_ERR = 0.5  # stop an angle once its 50% point is known to this many % (1σ)
+EFFICIENCY_N = 1000  # pulses behind one efficiency reading
+CHECKPOINT_FILE = "patt_scan_checkpoint_custom_delays.jsonl"  # finished points; `python patt_angle_and_attenuation_scan_custom_delays.py resume` continues from it
+SIMULATE = simulation_requested()  # `--sim`: simulated T660, attenuators and FLOWER (sim_backends.py)
 calibration_delays = [5.19, 0, 5.21, 6.08]  # per-channel fixed delay offsets (ns)
+DELAY_SETTLE_S = 0.3  # wait after a T660 delay preset that changed something
 #cable_delays = [14.205, 9.492, 4.369, 0.00]  # ns
 
 # === Channel/serial setup ===
 CHANNEL_MAP = {"C1": "A", "C2": "B", "C3": "C", "C4": "D"}
 CHANNEL_ORDER: List[str] = ["C1", "C2", "C3", "C4"]
 
-ser = serial.Serial(
-    port="/dev/ttyUSB0",
-    baudrate=38400,
-    timeout=1,
-    stopbits=serial.STOPBITS_ONE,
-    bytesize=serial.EIGHTBITS
-)
-ser.close(); ser.open()
+if SIMULATE:
+    ser = bench().t660
+else:
+    import serial
+    ser = serial.Serial(
+        port="/dev/ttyUSB0",
+        baudrate=38400,
+        timeout=1,
+        stopbits=serial.STOPBITS_ONE,
+        bytesize=serial.EIGHTBITS
+    )
+    ser.close(); ser.open()
+t660 = T660(ser, loud=True, channel_map=CHANNEL_MAP, channel_order=CHANNEL_ORDER)  # skips the T660 commands that would not change anything
 
 # === Network settings ===
 FLOWER_IP = "10.42.1.228"
@@ -50,64 +65,59 @@ PORT = 9000
 n_ice= 1.75  #index of refraction in ice
 vertical_seperation= 1 #distance betwwen channel in meters
 channel_weights= [1,1,1,1] #the weight attributed to each channel
-c= 299792458 #speed of light in a vaccum in m/s
 
 
-def angle_delay_time(index, distance, speed, angle ):
-    angle=np.deg2rad(angle)
-
-    #this is the offset in time of each signal that is generated
-    time_delays= index * distance * np.sin(angle) / speed
-    return -time_delays*1e9 # ns #- because ch3 is on top and ch0 is at the bottom this is to flip th order of the delays
-
+# === Precompute all delay sets ===
+presets = compile_presets(in_angles, beam=delays, offsets_ns=calibration_delays,
+                          channel_map=CHANNEL_MAP, channel_order=CHANNEL_ORDER)
+delay_list = presets.delays.tolist()
 
-def send(cmd: str, loud: bool = True) -> str:
-    ser.write((cmd + "\n").encode())
-    resp = ser.readline().decode().strip()
-    if loud:
-        print(f"[SERIAL] {cmd} → {resp}")
-    return resp
+# === Simulated bench ===
+if SIMULATE:
+    bench().offsets_ns = [calibration_delays[i] for i in range(4)]
+    bench().n_ice = n_ice
+    FLOWER_IP, PORT = bench().start_legacy_flower()
+    CHECKPOINT_FILE = sim_path(CHECKPOINT_FILE)
 
-def apply_delay_preset(delays_ns: List[float]) -> None:
-    for ch, delay_ns in zip(CHANNEL_ORDER, delays_ns):
-        cmd = f"{CHANNEL_MAP[ch]}D {round(delay_ns,3)}n"
-        send(cmd)
-    send("DW 2u")
-    send("DSET")
-    for ch in CHANNEL_ORDER:
-        send(f"{CHANNEL_MAP[ch]}SET")
-    time.sleep(0.3)
-
-# === Precompute all delay sets ===
-delay_list = []
-for delay in delays:
-    delays_ns = [delay[i] + calibration_delays[i]  for i in range(4)]
-    delay_list.append(delays_ns)
+plan = ScanPlan("angle_and_attenuation_scan_custom_delays", in_angles, delay_list, attenuation_codes,
+                mode="coinc", adaptive=ADAPTIVE_SCAN)
 
 # === Main loop ===
 def main():
+    checkpoint = Checkpoint(CHECKPOINT_FILE, plan, resume=resume_requested())
     print("[RUN ] Connecting to FLOWER and beginning scan…\n")
 
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
         sock.connect((FLOWER_IP, PORT))
         print(f"[NET ] Connected to FLOWER @ {FLOWER_IP}:{PORT}")
 
-        for i, delay_set in enumerate(delay_list):
-            angle = in_angles[i]
+        for i, angle, delay_set in checkpoint.remaining():
             print(f"\n[STEP] Angle {angle:+05.1f}° → delays = {delay_set} (ns)")
-            apply_delay_preset(delay_set)
+            t660.apply(presets.commands[i], settle_s=DELAY_SETTLE_S)
 
-            for att_code in attenuation_codes:
+            def measure(att_code):
                 pct = apply_attenuation_to_all_channels(att_code)
                 time.sleep(2)
 
-                run_name = f"ang{angle:+05.1f}_att{att_code:06.2f}"
-                msg = f"{angle},{att_code},{pct:.2f},{run_name}"
+                msg = f"{angle},{att_code},{pct:.2f},{run_name(angle, att_code)}"
                 sock.sendall(msg.encode())
 
                 reply = sock.recv(1024).decode().strip()
                 print(f"  ↳ att {att_code:6.2f} (≈{pct:6.2f}%): {reply}")
-
+                return parse_efficiency_reply(reply)
+
+            measure_point = checkpointed(measure, checkpoint, angle)  # skips the points already done
+            if ADAPTIVE_SCAN:
+                scan = adaptive_attenuation_scan(attenuation_codes, measure_point, attenuation_to_percent,
+                                                 n_trials=EFFICIENCY_N, target_x50_err=TARGET_X50_ERR)
+                x50, x50_err, _ = scan.fit()
+                print(f"  ↳ 50% point ≈ {x50:.2f} ± {x50_err:.2f} % after {len(scan.x)} points")
+                checkpoint.mark_angle(i, x50=x50, x50_err=x50_err, n_points=len(scan.x))
+            else:
+                for att_code in attenuation_codes:
+                    measure_point(att_code)
+
+    print(checkpoint.summary())
     print("\n[DONE] Full scan finished.")
     ser.close()
 
@@ -116,4 +126,9 @@ if __name__ == "__main__":
         main()
     except KeyboardInterrupt:
         print("\n[ABORT] Scan interrupted by user.")
+        print("[ABORT] Continue with: python patt_angle_and_attenuation_scan_custom_delays.py resume")
+        ser.close()
+    except OSError as e:  # serial or network failure
+        print(f"\n[ABORT] {e}")
+        print("[ABORT] Continue with: python patt_angle_and_attenuation_scan_custom_delays.py resume")
         ser.close()
@@ -1,11 +1,16 @@
 import time
-import serial
-import socket
 import json
 from pathlib import Path
 import numpy as np
 from typing import List
-from attenuation_control import apply_attenuation_to_all_channels
+from attenuation_control import apply_attenuation_to_all_channels, attenuation_to_percent
+from adaptive_scan import adaptive_attenuation_scan
+from flower_client import FlowerClient
+from scan_scheduler import ScanScheduler, SettlePolicy, FlowerSettle
+from t660 import T660
+from delay_presets import compile_presets
+from sim_backends import simulation_requested, sim_path, bench
+from scan_plan import ScanPlan, Checkpoint, checkpointed, resume_requested, run_name, stored_efficiency
 
 
 # === opening angles and delays ===
@@ -25,6 +30,19 @@ print("Loaded", len(angles), "angles, delays shape:", delays.shape)
 # === Parameters ===
 in_angles = angles  # degrees
 attenuation_codes = np.arange(40, 105, 2)  # DAC values for attenuation (0–127)
+ADAPTIVE_SCAN = True  # concentrate codes around the 50% point; False scans every code
+TARGET_X50_ERR = 0.5  # stop an angle once its 50% point is known to this many % (1σ)
+EFFICIENCY_N = 1000  # pulses behind one efficiency reading
+EFFICIENCY_TARGET_ERR = 0.005  # FLOWER reads the scaler until the efficiency is known to this (1σ), None for fixed n_ave;
+                               # ~10 gates of 1000 pulses at 50%, one gate at 0% or 100%
+EFFICIENCY_MAX_TIME_S = 10.0  # cap on one adaptive reading
+DELAY_SETTLE_S = 0.3  # wait after a new T660 delay preset
+ATTENUATION_SETTLE_S = 2.0  # wait after a new attenuation code
+COMBINED_MEASUREMENT = False  # also record the p2p, noise RMS and SNR of every point in the same visit (slower per point)
+SETTLE_DETECTION = False  # let the FLOWER wait until the trigger scaler is stable (once per ~1 s gate) instead of the fixed waits above
+CHECKPOINT_FILE = "patt_scan_checkpoint_phased_custom_delays.jsonl"  # finished points; `python patt_angle_and_attenuation_scan_phased_custom_delays.py resume` continues from it
+SIMULATE = simulation_requested()  # `--sim`: simulated T660, attenuators and FLOWER (sim_backends.py)
+PATT_LOG_FILE = "patt_scan_log_phased_custom_delays.jsonl"  # local copy of every point, one JSON per line
 calibration_delays = [5.19, 0, 5.21, 6.08]  # per-channel fixed delay offsets (ns)
 cable_delays = [14.205, 9.492, 4.369, 0.00]  # ns
 
@@ -32,81 +50,117 @@ cable_delays = [14.205, 9.492, 4.369, 0.00]  # ns
 CHANNEL_MAP = {"C1": "A", "C2": "B", "C3": "C", "C4": "D"}
 CHANNEL_ORDER: List[str] = ["C1", "C2", "C3", "C4"]
 
-ser = serial.Serial(
-    port="/dev/ttyUSB0",
-    baudrate=38400,
-    timeout=1,
-    stopbits=serial.STOPBITS_ONE,
-    bytesize=serial.EIGHTBITS
-)
-ser.close(); ser.open()
+if SIMULATE:
+    ser = bench().t660
+else:
+    import serial
+    ser = serial.Serial(
+        port="/dev/ttyUSB0",
+        baudrate=38400,
+        timeout=1,
+        stopbits=serial.STOPBITS_ONE,
+        bytesize=serial.EIGHTBITS
+    )
+    ser.close(); ser.open()
+t660 = T660(ser, loud=True, channel_map=CHANNEL_MAP, channel_order=CHANNEL_ORDER)  # skips the T660 commands that would not change anything
 
 # === Network settings ===
 FLOWER_IP = "10.42.1.228"
 PORT = 9000
+FLOWER_JSON_FILE = "phased_full_scan_custom_delays.json"  # written on the FLOWER by flower_scan_server.py
 
 
 # === Physics ===
 n_ice= 1.75  #index of refraction in ice
 vertical_seperation= 1 #distance betwwen channel in meters
 channel_weights= [1,1,1,1] #the weight attributed to each channel
-c= 299792458 #speed of light in a vaccum in m/s
 
 
-def angle_delay_time(index, distance, speed, angle ):
-    angle=np.deg2rad(angle)
-
-    #this is the offset in time of each signal that is generated
-    time_delays= index * distance * np.sin(angle) / speed
-    return -time_delays*1e9 # ns #- because ch3 is on top and ch0 is at the bottom this is to flip th order of the delays
-
-
-def send(cmd: str, loud: bool = True) -> str:
-    ser.write((cmd + "\n").encode())
-    resp = ser.readline().decode().strip()
-    if loud:
-        print(f"[SERIAL] {cmd} → {resp}")
-    return resp
-
-def apply_delay_preset(delays_ns: List[float]) -> None:
-    for ch, delay_ns in zip(CHANNEL_ORDER, delays_ns):
-        cmd = f"{CHANNEL_MAP[ch]}D {round(delay_ns,3)}n"
-        send(cmd)
-    send("DW 2u")
-    send("DSET")
-    for ch in CHANNEL_ORDER:
-        send(f"{CHANNEL_MAP[ch]}SET")
-    time.sleep(0.3)
+def log_point(entry) -> None:
+    with open(PATT_LOG_FILE, "a") as f:
+        f.write(json.dumps(entry) + "\n")
 
 # === Precompute all delay sets ===
-delay_list = []
-for delay in delays:
-    delays_ns = [delay[i] + calibration_delays[i] + cable_delays[i] for i in range(4)]
-    delay_list.append(delays_ns)
+presets = compile_presets(in_angles, beam=delays, offsets_ns=calibration_delays, cable_delays_ns=cable_delays,
+                          channel_map=CHANNEL_MAP, channel_order=CHANNEL_ORDER)
+delay_list = presets.delays.tolist()
+
+# === Simulated bench ===
+if SIMULATE:
+    bench().offsets_ns = [calibration_delays[i] + cable_delays[i] for i in range(4)]
+    bench().n_ice = n_ice
+    FLOWER_IP, PORT = bench().start_flower()
+    CHECKPOINT_FILE = sim_path(CHECKPOINT_FILE)
+    PATT_LOG_FILE = sim_path(PATT_LOG_FILE)
+    FLOWER_JSON_FILE = sim_path(FLOWER_JSON_FILE)
+
+plan = ScanPlan("angle_and_attenuation_scan_phased_custom_delays", in_angles, delay_list, attenuation_codes,
+                mode="combined_phased" if COMBINED_MEASUREMENT else "coinc_phased", adaptive=ADAPTIVE_SCAN)
 
 # === Main loop ===
 def main():
+    resume = resume_requested()
+    checkpoint = Checkpoint(CHECKPOINT_FILE, plan, resume=resume)
     print("[RUN ] Connecting to FLOWER and beginning scan…\n")
 
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-        sock.connect((FLOWER_IP, PORT))
+    with FlowerClient(FLOWER_IP, PORT) as flower:
         print(f"[NET ] Connected to FLOWER @ {FLOWER_IP}:{PORT}")
-
-        for i, delay_set in enumerate(delay_list):
-            angle = in_angles[i]
+        flower.request("start_scan", json_file=FLOWER_JSON_FILE, resume=resume)
+        # points the FLOWER stored but the checkpoint missed (e.g. lost with the PATT)
+        on_flower = {name: result for name, result in flower.points(["efficiency", "n_trials"]).items()
+                     if result.get("efficiency") is not None} if resume else {}
+        measure_params = {"mode": plan.mode}
+        if EFFICIENCY_TARGET_ERR is not None:
+            measure_params.update(target_err=EFFICIENCY_TARGET_ERR, max_time_s=EFFICIENCY_MAX_TIME_S)
+        scheduler = ScanScheduler(flower, format_delays=presets.format, send_commands=t660.transaction,
+                                  set_attenuation=apply_attenuation_to_all_channels,
+                                  settle=FlowerSettle("scaler") if SETTLE_DETECTION
+                                  else SettlePolicy(DELAY_SETTLE_S, ATTENUATION_SETTLE_S),
+                                  measure_params=measure_params, record=log_point)
+
+        remaining = checkpoint.remaining()
+        for step, (i, angle, delay_set) in enumerate(remaining):
+            next_delays = remaining[step + 1][2] if step + 1 < len(remaining) else None
             print(f"\n[STEP] Angle {angle:+05.1f}° → delays = {delay_set} (ns)")
-            apply_delay_preset(delay_set)
-
-            for att_code in attenuation_codes:
-                pct = apply_attenuation_to_all_channels(att_code)
-                time.sleep(2)
 
-                run_name = f"ang{angle:+05.1f}_att{att_code:06.2f}"
-                msg = f"{angle},{att_code},{pct:.2f},{run_name}"
-                sock.sendall(msg.encode())
-
-                reply = sock.recv(1024).decode().strip()
-                print(f"  ↳ att {att_code:6.2f} (≈{pct:6.2f}%): {reply}")
+            def measure(att_code):
+                name = run_name(angle, att_code)
+                if name in on_flower:
+                    print(f"  ↳ att {att_code:6.2f}: stored on the FLOWER, efficiency = {on_flower[name]['efficiency']:.4f}")
+                    return stored_efficiency(on_flower[name])
+                reply = scheduler.measure_point(delay_set, att_code, next_delays=next_delays,
+                                                record={"angle_deg": float(angle), "run_name": name})
+                pct = reply["attenuation_percent"]
+                if not reply["ok"]:
+                    print(f"  ↳ att {att_code:6.2f} (≈{pct:6.2f}%): [ERROR] {reply['error']}")
+                    return None
+                if "snr" in reply:
+                    print(f"  ↳ att {att_code:6.2f} (≈{pct:6.2f}%): Efficiency = {reply['efficiency']:.4f} "
+                          f"± {reply['efficiency_err']:.4f}, SNR = {np.mean(reply['snr']):.2f}")
+                    return reply["efficiency"], reply["n_trials"]
+                if "efficiency_err" in reply:
+                    print(f"  ↳ att {att_code:6.2f} (≈{pct:6.2f}%): Efficiency = {reply['efficiency']:.4f} "
+                          f"± {reply['efficiency_err']:.4f} ({reply['n_reads']} reads)")
+                    return reply["efficiency"], reply["n_trials"]
+                print(f"  ↳ att {att_code:6.2f} (≈{pct:6.2f}%): Efficiency = {reply['efficiency']:.4f}")
+                return reply["efficiency"]
+
+            measure_point = checkpointed(measure, checkpoint, angle)  # skips the points already done
+            if ADAPTIVE_SCAN:
+                scan = adaptive_attenuation_scan(attenuation_codes, measure_point, attenuation_to_percent,
+                                                 n_trials=EFFICIENCY_N, target_x50_err=TARGET_X50_ERR)
+                x50, x50_err, _ = scan.fit()
+                print(f"  ↳ 50% point ≈ {x50:.2f} ± {x50_err:.2f} % after {len(scan.x)} points")
+                checkpoint.mark_angle(i, x50=x50, x50_err=x50_err, n_points=len(scan.x))
+            else:
+                for att_code in attenuation_codes:
+                    measure_point(att_code)
+
+        reply = flower.request("end_scan")
+        print(f"[NET ] FLOWER saved {reply.get('n_records')} records to {reply.get('json_file')}")
+        scheduler.close()
+        print(scheduler.summary())
+        print(checkpoint.summary())
 
     print("\n[DONE] Full scan finished.")
     ser.close()
@@ -116,4 +170,9 @@ if __name__ == "__main__":
         main()
     except KeyboardInterrupt:
         print("\n[ABORT] Scan interrupted by user.")
+        print("[ABORT] Continue with: python patt_angle_and_attenuation_scan_phased_custom_delays.py resume")
+        ser.close()
+    except OSError as e:  # serial or network failure
+        print(f"\n[ABORT] {e}")
+        print("[ABORT] Continue with: python patt_angle_and_attenuation_scan_phased_custom_delays.py resume")
         ser.close()
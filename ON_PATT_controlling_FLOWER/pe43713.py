@@ -0,0 +1,147 @@
+import time
+from typing import Dict, List, Optional, Sequence
+
+I2C_BUS = 2  # i2c2 is used on the BBB
+OUTPUT_REG = 0x01
+CONFIG_REG = 0x03
+CHANNEL_ADDRESSES: List[int] = [0x3e, 0x3c, 0x3a, 0x38]  # channels A, B, C, D
+CHANNEL_LABELS: List[str] = ['A', 'B', 'C', 'D']
+
+
+def register_value(atten_value) -> int:
+    """
+    Expander output register value for a PE43713 code (0–127, 4 × dB):
+    the 7 bits are parallel loaded following the schematic and
+    https://www.psemi.com/pdf/datasheets/pe43713ds.pdf
+    """
+    atten_value = int(round(float(atten_value)))
+    if not 0 <= atten_value <= 127:
+        raise ValueError(f"attenuation code {atten_value} outside 0–127")
+    bits = '{:07b}'.format(atten_value)
+    return int("0" + bits[0:3] + bits[7:2:-1], 2)
+
+
+class PE43713Bank:
+    """
+    The PE43713 step attenuators of the PATT, one per channel, each loaded
+    in parallel through an I2C port expander.
+
+    The expanders are configured once, the first time a channel is set,
+    and the value of every output register is shadowed in memory. Setting
+    a code then costs one SMBus write per channel whose code changed, and
+    none for the others, instead of the setup / read-modify-write / write
+    sequence (5 transactions per channel) of the older scripts. A channel
+    is configured by writing its code before switching the pins to outputs,
+    so it never passes through 0 dB on the way.
+
+    Call invalidate() if the attenuators were powered off or set by another
+    process; the next set then configures and writes every channel again.
+
+    Parameters
+    ----------
+    bus : smbus.SMBus or FakeSMBus, optional
+        Defaults to smbus.SMBus(bus_number).
+    addresses : sequence of int
+        Expander addresses of the channels, in channel order.
+    """
+
+    def __init__(self, bus=None, addresses: Sequence[int] = CHANNEL_ADDRESSES, bus_number: int = I2C_BUS):
+        if bus is None:
+            import smbus
+            bus = smbus.SMBus(bus_number)
+        self.bus = bus
+        self.addresses = list(addresses)
+        self.shadow: Dict[int, int] = {}  # address -> output register value last written
+        self.writes = 0
+
+    def invalidate(self) -> None:
+        self.shadow.clear()
+
+    def _write(self, address: int, register: int, value: int) -> None:
+        self.bus.write_byte_data(address, register, value)
+        self.writes += 1
+
+    def _load(self, address: int, value: int) -> bool:
+        if address not in self.shadow:
+            self._write(address, OUTPUT_REG, value)
+            self._write(address, CONFIG_REG, 0x00)  # all pins as outputs
+        elif self.shadow[address] != value:
+            self._write(address, OUTPUT_REG, value)
+        else:
+            return False
+        self.shadow[address] = value
+        return True
+
+    def set_channel(self, index: int, atten_value) -> bool:
+        """Set one channel; returns False if it already had that code."""
+        return self._load(self.addresses[index], register_value(atten_value))
+
+    def set_codes(self, atten_values: Sequence) -> List[int]:
+        """Set every channel to its own code; returns the indices written."""
+        if len(atten_values) != len(self.addresses):
+            raise ValueError(f"{len(atten_values)} codes for {len(self.addresses)} channels")
+        values = [register_value(v) for v in atten_values]
+        return [i for i, (address, value) in enumerate(zip(self.addresses, values))
+                if self._load(address, value)]
+
+    def set_all(self, atten_value) -> List[int]:
+        """Same code on every channel; returns the indices written."""
+        return self.set_codes([atten_value] * len(self.addresses))
+
+    def codes(self) -> List[Optional[int]]:
+        """Codes currently loaded (None for channels not set yet)."""
+        inverse = {register_value(code): code for code in range(128)}
+        return [inverse.get(self.shadow.get(address)) for address in self.addresses]
+
+
+class FakeSMBus:
+    """
+    In-memory stand-in for smbus.SMBus: keeps the registers of every
+    address, counts transactions and optionally waits `transaction_s` per
+    transaction to mimic the bus, for tests and benchmarks without the PATT.
+    """
+
+    def __init__(self, transaction_s: float = 0.0):
+        self.transaction_s = transaction_s
+        self.registers: Dict[int, Dict[int, int]] = {}
+        self.transactions = 0
+
+    def _transaction(self):
+        self.transactions += 1
+        if self.transaction_s:
+            time.sleep(self.transaction_s)
+
+    def write_byte_data(self, address: int, register: int, value: int) -> None:
+        self._transaction()
+        self.registers.setdefault(address, {})[register] = value & 0xff
+
+    def read_byte_data(self, address: int, register: int) -> int:
+        self._transaction()
+        return self.registers.get(address, {}).get(register, 0)
+
+
+if __name__ == "__main__":
+    # Benchmark: a 100-step sweep of one channel with the others fixed, as in
+    # full_simulation_v3.py, with the older per-step sequence and with the driver.
+    TRANSACTION_S = 0.0005  # roughly one 100 kHz SMBus byte-data transaction
+    codes = [round(i * 127 / 100) for i in range(101)]
+
+    legacy = FakeSMBus(TRANSACTION_S)
+    t0 = time.perf_counter()
+    for code in codes:
+        for index, address in enumerate(CHANNEL_ADDRESSES):
+            legacy.write_byte_data(address, OUTPUT_REG, 0x00)
+            legacy.write_byte_data(address, CONFIG_REG, 0x00)
+            legacy.write_byte_data(address, OUTPUT_REG, legacy.read_byte_data(address, OUTPUT_REG) | 0x02)
+            legacy.write_byte_data(address, OUTPUT_REG, register_value(code if index == 0 else 0))
+    t_legacy = time.perf_counter() - t0
+
+    bus = FakeSMBus(TRANSACTION_S)
+    bank = PE43713Bank(bus)
+    t0 = time.perf_counter()
+    for code in codes:
+        bank.set_codes([code, 0, 0, 0])
+    t_bank = time.perf_counter() - t0
+
+    print(f"[I2C ] legacy: {legacy.transactions} transactions, {t_legacy * 1e3:.1f} ms")
+    print(f"[I2C ] driver: {bus.transactions} transactions, {t_bank * 1e3:.1f} ms")
@@ -0,0 +1,212 @@
+import os
+import sys
+import json
+import time
+import hashlib
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+def run_name(angle: float, att_code: float) -> str:
+    """Name of one scan point, as used in the FLOWER records."""
+    return f"ang{angle:+05.1f}_att{att_code:06.2f}"
+
+
+def resume_requested(argv: Optional[Sequence[str]] = None) -> bool:
+    """True if the script was started as `python <scan script> resume`."""
+    argv = sys.argv[1:] if argv is None else argv
+    return "resume" in argv or "--resume" in argv
+
+
+class ScanPlan:
+    """
+    Declarative description of an angle × attenuation scan.
+
+    Lists everything that defines the scan, so it can be written into the
+    checkpoint file and a resumed scan can check it is continuing the same
+    plan.
+
+    Parameters
+    ----------
+    name : str
+    angles : sequence of float
+        Angles in degrees, in scan order.
+    delays : sequence of sequence of float
+        T660 delays (ns, 4 channels) for every angle, offsets included.
+    attenuation_codes : sequence of float
+        Attenuation codes (0–127) scanned at every angle.
+    mode : str
+        FLOWER trigger mode ("coinc" or "coinc_phased").
+    adaptive : bool
+        Attenuation codes chosen by adaptive_attenuation_scan instead of a
+        full grid; the checkpoint then also remembers finished angles.
+    """
+
+    def __init__(self, name: str, angles: Sequence[float], delays: Sequence[Sequence[float]],
+                 attenuation_codes: Sequence[float], mode: str = "coinc", adaptive: bool = False):
+        if len(angles) != len(delays):
+            raise ValueError(f"{len(angles)} angles but {len(delays)} delay sets")
+        self.name = name
+        self.angles = [round(float(a), 6) for a in angles]
+        self.delays = [[round(float(d), 3) for d in ds] for ds in delays]
+        self.attenuation_codes = [float(code) for code in attenuation_codes]
+        self.mode = mode
+        self.adaptive = adaptive
+
+    def to_dict(self) -> Dict:
+        return {"name": self.name, "angles": self.angles, "delays": self.delays,
+                "attenuation_codes": self.attenuation_codes, "mode": self.mode, "adaptive": self.adaptive}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ScanPlan":
+        return cls(**data)
+
+    def fingerprint(self) -> str:
+        return hashlib.sha1(json.dumps(self.to_dict(), sort_keys=True).encode()).hexdigest()[:16]
+
+    def __len__(self) -> int:
+        return len(self.angles) * len(self.attenuation_codes)
+
+    def steps(self) -> Iterator[Tuple[int, float, List[float]]]:
+        """(index, angle, delays) of every angle, in scan order."""
+        for i, (angle, delays) in enumerate(zip(self.angles, self.delays)):
+            yield i, angle, delays
+
+    def points(self) -> Iterator[Tuple[float, List[float], float]]:
+        """(angle, delays, attenuation code) of every grid point, in scan order."""
+        for _, angle, delays in self.steps():
+            for code in self.attenuation_codes:
+                yield angle, delays, code
+
+
+class Checkpoint:
+    """
+    Progress of a ScanPlan on disk, so an interrupted scan can be resumed.
+
+    A line-delimited JSON file: a header with the plan, then one line per
+    finished point ({"point": run_name, "result": ...}) and per finished
+    angle ({"angle": index, ...}). Every line is fsync'ed as it is written,
+    so the file survives a crash of the PATT script; a half-written last line
+    is ignored.
+
+    Without `resume` an existing checkpoint is moved aside (to
+    <name>.<time>.bak) and the scan starts over; with `resume` it is
+    continued, after checking it belongs to the same plan.
+    """
+
+    def __init__(self, path, plan: ScanPlan, resume: bool = False):
+        self.path = Path(path)
+        self.plan = plan
+        self.results: Dict[str, Dict] = {}
+        self.angles: Dict[int, Dict] = {}
+
+        if self.path.exists() and not resume:
+            backup = self.path.with_name(f"{self.path.name}.{time.strftime('%Y%m%d_%H%M%S')}.bak")
+            self.path.rename(backup)
+            print(f"[PLAN] Moved the previous checkpoint to {backup}")
+        if self.path.exists():
+            self._load()
+        else:
+            self._write({"plan": plan.to_dict(), "fingerprint": plan.fingerprint(), "time": time.time()})
+
+    def _load(self):
+        with open(self.path, "rb") as f:
+            data = f.read()
+        if not data.endswith(b"\n"):
+            # drop a line cut off by a crash, so the next entry starts on its own line
+            with open(self.path, "r+b") as f:
+                f.truncate(data.rfind(b"\n") + 1)
+        lines = data.decode(errors="replace").splitlines()
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                pass   # cut off by a crash
+        if not entries or entries[0].get("fingerprint") != self.plan.fingerprint():
+            raise ValueError(f"{self.path} was written for a different scan plan; "
+                             f"start without 'resume' or use another checkpoint file")
+        for entry in entries[1:]:
+            if "point" in entry:
+                self.results[entry["point"]] = entry["result"]
+            elif "angle" in entry:
+                self.angles[entry["angle"]] = entry
+        print(f"[PLAN] Resuming {self.path}: {len(self.results)} points and "
+              f"{len(self.angles)}/{len(self.plan.angles)} angles done")
+
+    def _write(self, entry: Dict) -> None:
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    # === points ===
+    def done(self, name: str) -> bool:
+        return name in self.results
+
+    def result(self, name: str) -> Optional[Dict]:
+        return self.results.get(name)
+
+    def mark(self, name: str, result: Dict) -> None:
+        self.results[name] = result
+        self._write({"point": name, "result": result, "time": time.time()})
+
+    # === angles ===
+    def angle_done(self, index: int) -> bool:
+        """True if the angle finished, or all its grid points did."""
+        if index in self.angles:
+            return True
+        if self.plan.adaptive:
+            return False
+        angle = self.plan.angles[index]
+        return all(run_name(angle, code) in self.results for code in self.plan.attenuation_codes)
+
+    def mark_angle(self, index: int, **summary) -> None:
+        entry = dict({"angle": index, "angle_deg": self.plan.angles[index]}, **summary)
+        self.angles[index] = entry
+        self._write(dict(entry, time=time.time()))
+
+    def remaining(self) -> List[Tuple[int, float, List[float]]]:
+        """(index, angle, delays) of the angles still to scan."""
+        return [step for step in self.plan.steps() if not self.angle_done(step[0])]
+
+    def summary(self) -> str:
+        n_angles = sum(self.angle_done(i) for i in range(len(self.plan.angles)))
+        return (f"[PLAN] {self.plan.name}: {n_angles}/{len(self.plan.angles)} angles, "
+                f"{len(self.results)} points done -> {self.path}")
+
+
+def measured_result(efficiency) -> Optional[Dict]:
+    """Checkpoint entry for what a measure_point returned (efficiency or (efficiency, n_trials))."""
+    if efficiency is None:
+        return None
+    if isinstance(efficiency, tuple):
+        return {"efficiency": float(efficiency[0]), "n_trials": float(efficiency[1])}
+    return {"efficiency": float(efficiency)}
+
+
+def stored_efficiency(result: Dict):
+    """Inverse of measured_result, in the form adaptive_attenuation_scan expects."""
+    if result.get("n_trials"):
+        return result["efficiency"], result["n_trials"]
+    return result["efficiency"]
+
+
+def checkpointed(measure, checkpoint: Checkpoint, angle: float):
+    """
+    Wrap measure(att_code) -> efficiency so points already in the checkpoint
+    return their stored result without being measured, and new results are
+    written to the checkpoint.
+    """
+    def measure_point(att_code):
+        name = run_name(angle, att_code)
+        if checkpoint.done(name):
+            result = checkpoint.result(name)
+            print(f"  ↳ att {float(att_code):6.2f}: done, efficiency = {result['efficiency']:.4f}")
+            return stored_efficiency(result)
+        efficiency = measure(att_code)
+        result = measured_result(efficiency)
+        if result is not None:
+            checkpoint.mark(name, result)
+        return efficiency
+    return measure_point
@@ -0,0 +1,203 @@
+import time
+import queue
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence
+
+STAGES = ("apply", "settle", "measure", "flower_settle", "record")  # flower_settle is part of measure
+
+
+class SettlePolicy:
+    """
+    How long to wait after a configuration change before measuring.
+
+    Every kind of change ("delays", "attenuation") has its own wait; after a
+    step the longest wait among the things that changed is used, and nothing
+    is waited if the configuration did not change. The defaults are the
+    fixed sleeps the scan scripts used so far.
+    """
+
+    def __init__(self, delays_s: float = 0.3, attenuation_s: float = 2.0):
+        self.waits = {"delays": delays_s, "attenuation": attenuation_s}
+
+    def wait_time(self, changed: Sequence[str]) -> float:
+        return max([self.waits[kind] for kind in changed], default=0.0)
+
+    def settle(self, changed: Sequence[str]) -> None:
+        time.sleep(self.wait_time(changed))
+
+    def request_params(self, changed: Sequence[str]) -> Dict:
+        """Extra fields for the measure request that follows."""
+        return {}
+
+
+class FlowerSettle(SettlePolicy):
+    """
+    Settle detection on the FLOWER instead of a worst-case sleep.
+
+    After a change, the measure request asks flower_scan_server.py to poll
+    the trigger scaler ("scaler") or the RAM peak-to-peak ("p2p") every
+    `interval_s` and to start measuring as soon as `n_agree` successive
+    readings agree (within `n_sigma` Poisson errors for the scaler, or
+    standard errors for p2p, plus `abs_tol`), giving up after `timeout_s`.
+    `min_wait_s` is still slept on the PATT, for hardware that needs a
+    fixed minimum after a write.
+
+    Options left at None use the FLOWER's defaults for the source: the
+    scaler is read once per ~1 s gate, starting one gate after the change,
+    with 2 readings to agree (flower_session.wait_for_coinc_settle), so it
+    takes at least 2 s and only pays off when the board settles slowly.
+    """
+
+    def __init__(self, source: str = "scaler", *, n_agree: Optional[int] = None, n_sigma: float = 2.0,
+                 abs_tol: Optional[float] = None, interval_s: Optional[float] = None, timeout_s: float = 5.0,
+                 min_wait_s: float = 0.0):
+        super().__init__(delays_s=min_wait_s, attenuation_s=min_wait_s)
+        self.options = {"source": source, "n_sigma": n_sigma, "timeout_s": timeout_s}
+        for name, value in (("n_agree", n_agree), ("interval_s", interval_s), ("abs_tol", abs_tol)):
+            if value is not None:
+                self.options[name] = value
+
+    def request_params(self, changed: Sequence[str]) -> Dict:
+        return {"settle": dict(self.options)} if changed else {}
+
+
+class ScanScheduler:
+    """
+    Runs scan points as apply → settle → measure → record.
+
+    - apply: T660 delay batch (only if the delays changed) and attenuation
+      (only if the code changed). Delay batches are formatted ahead of time
+      by `prepare`, normally for the next angle while the FLOWER integrates.
+    - settle: `settle.settle(changed)` on the PATT, see SettlePolicy, plus
+      whatever the policy asks the FLOWER to do (FlowerSettle).
+    - measure: one "measure" request to flower_scan_server.py through a
+      FlowerClient; the PATT prepares the next delay batch while it waits.
+    - record: `record(entry)` runs on a background thread, off the
+      critical path.
+
+    Per-stage durations are kept in `timings` and printed by `summary`.
+
+    Parameters
+    ----------
+    flower : FlowerClient
+    format_delays : callable
+        delays_ns -> list of T660 command strings.
+    send_commands : callable
+        Sends a list of T660 commands.
+    set_attenuation : callable
+        att_code -> signal percent (apply_attenuation_to_all_channels).
+    settle : SettlePolicy
+    measure_params : dict
+        Extra fields of every measure request (mode, n_ave, ...).
+    record : callable | None
+        Called with {"record": ..., "reply": ..., "timing": ...} per point.
+    """
+
+    def __init__(self, flower, *, format_delays: Callable, send_commands: Callable,
+                 set_attenuation: Callable, settle: Optional[SettlePolicy] = None,
+                 measure_params: Optional[Dict] = None, record: Optional[Callable] = None):
+        self.flower = flower
+        self.format_delays = format_delays
+        self.send_commands = send_commands
+        self.set_attenuation = set_attenuation
+        self.settle = settle or SettlePolicy()
+        self.measure_params = measure_params or {}
+
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+        self._prepared: Dict[tuple, List[str]] = {}
+        self._delays = None
+        self._att_code = None
+        self._percent = None
+        self._started = time.time()
+
+        self._record = record
+        self._record_queue = queue.Queue()
+        self._record_thread = None
+        if record is not None:
+            self._record_thread = threading.Thread(target=self._record_worker, daemon=True)
+            self._record_thread.start()
+
+    @contextmanager
+    def _stage(self, name, timing):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            timing[name] = time.perf_counter() - t0
+            self.timings[name].append(timing[name])
+
+    def _record_worker(self):
+        while True:
+            entry = self._record_queue.get()
+            if entry is None:
+                break
+            t0 = time.perf_counter()
+            self._record(entry)
+            self.timings["record"].append(time.perf_counter() - t0)
+
+    def prepare(self, delays_ns: Sequence[float]) -> List[str]:
+        """Formatted T660 batch for `delays_ns` (cached)."""
+        key = tuple(round(float(d), 3) for d in delays_ns)
+        if key not in self._prepared:
+            self._prepared[key] = self.format_delays(list(key))
+        return self._prepared[key]
+
+    def measure_point(self, delays_ns: Sequence[float], att_code, record: Optional[Dict] = None,
+                      next_delays: Optional[Sequence[float]] = None) -> dict:
+        """
+        Apply one configuration, wait for it to settle and measure it.
+
+        `next_delays` (the next angle's delays, if known) are formatted while
+        the FLOWER measures. Returns the FLOWER reply, with the signal
+        percent of the attenuation code in reply["attenuation_percent"].
+        """
+        timing, changed = {}, []
+        with self._stage("apply", timing):
+            delays = tuple(round(float(d), 3) for d in delays_ns)
+            if delays != self._delays:
+                self.send_commands(self.prepare(delays))
+                self._delays = delays
+                changed.append("delays")
+            if att_code != self._att_code:
+                self._percent = self.set_attenuation(att_code)
+                self._att_code = att_code
+                changed.append("attenuation")
+
+        with self._stage("settle", timing):
+            self.settle.settle(changed)
+
+        record = dict(record or {}, attenuation_code=float(att_code),
+                      attenuation_percent=round(float(self._percent), 2))
+        with self._stage("measure", timing):
+            params = dict(self.measure_params, **self.settle.request_params(changed))
+            request_id = self.flower.send("measure", record=record, **params)
+            if next_delays is not None:
+                self.prepare(next_delays)
+            reply = self.flower.result(request_id)
+
+        if "settle_s" in reply:
+            timing["flower_settle"] = reply["settle_s"]
+            self.timings["flower_settle"].append(reply["settle_s"])
+        reply["attenuation_percent"] = record["attenuation_percent"]
+        if self._record is not None:
+            self._record_queue.put({"record": record, "reply": reply, "timing": timing})
+        return reply
+
+    def close(self) -> None:
+        """Wait for pending records to be written."""
+        if self._record_thread is not None:
+            self._record_queue.put(None)
+            self._record_thread.join()
+            self._record_thread = None
+
+    def summary(self) -> str:
+        wall = time.time() - self._started
+        lines = [f"[TIME] {len(self.timings['measure'])} points in {wall:.1f} s"]
+        for stage in STAGES:
+            values = self.timings.get(stage, [])
+            if values:
+                lines.append(f"[TIME]   {stage:<13s} total {sum(values):8.1f} s  "
+                             f"mean {sum(values) / len(values):6.3f} s  ({100 * sum(values) / wall:4.1f}% of wall)")
+        return "\n".join(lines)
@@ -0,0 +1,303 @@
+import re
+import sys
+import time
+import socket
+import asyncio
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from pe43713 import FakeSMBus, OUTPUT_REG, CONFIG_REG, register_value
+
+# Simulated PATT bench: stand-ins for the T660 on /dev/ttyUSB0, the I2C
+# expanders of the attenuator board on SMBus 2 and the FLOWER at 10.42.1.228,
+# so the scan scripts can be run, timed and regression-tested on any machine:
+#
+#   python patt_angle_and_attenuation_scan_phased_custom_delays.py --sim
+#
+# The three share one SimBench. The T660 and the expanders update its delays
+# and attenuation codes as the script writes them, and the FLOWER triggers
+# with an efficiency that is a sigmoid of the signal percent of the
+# attenuation code, whose 50% point rises with the angle the delays encode;
+# its scalers hold one binomial draw per gate, like the board's.
+# Latencies follow the real links: 38400 baud serial plus T660 processing,
+# 100 kHz I2C transactions, and the FLOWER's own register accesses.
+
+SIM_FLAG = "--sim"
+T660_BAUD = 38400
+T660_PROCESS_S = 0.002  # T660 handling time per command
+I2C_TRANSACTION_S = 0.0004  # one SMBus byte-data transaction at 100 kHz
+FLOWER_ACCESS_S = 0.0005  # one FLOWER register/RAM access
+FLOWER_SETTLE_TAU_S = 0.2  # the trigger rate follows a change with this time constant
+FLOWER_GATE_S = 1.0  # scaler gate; a reading returns the count of the last completed gate
+LEGACY_MEASURE_S = 0.2  # time the single-scan FLOWER servers take per reading
+EXPANDER_ADDRESSES = (0x38, 0x3a, 0x3c, 0x3e)
+C = 299792458  # m/s
+
+
+def simulation_requested(argv: Optional[Sequence[str]] = None) -> bool:
+    """True if the script was started with --sim."""
+    argv = sys.argv[1:] if argv is None else argv
+    return SIM_FLAG in argv
+
+
+def sim_path(name: str) -> str:
+    """Output file name of a simulated run ("sim_" prefix), so it never replaces bench data."""
+    path = Path(name)
+    return str(path.with_name("sim_" + path.name))
+
+
+class SimBench:
+    """
+    State shared by the simulated devices and the signal model.
+
+    Parameters
+    ----------
+    offsets_ns : sequence of float
+        Fixed per-channel delays (calibration + cable) the scan adds to the
+        beam delays; subtracted before the angle is worked out.
+    n_ice, spacing_m : float
+        Geometry used to turn the delay step between channels into an angle.
+    x50_percent : float
+        Signal percent with 50% trigger efficiency at 0°.
+    width_percent : float
+        Width of the efficiency sigmoid.
+    angle_slope : float
+        x50 grows as x50_percent * (1 + angle_slope * |sin(angle)|).
+    """
+
+    def __init__(self, offsets_ns: Sequence[float] = (0, 0, 0, 0), n_ice: float = 1.78, spacing_m: float = 1.0,
+                 x50_percent: float = 15.0, width_percent: float = 1.5, angle_slope: float = 0.5):
+        self.offsets_ns = list(offsets_ns)
+        self.n_ice = n_ice
+        self.spacing_m = spacing_m
+        self.x50_percent = x50_percent
+        self.width_percent = width_percent
+        self.angle_slope = angle_slope
+        self.delays_ns: Dict[str, float] = {}   # latched T660 delays per channel letter
+        self.codes: Dict[int, int] = {}         # attenuation code per expander address
+        self._listeners = []
+        self.t660 = SimT660(self)
+        self.i2c = SimExpanderBus(self)
+
+    # === model ===
+    def angle_deg(self) -> float:
+        """Beam angle encoded by the latched delays (0 until all four are set)."""
+        if len(self.delays_ns) < 4:
+            return 0.0
+        beam = np.array([self.delays_ns[ch] for ch in "ABCD"]) - np.array(self.offsets_ns)
+        step_ns = np.mean(np.abs(np.diff(beam)))
+        sin = np.clip(step_ns * 1e-9 * C / (self.n_ice * self.spacing_m), -1, 1)
+        return float(np.rad2deg(np.arcsin(sin)))
+
+    def signal_percent(self) -> float:
+        """Mean signal percent of the four channels (attenuation_to_percent of their codes)."""
+        codes = [self.codes.get(address, 0) for address in EXPANDER_ADDRESSES]
+        return float(np.mean([100 * 10 ** (-code / 80) for code in codes]))
+
+    def efficiency(self, percent: Optional[float] = None, angle_deg: Optional[float] = None) -> float:
+        percent = self.signal_percent() if percent is None else percent
+        angle = self.angle_deg() if angle_deg is None else angle_deg
+        x50 = self.x50_percent * (1 + self.angle_slope * abs(np.sin(np.deg2rad(angle))))
+        return float(1 / (1 + np.exp(-(percent - x50) / self.width_percent)))
+
+    def on_change(self, callback) -> None:
+        """callback(bench) after every change of the delays or attenuation codes."""
+        self._listeners.append(callback)
+
+    def _changed(self):
+        for callback in self._listeners:
+            callback(self)
+
+    # === FLOWER ===
+    def start_flower(self, port: int = 0, **model) -> tuple:
+        """
+        Run flower_scan_server.py on the fake board (fake_flower.py) in a
+        background thread on localhost, with its trigger efficiency driven
+        by this bench. Returns (host, port) for FlowerClient.
+        """
+        sys.path.append(str(Path(__file__).resolve().parents[1] / "ON_FLOWER_receiving_from_PATT"))
+        from flower_session import fake_session
+        from flower_scan_server import FlowerScanServer
+
+        model = dict({"latency_s": FLOWER_ACCESS_S, "settle_tau_s": FLOWER_SETTLE_TAU_S, "gate_s": FLOWER_GATE_S},
+                     **model)
+        session = fake_session(efficiency=self.efficiency(), **model)
+        self.on_change(lambda bench: session.trig.set_efficiency(bench.efficiency()))
+        port = port or _free_port()
+        server = FlowerScanServer(session)
+        threading.Thread(target=lambda: asyncio.run(server.serve("127.0.0.1", port)), daemon=True).start()
+        _wait_for_port(port)
+        return "127.0.0.1", port
+
+    def start_legacy_flower(self, port: int = 0, pulser_rate: int = 1000, seed=None) -> tuple:
+        """
+        Stand-in for the single-scan servers (coincidence_scan_angles_and_attenuations*.py):
+        answers "angle,att_code,percent,run_name" with "Efficiency = ... recorded".
+        Returns (host, port).
+        """
+        rng = np.random.default_rng(seed)
+        listener = socket.create_server(("127.0.0.1", port))
+
+        def serve():
+            while True:
+                conn, _ = listener.accept()
+                with conn:
+                    while True:
+                        data = conn.recv(1024)
+                        if not data:
+                            break
+                        time.sleep(LEGACY_MEASURE_S)
+                        efficiency = rng.binomial(pulser_rate, self.efficiency()) / pulser_rate
+                        conn.sendall(f"Efficiency = {efficiency:.4f} recorded".encode())
+
+        threading.Thread(target=serve, daemon=True).start()
+        return listener.getsockname()[:2]
+
+
+class SimT660:
+    """
+    Serial-port stand-in for the T660 (write / readline / flush / close).
+
+    Replies "OK" to the commands the scripts use (xD <time>, DW <time>,
+    DSET, xSET, TRIGGER POS/NEG) and "?" to anything else. Delays set with
+    xD take effect (in the bench) on the next *SET, as on the instrument.
+    Every reply costs its serial transmission time plus T660_PROCESS_S.
+    """
+
+    TIME = re.compile(r"^([-+]?[0-9.]+(?:e[-+]?[0-9]+)?)\s*([pnum]?s?)$", re.I)
+    UNITS = {"": 1e9, "s": 1e9, "m": 1e6, "ms": 1e6, "u": 1e3, "us": 1e3, "n": 1.0, "ns": 1.0, "p": 1e-3, "ps": 1e-3}
+
+    def __init__(self, bench: SimBench):
+        self.bench = bench
+        self.is_open = True
+        self.settings: Dict[str, str] = {}
+        self._pending: Dict[str, float] = {}
+        self._replies: List[bytes] = []
+        self._buffer = ""
+
+    # === serial.Serial calls ===
+    def open(self):
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+    def isOpen(self):
+        return self.is_open
+
+    def flush(self):
+        pass
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data.decode()
+        *lines, self._buffer = self._buffer.split("\n")
+        for line in lines:
+            if line.strip():
+                reply = self._execute(line.strip())
+                self._replies.append((reply + "\r\n").encode())
+        return len(data)
+
+    def readline(self) -> bytes:
+        if not self._replies:
+            time.sleep(1.0)   # serial timeout
+            return b""
+        reply = self._replies.pop(0)
+        time.sleep(10 * len(reply) / T660_BAUD + T660_PROCESS_S)
+        return reply
+
+    # === instrument ===
+    def _time_ns(self, value: str) -> Optional[float]:
+        match = self.TIME.match(value or "")
+        if not match:
+            return None
+        return float(match.group(1)) * self.UNITS[match.group(2).lower()]
+
+    def _execute(self, cmd: str) -> str:
+        key, _, value = cmd.partition(" ")
+        key, value = key.upper(), value.strip()
+        if len(key) == 2 and key[0] in "ABCD" and key[1] == "D":
+            delay = self._time_ns(value)
+            if delay is None:
+                return "?"
+            self._pending[key[0]] = delay
+        elif key == "DW":
+            if self._time_ns(value) is None:
+                return "?"
+        elif key in ("DSET", "ASET", "BSET", "CSET"):
+            if self._pending:
+                self.bench.delays_ns.update(self._pending)
+                self._pending.clear()
+                self.bench._changed()
+        elif key == "TRIGGER":
+            if value.upper() not in ("POS", "NEG"):
+                return "?"
+        else:
+            return "?"
+        self.settings[key] = value
+        return "OK"
+
+
+class SimExpanderBus(FakeSMBus):
+    """
+    SMBus stand-in for the attenuator board: port expanders at 0x38–0x3e
+    with output (0x01) and configuration (0x03) registers. Other addresses
+    or registers raise OSError (remote I/O error, as smbus does). A code
+    reaches the bench once the expander pins are outputs.
+    """
+
+    def __init__(self, bench: SimBench, transaction_s: float = I2C_TRANSACTION_S):
+        super().__init__(transaction_s)
+        self.bench = bench
+        self._decode = {register_value(code): code for code in range(128)}
+
+    def _check(self, address: int, register: int):
+        if address not in EXPANDER_ADDRESSES:
+            raise OSError(121, f"Remote I/O error (no device at {address:#04x})")
+        if register not in (OUTPUT_REG, CONFIG_REG):
+            raise OSError(121, f"Remote I/O error (register {register:#04x})")
+
+    def write_byte_data(self, address: int, register: int, value: int) -> None:
+        self._check(address, register)
+        super().write_byte_data(address, register, value)
+        registers = self.registers[address]
+        if registers.get(CONFIG_REG, 0xff) == 0x00:
+            code = self._decode.get(registers.get(OUTPUT_REG, 0) & 0x7f, 0)
+            if self.bench.codes.get(address) != code:
+                self.bench.codes[address] = code
+                self.bench._changed()
+
+    def read_byte_data(self, address: int, register: int) -> int:
+        self._check(address, register)
+        return super().read_byte_data(address, register)
+
+
+_BENCH: Optional[SimBench] = None
+
+
+def bench(**model) -> SimBench:
+    """The process-wide simulated bench (created on first use with `model`)."""
+    global _BENCH
+    if _BENCH is None:
+        _BENCH = SimBench(**model)
+    return _BENCH
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout_s: float = 5.0) -> None:
+    deadline = time.time() + timeout_s
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.02)
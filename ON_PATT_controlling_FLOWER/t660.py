@@ -0,0 +1,139 @@
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+CHANNEL_MAP = {"C1": "A", "C2": "B", "C3": "C", "C4": "D"}
+CHANNEL_ORDER: List[str] = ["C1", "C2", "C3", "C4"]
+PULSE_WIDTH = "2u"  # DW setting sent with every preset
+ERROR_REPLIES = ("?", "ERR")  # replies starting with these are rejected
+_UNSET = object()
+
+
+def parse_command(cmd: str) -> Tuple[str, Optional[str]]:
+    """'AD 5.19n' -> ('AD', '5.19n'); bare commands such as 'DSET' -> ('DSET', None)."""
+    key, _, value = cmd.strip().partition(" ")
+    return key.upper(), value.strip() or None
+
+
+def format_presets(delays_ns, width: str = PULSE_WIDTH, channel_map: Dict[str, str] = CHANNEL_MAP,
+                   channel_order: Sequence[str] = CHANNEL_ORDER) -> List[List[str]]:
+    """
+    Command lists of many delay presets at once: delays_ns has one row per
+    preset, one column per channel in channel_order, in ns.
+    """
+    delays = np.round(np.atleast_2d(np.asarray(delays_ns, dtype=float)), 3)
+    prefixes = np.array([f"{channel_map[ch]}D " for ch in channel_order])
+    delay_cmds = np.char.add(np.char.add(prefixes, delays.astype(str)), "n")
+    set_cmds = [f"DW {width}", "DSET"] + [f"{channel_map[ch]}SET" for ch in channel_order]
+    return [row + set_cmds for row in delay_cmds.tolist()]
+
+
+class T660:
+    """
+    Highland T660 delay generator on the PATT serial port.
+
+    A transaction writes all its commands in one buffered burst and then
+    reads and checks the replies together, instead of a write and a
+    blocking readline per command. The driver remembers the last value it
+    set for every command ("AD" -> "5.19n", "DW" -> "2u") and skips commands
+    that would set what the instrument already has. Commands without a value
+    (DSET, ASET, ...) latch the settings sent before them and are skipped
+    unless one of those changed, so a new angle only sends the channel
+    delays that changed plus the latches, and a repeated preset sends nothing.
+
+    Commands listed in `always_send` are never skipped. A reply that is
+    missing (serial timeout) or starts with one of ERROR_REPLIES raises
+    OSError, like a serial failure, after forgetting the state of every
+    command of that transaction.
+
+    Parameters
+    ----------
+    ser : serial.Serial
+        Open port (38400 baud, 1 s timeout in the scan scripts).
+    loud : bool
+        Print every command with its reply, as the scan scripts did.
+    always_send : sequence of str
+        Command keys (e.g. "DSET") that are sent even if unchanged.
+    """
+
+    def __init__(self, ser, loud: bool = False, always_send: Sequence[str] = (),
+                 channel_map: Dict[str, str] = CHANNEL_MAP, channel_order: Sequence[str] = CHANNEL_ORDER):
+        self.ser = ser
+        self.loud = loud
+        self.always_send = {key.upper() for key in always_send}
+        self.channel_map = channel_map
+        self.channel_order = list(channel_order)
+        self.state: Dict[str, Optional[str]] = {}
+        self.sent = 0
+        self.skipped = 0
+
+    def invalidate(self) -> None:
+        """Forget the cached state, e.g. after the T660 was power-cycled or set by hand."""
+        self.state.clear()
+
+    def preset_commands(self, delays_ns: Sequence[float], width: str = PULSE_WIDTH) -> List[str]:
+        """Full command list of a delay preset (delays in ns, in CHANNEL_ORDER)."""
+        return format_presets([delays_ns], width, self.channel_map, self.channel_order)[0]
+
+    def pending(self, cmds: Sequence[str]) -> List[str]:
+        """The commands of `cmds` that would change the instrument, in order, without repeats."""
+        todo, planned, changed = [], {}, False
+        for cmd in cmds:
+            key, value = parse_command(cmd)
+            if value is None:
+                # DSET, ASET, ...: latch the settings, needed only after a change
+                needed = changed or key not in self.state
+            else:
+                needed = (planned[key] if key in planned else self.state.get(key, _UNSET)) != value
+                changed = changed or needed
+            if needed or key in self.always_send:
+                todo.append(cmd)
+                planned[key] = value
+        return todo
+
+    def transaction(self, cmds: Sequence[str], force: bool = False) -> Dict[str, str]:
+        """
+        Send the commands that change something (all of them with `force`)
+        in one burst and check their replies. Returns {command: reply} of
+        the commands sent.
+        """
+        todo = list(cmds) if force else self.pending(cmds)
+        self.skipped += len(cmds) - len(todo)
+        if not todo:
+            return {}
+        self.ser.write("".join(cmd + "\n" for cmd in todo).encode())
+        self.ser.flush()
+        replies = [self.ser.readline().decode(errors="replace").strip() for _ in todo]
+        self.sent += len(todo)
+
+        bad = []
+        for cmd, reply in zip(todo, replies):
+            if self.loud:
+                print(f"[SERIAL] {cmd} → {reply}")
+            if not reply or reply.upper().startswith(ERROR_REPLIES):
+                bad.append(f"{cmd!r} → {reply or 'no reply'}")
+        if bad:
+            for cmd in todo:
+                self.state.pop(parse_command(cmd)[0], None)
+            raise OSError(f"T660 rejected {len(bad)}/{len(todo)} commands: " + ", ".join(bad))
+        for cmd in todo:
+            key, value = parse_command(cmd)
+            self.state[key] = value
+        return dict(zip(todo, replies))
+
+    def apply(self, cmds: Sequence[str], settle_s: float = 0.0, force: bool = False) -> Dict[str, str]:
+        """
+        Send a prepared preset (e.g. from delay_presets.compile_presets) and
+        wait settle_s afterwards, but only if something was sent. Returns
+        {command: reply} of the commands sent.
+        """
+        sent = self.transaction(cmds, force=force)
+        if sent and settle_s:
+            time.sleep(settle_s)
+        return sent
+
+    def apply_preset(self, delays_ns: Sequence[float], width: str = PULSE_WIDTH,
+                     settle_s: float = 0.0, force: bool = False) -> Dict[str, str]:
+        """Set the four channel delays (ns), see apply."""
+        return self.apply(self.preset_commands(delays_ns, width), settle_s=settle_s, force=force)
@@ -4,6 +4,7 @@ import serial
 import numpy as np
 from typing import List
 from attenuation_control import apply_attenuation_to_all_channels
+from delay_presets import compile_presets
 
 # === Parameters ===
 in_angles = np.arange(-10, 11, 5)  # degrees
@@ -27,14 +28,6 @@ ser.close(); ser.open()
 n_ice= 1.78  #index of refraction in ice
 vertical_seperation= 1 #distance betwwen channel in meters
 channel_weights= [1,1,1,1] #the weight attributed to each channel
-c= 299792458 #speed of light in a vaccum in m/s
-
-def angle_delay_time(index, distance, speed, angle ):
-    angle=np.deg2rad(angle)
-
-    #this is the offset in time of each signal that is generated
-    time_delays= index * distance * np.sin(angle) / speed
-    return time_delays*1e9
 
 def send(cmd: str, loud: bool = True) -> str:
     ser.write((cmd + "\n").encode())
@@ -54,15 +47,8 @@ def apply_delay_preset(delays_ns: List[int]) -> None:
     time.sleep(0.3)
 
 # === Precompute all delay sets ===
-delay_list = []
-for angle in in_angles:
-    delays = angle_delay_time(n_ice, vertical_seperation, c, angle)
-    step_delay = abs(delays)
-    base_delays = [round(i * step_delay, 2) for i in range(4)]
-    if delays < 0:
-        base_delays = base_delays[::-1]
-    delays_ns = [base_delays[i] + calibration_delays[i] for i in range(4)]
-    delay_list.append(delays_ns)
+presets = compile_presets(in_angles, n_ice=n_ice, spacing_m=vertical_seperation, offsets_ns=calibration_delays)
+delay_list = presets.delays.tolist()
 
 # === Main loop ===
 def main():
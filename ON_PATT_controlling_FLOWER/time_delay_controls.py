@@ -1,10 +1,12 @@
-import time
 import serial
 from typing import List
 import numpy as np
+from t660 import T660
+from delay_presets import compile_presets
 
 in_angles=np.arange(-10, 11, 5)  # angles in degrees
 calibration_delays = [5.08, 0, 5.08, 6.14]
+DELAY_SETTLE_S = 0.3  # wait after a T660 delay preset that changed something
 
 # === Channel/serial setup ===
 CHANNEL_MAP   = {"C1": "A", "C2": "B", "C3": "C", "C4": "D"}  # REVERSED mapping
@@ -18,45 +20,15 @@ ser = serial.Serial(
     bytesize=serial.EIGHTBITS
 )
 ser.close(); ser.open()
-
-def send(cmd: str, loud: bool = True) -> str:
-    ser.write((cmd + "\n").encode())
-    resp = ser.readline().decode().strip()
-    if loud:
-        print(f"[SERIAL] {cmd} → {resp}")
-    return resp
-
-def apply_delay_preset(delays_ns: List[int]) -> None:
-    for ch, delay_ns in zip(CHANNEL_ORDER, delays_ns):
-        cmd = f"{CHANNEL_MAP[ch]}D {delay_ns}n"
-        send(cmd)
-    send("DW 2u")
-    send("DSET")
-    for ch in CHANNEL_ORDER:
-        send(f"{CHANNEL_MAP[ch]}SET")
-    time.sleep(0.3)
+t660 = T660(ser, loud=True, channel_map=CHANNEL_MAP, channel_order=CHANNEL_ORDER)  # skips the T660 commands that would not change anything
 
 n_ice= 1.78  #index of refraction in ice
 vertical_seperation= 1 #distance betwwen channel in meters
 channel_weights= [1,1,1,1] #the weight attributed to each channel
-c= 299792458 #speed of light in a vaccum in m/s
-
-def angle_delay_time(index, distance, speed, angle ):
-    angle=np.deg2rad(angle)
-
-    #this is the offset in time of each signal that is generated
-    time_delays= index * distance * np.sin(angle) / speed
-    return time_delays*1e9 
 
-delay_list = []
-for angle in in_angles:
-    delays = angle_delay_time(n_ice, vertical_seperation, c, angle)
-    step_delay = abs(delays)
-    base_delays = [round(i * step_delay, 2) for i in range(4)]
-    if delays < 0:
-        base_delays = base_delays[::-1]
-    delays_ns = [base_delays[i] + calibration_delays[i] for i in range(4)]
-    delay_list.append(delays_ns)
+presets = compile_presets(in_angles, n_ice=n_ice, spacing_m=vertical_seperation, offsets_ns=calibration_delays,
+                          channel_map=CHANNEL_MAP, channel_order=CHANNEL_ORDER)
+delay_list = presets.delays.tolist()
 
 
 def main():
@@ -64,7 +36,7 @@ def main():
     print("[RUN ] Applying preset delay sets…")
     for i, delay_set in enumerate(delay_list):
         print(f"\n[STEP] Delay set {i+1}: {delay_set} (ns)")
-        apply_delay_preset(delay_set)
+        t660.apply(presets.commands[i], settle_s=DELAY_SETTLE_S)
 
     ser.close()
     print("\n[DONE] All delay sets applied.")
@@ -1,7 +1,15 @@
 import smbus
+import sys
 import serial
+import asyncio
 import numpy as np
 import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2] / "ON_PATT_controlling_FLOWER"))
+from t660 import T660
+from pe43713 import PE43713Bank
+from device_workers import Orchestrator
 
 # === Constants ===
 A = 91.916  # from exponential fit
@@ -23,21 +31,7 @@ origins = {'A': 4.18, 'B': 4.19, 'C': 2.00, 'D': 1.36}
 
 # === I2C Setup ===
 bus = smbus.SMBus(2)
-output_reg = 0x01
-config_reg = 0x03
-
-def setAttenuation(addr, atten_value):
-    atten_value = int(round(atten_value))
-    bits = '{:07b}'.format(atten_value)
-    mapped = "0" + bits[0:3] + bits[7:2:-1]
-    val = int(mapped, 2)
-    bus.write_byte_data(addr, output_reg, val)
-
-def setupAttenuator(addr):
-    bus.write_byte_data(addr, output_reg, 0x00)
-    bus.write_byte_data(addr, config_reg, 0x00)
-    current = bus.read_byte_data(addr, output_reg)
-    bus.write_byte_data(addr, output_reg, current | 0x02)
+attenuators = PE43713Bank(bus, addresses=CHANNEL_ADDRESSES)  # configured once, only changed codes are written
 
 def percent_to_attenuation(p):
     if p >= 100: return 0
@@ -50,70 +44,42 @@ ser = serial.Serial(port="/dev/ttyUSB0", baudrate=38400, timeout=1,
 ser.close()
 ser.open()
 
-def send_command(cmd, loud=False):
-    ser.write(str.encode(cmd + '\n'))
-    line = ser.readline().decode().strip()
-    if loud:
-        print(f"> {cmd} => {line}")
-    return line
+t660 = T660(ser)
 
 def init_delay_system():
-    send_command("TRIGGER POS")
-    send_command("DW 2u")
-    for cmd in ['ASET', 'BSET', 'CSET', 'DSET']:
-        send_command(cmd)
+    t660.transaction(["TRIGGER POS", "DW 2u", "ASET", "BSET", "CSET", "DSET"], force=True)
     reset_all_delays()
 
-def set_delay(ch_label, value_ns):
-    cmd = delay_cmds.get(ch_label)
-    if cmd:
-        send_command(f"{cmd} {value_ns:.3f}n")
-
 def reset_all_delays():
-    for ch in CHANNEL_LABELS:
-        set_delay(ch, origins[ch])
+    t660.transaction([f"{delay_cmds[ch]} {origins[ch]:.3f}n" for ch in CHANNEL_LABELS])
     time.sleep(0.5)
 
 # === Animation per Channel ===
-def animate_channel(index):
+def channel_steps(index):
+    """Delay command and attenuation codes of every step: sweep forward, then back."""
     ch_label = CHANNEL_LABELS[index]
-    addr = CHANNEL_ADDRESSES[index]
     origin = origins[ch_label]
     delay_cmd = delay_cmds[ch_label]
 
-    print(f"\n🎬 Animating channel {ch_label}...")
-
-    setupAttenuator(addr)
-
-    # Set other channels to max amplitude (0 dB)
-    for i, other_label in enumerate(CHANNEL_LABELS):
-        if i != index:
-            setupAttenuator(CHANNEL_ADDRESSES[i])
-            setAttenuation(CHANNEL_ADDRESSES[i], 0)
-
-    # Sweep forward
-    for i in range(STEPS + 1):
-        delta = SWEEP_NS * i / STEPS
-        delay_val = origin + delta
-        percent = max(0, 100 - (i * 100 / STEPS))
-        atten_val = percent_to_attenuation(percent)
-
-        send_command(f"{delay_cmd} {delay_val:.3f}n")
-        setAttenuation(addr, atten_val)
-        time.sleep(STEP_DELAY)
-
-    # Sweep back
-    for i in range(STEPS + 1):
-        delta = SWEEP_NS - (SWEEP_NS * i / STEPS)
-        delay_val = origin + delta
-        percent = max(0, i * 100 / STEPS)
-        atten_val = percent_to_attenuation(percent)
-
-        send_command(f"{delay_cmd} {delay_val:.3f}n")
-        setAttenuation(addr, atten_val)
-        time.sleep(STEP_DELAY)
-
-    print(f"✅ Finished animation for channel {ch_label}")
+    fractions = [i / STEPS for i in range(STEPS + 1)]
+    fractions += [1 - i / STEPS for i in range(STEPS + 1)]
+    steps = []
+    for f in fractions:
+        codes = [0] * len(CHANNEL_LABELS)  # other channels at max amplitude (0 dB)
+        codes[index] = percent_to_attenuation(max(0, 100 * (1 - f)))
+        steps.append({"t660_cmds": [f"{delay_cmd} {origin + SWEEP_NS * f:.3f}n"], "codes": codes})
+    return steps
+
+async def animate_all():
+    # the delay (serial) and the attenuation (I2C) of a step are written concurrently,
+    # on a fixed STEP_DELAY schedule
+    async with Orchestrator(t660, attenuators) as hw:
+        for index in range(4):
+            print(f"\n🎬 Animating channel {CHANNEL_LABELS[index]}...")
+            late = await hw.paced(channel_steps(index), STEP_DELAY)
+            print(f"✅ Finished animation for channel {CHANNEL_LABELS[index]} ({late} late steps)")
+            await asyncio.sleep(0.5)
+    print(hw.summary())
 
 # === Main ===
 def main():
@@ -123,10 +89,7 @@ def main():
         return
 
     init_delay_system()
-
-    for index in range(4):
-        animate_channel(index)
-        time.sleep(0.5)
+    asyncio.run(animate_all())
 
     print("\n✅ All channel animations complete.")
 
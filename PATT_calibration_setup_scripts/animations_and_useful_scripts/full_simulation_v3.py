@@ -1,7 +1,12 @@
 import smbus
+import sys
 import serial
 import numpy as np
 import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2] / "ON_PATT_controlling_FLOWER"))
+from pe43713 import PE43713Bank
 
 # === Constants ===
 A = 91.916  # from exponential fit
@@ -22,21 +27,10 @@ origins = {'C1': 0.6, 'C2': 2.03, 'C4': 0.1}
 
 # === I2C Setup ===
 bus = smbus.SMBus(2)
-output_reg = 0x01
-config_reg = 0x03
+attenuators = PE43713Bank(bus, addresses=list(i2c_addresses.values()))  # only codes that change are written
 
 def setAttenuation(addr, atten_value):
-    atten_value = int(round(atten_value))
-    bits = '{:07b}'.format(atten_value)
-    mapped = "0" + bits[0:3] + bits[7:2:-1]
-    val = int(mapped, 2)
-    bus.write_byte_data(addr, output_reg, val)
-
-def setupAttenuator(addr):
-    bus.write_byte_data(addr, output_reg, 0x00)
-    bus.write_byte_data(addr, config_reg, 0x00)
-    current = bus.read_byte_data(addr, output_reg)
-    bus.write_byte_data(addr, output_reg, current | 0x02)
+    attenuators.set_channel(attenuators.addresses.index(addr), atten_value)
 
 def percent_to_attenuation(p):
     if p >= 100: return 0
@@ -81,12 +75,9 @@ def animate_channel(channel_label):
     delay_cmd = delay_cmds[channel_label]
     origin = origins[channel_label]
 
-    setupAttenuator(addr)
-
     # Set other channels to 0 dB (max amplitude)
     for other_label in i2c_addresses:
         if other_label != channel_label:
-            setupAttenuator(i2c_addresses[other_label])
             setAttenuation(i2c_addresses[other_label], 0)
 
     # Sweep forward
@@ -1,5 +1,10 @@
 import smbus
+import sys
 import math, argparse
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "ON_PATT_controlling_FLOWER"))
+from pe43713 import PE43713Bank, register_value
 
 bus = smbus.SMBus(2) #i2c2 is used on the BBB
 
@@ -50,15 +55,7 @@ def setAttenuation(address, atten_value=0):
     atten_value is adjusted before loading to match schematic
     '''
     
-    atten_bits_value = '{:07b}'.format(atten_value)
-
-    #Following the mapping from the schematic and https://www.psemi.com/pdf/datasheets/pe43713ds.pdf
-    mapped_atten_bits = "0" + atten_bits_value[0:3] + atten_bits_value[7:2:-1]
-    
-    #Now turn the string back into an 8-bit binary number
-    new_reg_value = int(mapped_atten_bits, 2)    
-
-    ack = write(address, output_reg, new_reg_value)
+    ack = write(address, output_reg, register_value(atten_value))
 
 def setOutput(address):
 
@@ -75,10 +72,8 @@ def set_equal_attens(atten_value = 1):
     adr2 = 0x3c
     adr3 = 0x3e
 
-    for address in [adr0, adr1, adr2, adr3]:
-        setup(address)
-        setOutput(address)
-        setAttenuation(address, atten_value)
+    # configures each expander and loads the code: 2 writes per channel
+    PE43713Bank(bus, addresses=[adr0, adr1, adr2, adr3]).set_all(atten_value)
 
 if __name__=='__main__':
     parser = argparse.ArgumentParser()
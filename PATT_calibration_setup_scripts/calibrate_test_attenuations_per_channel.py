@@ -1,42 +1,22 @@
 import smbus
+import sys
 import json
 import os
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "ON_PATT_controlling_FLOWER"))
+from pe43713 import PE43713Bank
 
 PRESET_FILE = "atten_presets.json"
 
 # I2C setup
 bus = smbus.SMBus(2)
-output_reg = 0x01
-config_reg = 0x03
 
 # All 4 channels now work and are mapped 1:1
 #CHANNEL_ADDRESSES = [0x38, 0x3a, 0x3c, 0x3e]
 CHANNEL_ADDRESSES = [0x3e, 0x3c, 0x3a, 0x38]
 CHANNEL_LABELS = ['A', 'B', 'C', 'D']
-
-# ---- I2C Communication ----
-def write(i2c_address, register, cmd):
-    bus.write_byte_data(i2c_address, register, cmd)
-
-def read(i2c_address, register):
-    return bus.read_byte_data(i2c_address, register)
-
-def setup(address):
-    write(address, output_reg, 0x00)
-    write(address, config_reg, 0x00)
-
-def getOutputRegisterValue(address):
-    return read(address, output_reg)
-
-def setOutput(address):
-    current_val = getOutputRegisterValue(address)
-    write(address, output_reg, current_val | 0x02)
-
-def setAttenuation(address, atten_value=0):
-    atten_bits = '{:07b}'.format(atten_value)
-    mapped_bits = "0" + atten_bits[0:3] + atten_bits[7:2:-1]
-    new_reg_value = int(mapped_bits, 2)
-    write(address, output_reg, new_reg_value)
+attenuators = PE43713Bank(bus, addresses=CHANNEL_ADDRESSES)  # configures each expander once, then writes only changed codes
 
 # ---- Preset Management ----
 def load_presets():
@@ -70,11 +50,7 @@ def apply_attenuations(values):
     print("\nApplying attenuation values:")
     for i, val in enumerate(values):
         print(f"  Channel {CHANNEL_LABELS[i]} (addr {hex(CHANNEL_ADDRESSES[i])}): {val} (0.5 dB steps)")
-
-        addr = CHANNEL_ADDRESSES[i]
-        setup(addr)
-        setOutput(addr)
-        setAttenuation(addr, val)
+    attenuators.set_codes(values)
 
     print("✅ Attenuation applied.\n")
 
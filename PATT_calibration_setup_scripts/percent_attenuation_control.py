@@ -1,40 +1,19 @@
 import smbus
+import sys
 import numpy as np
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "ON_PATT_controlling_FLOWER"))
+from pe43713 import PE43713Bank
 
 # I2C setup
 bus = smbus.SMBus(2)
-output_reg = 0x01
-config_reg = 0x03
 
 # Channel info
 CHANNEL_INDEXES = [0, 1, 2, 3]
 CHANNEL_ADDRESSES = [0x3e, 0x3c, 0x3a, 0x38]
 CHANNEL_LABELS = ['A', 'B', 'C', 'D']
-
-# --- I2C functions ---
-def write(i2c_address, register, cmd):
-    bus.write_byte_data(i2c_address, register, cmd)
-
-def read(i2c_address, register):
-    return bus.read_byte_data(i2c_address, register)
-
-def setup(address):
-    write(address, output_reg, 0x00)
-    write(address, config_reg, 0x00)
-
-def getOutputRegisterValue(address):
-    return read(address, output_reg)
-
-def setOutput(address):
-    val = getOutputRegisterValue(address)
-    write(address, output_reg, val | 0x02)
-
-def setAttenuation(address, atten_value=0):
-    atten_value = int(round(atten_value))
-    atten_bits = '{:07b}'.format(atten_value)
-    mapped = "0" + atten_bits[0:3] + atten_bits[7:2:-1]
-    value = int(mapped, 2)
-    write(address, output_reg, value)
+attenuators = PE43713Bank(bus, addresses=CHANNEL_ADDRESSES)
 
 # --- Logarithmic model ---
 def percent_to_attenuation(p):
@@ -57,11 +36,7 @@ def apply_percentage(percent):
     attenuation = percent_to_attenuation(percent)
     print(f"\nTarget %: {percent:.2f} → Attenuation value: {attenuation}")
 
-    for i in CHANNEL_INDEXES:
-        addr = CHANNEL_ADDRESSES[i]
-        setup(addr)
-        setOutput(addr)
-        setAttenuation(addr, attenuation)
+    attenuators.set_all(attenuation)
 
     print("✅ Attenuation applied to channels A, B, C, D.")
 
@@ -1,11 +1,15 @@
 import numpy as np
+import sys
 import time
 import serial
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "ON_PATT_controlling_FLOWER"))
+from delay_presets import compile_presets
 
 # === Constants and Calibration ===
 n_ice = 1.78  # index of refraction in ice
 vertical_seperation = 1  # meters
-c = 299792458  # m/s (speed of light)
 calibration_delays = [5.19, 0, 5.21, 6.08]  # ns
 cable_delays = [14.06, 9.57, 4.30, 0.00]  # ns
 
@@ -30,11 +34,6 @@ def send(cmd: str, loud: bool = True) -> str:
         print(f"[SERIAL] {cmd} → {resp}")
     return resp
 
-def angle_delay_time(n, d, c, angle_deg):
-    angle_rad = np.deg2rad(angle_deg)
-    delay = n * d * np.sin(angle_rad) / c
-    return -delay * 1e9  # ns #because ch3 is on top and ch0 is at the bottom this is to flip th order of the delays
-
 def apply_delay_preset(delays_ns):
     for ch, delay_ns in zip(CHANNEL_ORDER, delays_ns):
         cmd = f"{CHANNEL_MAP[ch]}D {round(delay_ns, 3)}n"
@@ -52,12 +51,10 @@ def main():
         if not -90 <= angle <= 90:
             raise ValueError("Angle out of range.")
 
-        delays = angle_delay_time(n_ice, vertical_seperation, c, angle)
-        step_delay = abs(delays)
-        base_delays = [round(i * step_delay, 2) for i in range(4)]
-        if delays < 0:
-            base_delays = base_delays[::-1]
-        final_delays = [base_delays[i] + calibration_delays[i] + cable_delays[i] for i in range(4)]
+        # ch3 is on top and ch0 at the bottom, hence reverse=True
+        final_delays = compile_presets([angle], n_ice=n_ice, spacing_m=vertical_seperation, reverse=True,
+                                       offsets_ns=calibration_delays,
+                                       cable_delays_ns=cable_delays, cache=False).delays[0].tolist()
 
         print(f"Applying delays for angle {angle:+.2f}° → {final_delays} ns")
         apply_delay_preset(final_delays)
@@ -1,7 +1,11 @@
 import serial
-import time
+import sys
 import json
 import os
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "ON_PATT_controlling_FLOWER"))
+from t660 import T660
 
 PRESETS_FILE = "delay_presets.json"
 
@@ -18,19 +22,12 @@ def save_presets(presets):
     with open(PRESETS_FILE, 'w') as f:
         json.dump(presets, f, indent=2)
 
-def send_command(ser, command, loud=True):
-    ser.write((command + '\n').encode())
-    line = ser.readline()
-    if loud:
-        print(str(line.decode().strip()))
-
 def apply_delay_preset(ser, delays):
-    for ch, delay in delays.items():
-        send_command(ser, f"{ch}D {delay}")
-    send_command(ser, 'DW 2u')   # Set pulse width
-    send_command(ser, 'DSET')
-    for ch in delays:
-        send_command(ser, f"{ch}SET")
+    # whole preset in one burst, replies checked together
+    cmds = [f"{ch}D {delay}" for ch, delay in delays.items()]
+    cmds += ['DW 2u', 'DSET']   # Set pulse width
+    cmds += [f"{ch}SET" for ch in delays]
+    T660(ser, loud=True).transaction(cmds)
 
 def prompt_new_preset():
     print("\nCreate new preset:")
@@ -14,6 +14,7 @@ with open("getting_SNR_from_p2p_08_01_plane_hi_lo.json", "r") as f:
 # Extract attenuation_percent and corresponding peak_to_peak values
 attenuations = []
 average_SNR = []
+average_SNR_err = []  # from peak_to_peak_err (FLOWER RAM statistics), 0 for older scans
 
 for entry in data:
     SNR = []
@@ -21,16 +22,21 @@ for entry in data:
     att = 100*10**(-att/80)
     
     p2p = entry["peak_to_peak"]
+    p2p_err = entry.get("peak_to_peak_err", [0, 0, 0, 0])
+    SNR_err = []
     if len(p2p) == 4:
         attenuations.append(att)
         for i in range(4):
             SNR.append(p2p[i]/(RMS[i]*2))  # Normalize by RMS
+            SNR_err.append(p2p_err[i]/(RMS[i]*2))
 
     average_SNR.append(np.mean(SNR))  # Average SNR across channels
+    average_SNR_err.append(np.sqrt(np.sum(np.square(SNR_err))) / max(len(SNR_err), 1))
 
 
 attenuations = np.array(attenuations)
 average_SNR = np.array(average_SNR)
+average_SNR_err = np.array(average_SNR_err)
 mask = (attenuations < 60) & (attenuations > 20)
 
 fit_coeffs = np.polyfit(attenuations[mask], average_SNR[mask], 1)
@@ -43,12 +49,20 @@ fit_y = fit_fn(fit_x)
 
 x_masked = attenuations[mask]
 y_masked = average_SNR[mask]
-slope = np.sum(x_masked * y_masked) / np.sum(x_masked * x_masked)
+err_masked = average_SNR_err[mask]
+if np.all(err_masked > 0):
+    # weighted fit through (0,0) with the slope error from the p2p standard errors
+    w = 1 / err_masked**2
+    slope = np.sum(w * x_masked * y_masked) / np.sum(w * x_masked * x_masked)
+    slope_err = 1 / np.sqrt(np.sum(w * x_masked * x_masked))
+    print(f"Calculated slope: {slope} ± {slope_err}")
+else:
+    slope = np.sum(x_masked * y_masked) / np.sum(x_masked * x_masked)
+    print(f"Calculated slope: {slope}")
 fit_y = slope * fit_x  # fit_x already defined as np.linspace(0, 90, 200)
-print(f"Calculated slope: {slope}")
 # Plot
 plt.figure(figsize=(6, 6))
-plt.plot(attenuations, average_SNR, marker='o', label='All Data')
+plt.errorbar(attenuations, average_SNR, yerr=average_SNR_err, marker='o', label='All Data')
 plt.plot(x_masked, y_masked, marker='o', color='red', label='Masked Data')
 plt.plot(fit_x, fit_y, color='blue', linestyle='--', label='Linear Fit through (0,0)')
 
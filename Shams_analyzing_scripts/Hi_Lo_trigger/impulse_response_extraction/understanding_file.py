@@ -1,21 +1,19 @@
-import json
+import sys
+from pathlib import Path
 
-json_path = '/mnt/labdata/chicago-rnog-system-response-2024/sys_response_radiant_v3/ch3_response_deep_atten62.json'
+sys.path.append(str(Path(__file__).resolve().parents[3] / "Trigger_simulation_and_tests"))
+from response_library import load_response
 
-with open(json_path) as f:
-    data = json.load(f)
+# every record field stacked over the records (see response_library.load_response)
+data = load_response("sys_response_radiant_v3/ch3_response_deep_atten62")
 
-print("Keys in first item:")
-for key in data[0].keys():
-    print("-", key)
+print("Fields (shape over all records):")
+for key, values in data.items():
+    print("-", key, values.shape)
 
 
-example = data[0]
-
-if 'radiant_waveforms' in example:
-    print("Radiant response preview:", example['radiant_waveforms'][:10])
-
-if 'station' in example:
-    print("Stations:", example['station'])
-
+if 'radiant_waveforms' in data:
+    print("Radiant response preview:", data['radiant_waveforms'][0][:10])
 
+if 'station' in data:
+    print("Stations:", data['station'][0])
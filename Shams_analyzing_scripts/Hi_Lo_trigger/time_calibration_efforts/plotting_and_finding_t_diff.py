@@ -1,9 +1,12 @@
 
 import json, numpy as np, matplotlib.pyplot as plt
+import sys
 from pathlib import Path
 import tools.waveform as waveform
 import vpol_txrx as rxtx
 from impulse_response import make_avg_wf
+sys.path.append(str(Path(__file__).resolve().parents[3] / "ON_FLOWER_receiving_from_PATT"))
+from event_capture import load_events
 
 
 
@@ -44,12 +47,17 @@ def make_avg_wf(wave_list, upsamp=UPSAMPLE_FACTOR, method='cor'):
 
 # ---------- 1. load JSON deep-chain data ----------------------------------
 
-# Load JSON data
-with open(JSON_FILE, 'r') as f:
-    data = json.load(f)
+# Load JSON data, or a binary .evt capture of flower_scan_server.py (memory-mapped)
+if JSON_FILE.suffix == ".evt":
+    capture = load_events(JSON_FILE)
+    data = [{f"ch{ch}": wave.astype(float) - capture["pedestal"] for ch, wave in enumerate(event)}
+            for event in capture["events"]]
+else:
+    with open(JSON_FILE, 'r') as f:
+        data = json.load(f)
+    data = data["events"]  # Extract events from the JSON data
 
 plt.figure(figsize=(10, 5))
-data = data["events"]  # Extract events from the JSON data
 num_channels = 4  # Number of channels in the JSON file
 num_events = len(data)  # Number of events to process, adjust as needed
 print(f'Number of events: {num_events}')
@@ -10,11 +10,11 @@ def sigmoid(x, x0, k):
     """Sigmoid function for fitting."""
     return 1 / (1 + np.exp(-k * (x - x0)))
 
-def fit_and_plot_sigmoid(x, y, ax=None):
+def fit_and_plot_sigmoid(x, y, ax=None, y_err=None):
     """Fit a sigmoid to the data and plot both data and fit."""
     # Initial guess for parameters: midpoint and slope
     p0 = [np.median(x), 1.0]
-    popt, _ = curve_fit(sigmoid, x, y, p0, maxfev=10000)
+    popt, _ = curve_fit(sigmoid, x, y, p0, sigma=y_err, absolute_sigma=y_err is not None, maxfev=10000)
     x_fit = np.linspace(np.min(x), np.max(x), 200)
     y_fit = sigmoid(x_fit, *popt)
     if ax is None:
@@ -31,20 +31,27 @@ with open("trigger_efficiency_curve_only_coinc.json", "r") as f:
 attenuations = []
 average_SNR = []
 efficiencies = []
+efficiency_errs = []  # measured by the adaptive FLOWER reading, if present
 for entry in data:
     att_percent = entry["attenuation_percent"]
     attenuations.append(att_percent)
     average_SNR.append(SNR_slope * att_percent)  # Calculate SNR from attenuation percent
     eff = entry["coincidence_rate"] / RATE  # Convert to efficiency
     efficiencies.append(eff)
+    efficiency_errs.append(entry.get("efficiency_err", np.nan))
 
 average_SNR = np.array(average_SNR)
 efficiencies = np.array(efficiencies)
+efficiency_errs = np.array(efficiency_errs)
+if np.all(np.isfinite(efficiency_errs)):
+    efficiency_errs = np.maximum(efficiency_errs, 1e-3)  # keep 0%/100% points from dominating the fit
+else:
+    efficiency_errs = None
 
 # Plot
 fig, ax = plt.subplots(figsize=(6, 6))
-ax.plot(average_SNR, efficiencies, marker='o', linestyle='', label='Data')
-popt = fit_and_plot_sigmoid(average_SNR, efficiencies, ax=ax)
+ax.errorbar(average_SNR, efficiencies, yerr=efficiency_errs, marker='o', linestyle='', label='Data')
+popt = fit_and_plot_sigmoid(average_SNR, efficiencies, ax=ax, y_err=efficiency_errs)
 ax.axhline(y=0.5, color='r', linestyle='--', label='50% Efficiency Threshold')
 ax.axvline(x=popt[0], color='g', linestyle='--', label=f'SNR at 50% Eff. ({popt[0]:.2f})')
 
@@ -8,7 +8,13 @@ import time
 import random
 import json
 from pathlib import Path
-from sim_functions import make_band_limited_noise, generate_pulse, digitize_signal, make_full_signal, plot_4_channels_signals, find_triggers
+from concurrent.futures import ProcessPoolExecutor
+from response_library import load_response
+from sim_functions import make_band_limited_noise, generate_pulse, digitize_signal, make_full_signal, plot_4_channels_signals, find_triggers, BandLimitedNoiseGenerator, PulseTemplateBank, make_full_signal_batch, coincidence_triggered
+from scan_runner import run_efficiency_scan
+from efficiency_estimator import ExceedanceTable, efficiency_curve, efficiency_at
+sys.path.append(str(Path(__file__).resolve().parents[1] / "ON_PATT_controlling_FLOWER"))
+from adaptive_scan import AdaptiveSigmoidScan
 
 
 #parameters
@@ -25,6 +31,12 @@ THRESHOLD_V= [18,21,19,21]  # ADC counts
 N_REQ = 2  # Number of channels required for a trigger
 COINC_NS = SIMULATION_DURATION_NS
 SCAN_RATE = 40 
+SEED = None  # set to an int to reproduce a scan
+N_WORKERS = None  # worker processes, None = all cores
+ESTIMATOR = "monte_carlo"  # "analytic": exceedance tables + N-of-M combination, "adaptive": trials placed around the 50% point
+TARGET_SNR50_ERR = 0.02  # adaptive mode stops once the 50% SNR is known to this (1σ)
+ADAPTIVE_CHUNK = 10  # trials per task in adaptive mode, so one point's SCAN_RATE trials spread over the workers
+N_NOISE_TABLE = 5000  # noise traces behind the analytic exceedance tables
 PULSE_AMPLITUDES = np.concatenate([
     np.arange(6, 12, 2),   
     np.arange(12, 21, 1),  
@@ -32,9 +44,8 @@ PULSE_AMPLITUDES = np.concatenate([
 ])  
 
 #preparring the sample pulse
-with open('/home/shamshassiki/Shams_Analyzing_scripts/Trigger_simulation_and_tests/jsons/upsampled_2filter_pulse_example.json') as f:
-    pulse_data = json.load(f)
-impulse_response_path   = Path("/home/shamshassiki/Shams_Analyzing_scripts/Trigger_simulation_and_tests/jsons/impulse_response_Freauency_35_240.json")
+pulse_data = load_response("upsampled_2filter_pulse_example")
+impulse_response_path   = "impulse_response_Freauency_35_240"
 
 pulse_voltage = np.array(pulse_data['avg_wave'])
 pulse_time = np.array(pulse_data['t_axis_ns'])
@@ -44,59 +55,117 @@ pulse_time = pulse_time[(pulse_time >= pulse_start_time) & (pulse_time <= pulse_
 pulse_time = pulse_time - pulse_time[0]  # Start from 0 ns
 
 
-pass_fraction = []  # Example fraction of runs where a pulse is present
-SNR_values = []  # Example SNR values for each run
+def analytic_scan(amplitudes):
+    rng = np.random.default_rng(SEED)
+    noise_generator = BandLimitedNoiseGenerator(impulse_response_path, channel_key="ch2_2x_amp")
+    _, noise = noise_generator.generate(N_NOISE_TABLE, 1,
+                                        window_ns=SIMULATION_DURATION_NS,
+                                        adc_rate_ghz=SAMPLING_RATE,
+                                        target_rms_mV=NOISE_EQUALIZE,
+                                        rng=rng)
+    pulse_bank = PulseTemplateBank(pulse_voltage, pulse_time, TIME_STEP, SIMULATION_DURATION_SAMPLES)
+    table = ExceedanceTable(noise[:, 0, :SIMULATION_DURATION_SAMPLES], pulse_bank, amplitudes, THRESHOLD_V, MAX_SIGNAL)
+    return efficiency_curve(table, n_channels_required=N_REQ)
 
-for run, run_pulse_amplitude in enumerate(PULSE_AMPLITUDES):
-    channel_signals= [[] for _ in range(N_of_channels)]
-    time_start= run * SIMULATION_DURATION_NS
-    COINC=0
-    for SCAN in range(SCAN_RATE):  
 
-        for ch in range(N_of_channels):
-            t, channel_signals[ch] = make_full_signal(impulse_json_path=impulse_response_path,
+if __name__ == "__main__":
+    if ESTIMATOR == "analytic":
+        fine_amplitudes = np.linspace(PULSE_AMPLITUDES[0], PULSE_AMPLITUDES[-1], 200)
+        efficiency, eff_low, eff_high = analytic_scan(fine_amplitudes)
+        SNR_values = fine_amplitudes / NOISE_EQUALIZE
+        snr_50 = efficiency_at(0.5, SNR_values, efficiency)
+        # band on the 50% point from the efficiency band (upper curve crosses first)
+        snr_50_low, snr_50_high = efficiency_at(0.5, SNR_values, eff_high), efficiency_at(0.5, SNR_values, eff_low)
+
+        plt.figure(figsize=(10, 6))
+        plt.plot(SNR_values, efficiency, label=f'Analytic efficiency ({N_NOISE_TABLE} noise traces)')
+        plt.fill_between(SNR_values, eff_low, eff_high, alpha=0.3, label='Binomial band (1σ)')
+        plt.axhline(y=0.5, color='r', linestyle='--', label='50% Pass Threshold')
+        plt.axvline(x=snr_50, color='g', linestyle='--',
+                    label=f'50% eff SNR at {snr_50:.2f} [{snr_50_low:.2f}, {snr_50_high:.2f}]')
+        plt.title('Hi-Lo Trigger Efficiency Scan')
+        plt.xlabel('SNR')
+        plt.ylabel('Pass Fraction')
+        plt.grid()
+        plt.legend()
+        plt.savefig("Hi_Lo_trigger_efficiency_scan_analytic.png")
+        sys.exit()
+
+    if ESTIMATOR == "adaptive":
+        sim_kwargs = dict(threshold=THRESHOLD_V, coincidence_ns=COINC_NS, n_channels_required=N_REQ,
+                          SIMULATION_DURATION_NS=SIMULATION_DURATION_NS, SAMPLING_RATE=SAMPLING_RATE,
+                          NOISE_EQUALIZE=NOISE_EQUALIZE, simulation_duration_samples=SIMULATION_DURATION_SAMPLES,
+                          max_signal=MAX_SIGNAL, n_trials=SCAN_RATE, n_channels=N_of_channels, max_workers=N_WORKERS)
+        root_seed = np.random.SeedSequence(SEED).entropy
+        scan = AdaptiveSigmoidScan(PULSE_AMPLITUDES[0] / NOISE_EQUALIZE, PULSE_AMPLITUDES[-1] / NOISE_EQUALIZE,
+                                   target_x50_err=TARGET_SNR50_ERR, max_points=100)
+        # one pool for the whole scan; every point is a single small scan
+        with ProcessPoolExecutor(max_workers=N_WORKERS) as pool:
+            snr = scan.propose()
+            while snr is not None:
+                _, n_pass, _ = run_efficiency_scan(impulse_response_path, pulse_voltage, pulse_time,
+                                                   [snr * NOISE_EQUALIZE], seed=[root_seed, len(scan.x)],
+                                                   chunk_size=ADAPTIVE_CHUNK, pool=pool, **sim_kwargs)
+                scan.observe(snr, n_pass[0], SCAN_RATE)
+                snr = scan.propose()
+        b, b_err, a = scan.fit()
+        SNR_values = np.array(scan.x)
+        pass_fraction = np.array(scan.k) / np.array(scan.n)
+
+        plt.figure(figsize=(10, 6))
+        plt.errorbar(SNR_values, pass_fraction, yerr=np.sqrt(pass_fraction * (1 - pass_fraction) / SCAN_RATE),
+                     fmt='o', label=f'Pass Fraction vs SNR ({len(SNR_values)} adaptive points)')
+        snr_fine = np.linspace(SNR_values.min(), SNR_values.max(), 300)
+        plt.plot(snr_fine, 1 / (1 + np.exp(-a * (snr_fine - b))), linestyle='--', label='Sigmoid Fit')
+        plt.axhline(y=0.5, color='r', linestyle='--', label='50% Pass Threshold')
+        plt.axvline(x=b, color='g', linestyle='--', label=f'50% eff SNR at {b:.2f} ± {b_err:.2f}')
+        plt.title('Hi-Lo Trigger Efficiency Scan')
+        plt.xlabel('SNR')
+        plt.ylabel('Pass Fraction')
+        plt.grid()
+        plt.legend()
+        plt.savefig("Hi_Lo_trigger_efficiency_scan_adaptive.png")
+        sys.exit()
+
+    pass_fraction, n_pass, used_seed = run_efficiency_scan(impulse_response_path, pulse_voltage, pulse_time, PULSE_AMPLITUDES,
+                                    threshold=THRESHOLD_V,
+                                    coincidence_ns=COINC_NS,
+                                    n_channels_required=N_REQ,
                                     SIMULATION_DURATION_NS=SIMULATION_DURATION_NS,
                                     SAMPLING_RATE=SAMPLING_RATE,
                                     NOISE_EQUALIZE=NOISE_EQUALIZE,
-                                    pulse_voltage=pulse_voltage,
-                                    pulse_time=pulse_time,
-                                    time_step=TIME_STEP,
                                     simulation_duration_samples=SIMULATION_DURATION_SAMPLES,
-                                    amplitude_scale=run_pulse_amplitude,
-                                    max_signal=MAX_SIGNAL) 
-        time_axis = t + time_start  # Adjust time axis for the current run
-        #finding if channels exceed the threshold
-        SNR = run_pulse_amplitude / NOISE_EQUALIZE
-        triggers = find_triggers(channel_signals, time_axis, threshold=THRESHOLD_V, coincidence_ns=COINC_NS, n_channels_required=N_REQ)
-        if len(triggers) > 0:
-            COINC += 1
-    pass_fraction.append(COINC / SCAN_RATE)
-    SNR_values.append(SNR)
-    print(f"\r Progress: {run+1}/{len(PULSE_AMPLITUDES)} completed", end='')
-
-
-#sigmoid fit for SNR to pass fraction
-def sigmoid(x, a, b):
-    return 1 / (1 + np.exp(-a * (x - b)))
-from scipy.optimize import curve_fit
-# Fit the sigmoid function to the data
-params, _ = curve_fit(sigmoid, SNR_values, pass_fraction, p0=[1, np.mean(SNR_values)])
-a, b = params
-# Generate sigmoid values for plotting
-pass_fraction_sigmoid = sigmoid(np.array(SNR_values), a, b)
-
-
-# Plotting the results
-plt.figure(figsize=(10, 6))
-plt.plot(SNR_values, pass_fraction, marker='o', label='Pass Fraction vs SNR')
-plt.plot(SNR_values, pass_fraction_sigmoid, marker='x', linestyle='--', label='Sigmoid Fit')
-plt.axhline(y=0.5, color='r', linestyle='--', label='50% Pass Threshold')
-plt.axvline(x=b, color='g', linestyle='--', label='50% eff SNR at {:.2f}'.format(b))
-plt.title('Hi-Lo Trigger Efficiency Scan')
-plt.xlabel('SNR')
-plt.ylabel('Pass Fraction')
-plt.grid()
-plt.legend()
-plt.savefig("Hi_Lo_trigger_efficiency_scan_flower_thresh.png")
+                                    max_signal=MAX_SIGNAL,
+                                    n_trials=SCAN_RATE,
+                                    n_channels=N_of_channels,
+                                    max_workers=N_WORKERS,
+                                    seed=SEED)
+    SNR_values = PULSE_AMPLITUDES / NOISE_EQUALIZE
+    print(f"Scan done ({SCAN_RATE} trials per point, seed {used_seed})")
+
+
+    #sigmoid fit for SNR to pass fraction
+    def sigmoid(x, a, b):
+        return 1 / (1 + np.exp(-a * (x - b)))
+    from scipy.optimize import curve_fit
+    # Fit the sigmoid function to the data
+    params, _ = curve_fit(sigmoid, SNR_values, pass_fraction, p0=[1, np.mean(SNR_values)])
+    a, b = params
+    # Generate sigmoid values for plotting
+    pass_fraction_sigmoid = sigmoid(np.array(SNR_values), a, b)
+
+
+    # Plotting the results
+    plt.figure(figsize=(10, 6))
+    plt.plot(SNR_values, pass_fraction, marker='o', label='Pass Fraction vs SNR')
+    plt.plot(SNR_values, pass_fraction_sigmoid, marker='x', linestyle='--', label='Sigmoid Fit')
+    plt.axhline(y=0.5, color='r', linestyle='--', label='50% Pass Threshold')
+    plt.axvline(x=b, color='g', linestyle='--', label='50% eff SNR at {:.2f}'.format(b))
+    plt.title('Hi-Lo Trigger Efficiency Scan')
+    plt.xlabel('SNR')
+    plt.ylabel('Pass Fraction')
+    plt.grid()
+    plt.legend()
+    plt.savefig("Hi_Lo_trigger_efficiency_scan_flower_thresh.png")
 
 
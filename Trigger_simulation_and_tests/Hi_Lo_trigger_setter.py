@@ -8,7 +8,9 @@ import time
 import random
 import json
 from pathlib import Path
-from sim_functions import make_band_limited_noise, generate_pulse, digitize_signal, make_full_signal, plot_4_channels_signals, find_triggers
+from streaming_sim_functions import simulate_noise_trigger_rate
+from response_library import load_response
+from sim_functions import make_band_limited_noise, generate_pulse, digitize_signal, make_full_signal, plot_4_channels_signals, find_triggers, BandLimitedNoiseGenerator, make_full_signal_batch, coincidence_triggered, coincidence_window_max, threshold_scan
 
 
 #parameters
@@ -24,12 +26,14 @@ N_of_channels = 4
 THRESHOLD_V= [18, 18, 18, 18]  # ADC counts
 N_REQ = 2  # Number of channels required for a trigger
 COINC_NS = SIMULATION_DURATION_NS
+THRESHOLD_SCAN = np.arange(12, 25, 1)  # common per-channel thresholds (ADC) for the rate scan, None to skip
+N_REQ_SCAN = [1, 2, 3, 4]
+STREAM_LIVE_TIME_S = 0.01  # seconds of continuous noise for the true trigger rate in Hz, None to skip
 
 
 #preparring the sample pulse
-with open('/home/shamshassiki/Shams_Analyzing_scripts/Trigger_simulation_and_tests/jsons/upsampled_2filter_pulse_example.json') as f:
-    pulse_data = json.load(f)
-impulse_response_path   = Path("/home/shamshassiki/Shams_Analyzing_scripts/Trigger_simulation_and_tests/jsons/impulse_response_Freauency_35_240.json")
+pulse_data = load_response("upsampled_2filter_pulse_example")
+impulse_response_path   = "impulse_response_Freauency_35_240"
 
 pulse_voltage = np.array(pulse_data['avg_wave'])
 pulse_time = np.array(pulse_data['t_axis_ns'])
@@ -43,46 +47,50 @@ SIMULATION_TOTAL_DURATION_NS= SIMULATION_DURATION_NS * 1000 #1e3
 NUMBER_OF_RUNS = int(SIMULATION_TOTAL_DURATION_NS // SIMULATION_DURATION_NS)
 
 
-n_trigs = 0
-for run in range(NUMBER_OF_RUNS):
-    channel_signals= [[] for _ in range(N_of_channels)]
-    time_start= run * SIMULATION_DURATION_NS
-    no_pulses = 0 
-    for ch in range(N_of_channels):
-        t, channel_signals[ch] = make_full_signal(impulse_json_path=impulse_response_path,
-                                SIMULATION_DURATION_NS=SIMULATION_DURATION_NS,
-                                SAMPLING_RATE=SAMPLING_RATE,
-                                NOISE_EQUALIZE=NOISE_EQUALIZE,
-                                pulse_voltage=pulse_voltage,
-                                pulse_time=pulse_time,
-                                time_step=TIME_STEP,
-                                simulation_duration_samples=SIMULATION_DURATION_SAMPLES,
-                                amplitude_scale=no_pulses,
-                                max_signal=MAX_SIGNAL) 
-    time_axis = t + time_start  # Adjust time axis for the current run
-
-    triggers = find_triggers(channel_signals, time_axis,
-                             threshold=THRESHOLD_V,
-                             coincidence_ns=COINC_NS,
-                             n_channels_required=N_REQ)
-    if len(triggers) > 0:
-        n_trigs += 1
-
-
-
-    #print(f"Run {run}: {len(triggers)} trigger(s) found")
-    #for trig in triggers:
-    #    print(f"  • t = {trig['t_trigger']:.1f} ns on channels {trig['channels']}")
-
-    #plot_4_channels_signals(time_axis, channel_signals, title=f"Run {run+1} - 4 Channels Signals")
-    #print(all_triggers.extend(triggers))
-    
-    #print progresion
-    if run % 10 == 0 or run == NUMBER_OF_RUNS - 1:
-        print(f"\r Progress: {run+1}/{NUMBER_OF_RUNS} completed", end='')
-    
+noise_generator = BandLimitedNoiseGenerator(impulse_response_path, channel_key="ch2_2x_amp")
+no_pulses = 0
+t, run_signals = make_full_signal_batch(noise_generator, NUMBER_OF_RUNS, N_of_channels,
+                        SIMULATION_DURATION_NS=SIMULATION_DURATION_NS,
+                        SAMPLING_RATE=SAMPLING_RATE,
+                        NOISE_EQUALIZE=NOISE_EQUALIZE,
+                        pulse_voltage=pulse_voltage,
+                        pulse_time=pulse_time,
+                        time_step=TIME_STEP,
+                        simulation_duration_samples=SIMULATION_DURATION_SAMPLES,
+                        amplitude_scale=no_pulses,
+                        max_signal=MAX_SIGNAL)
+
+triggered = coincidence_triggered(run_signals, TIME_STEP,
+                                  threshold=THRESHOLD_V,
+                                  coincidence_ns=COINC_NS,
+                                  n_channels_required=N_REQ)
+n_trigs = int(np.count_nonzero(triggered))
+
+#plot_4_channels_signals(t, run_signals[0], title="Run 1 - 4 Channels Signals")
+
 print("\n ",n_trigs)
 
+#threshold scan: one noise ensemble, summarised once, evaluated for every threshold
+if THRESHOLD_SCAN is not None:
+    window_max = coincidence_window_max(run_signals, TIME_STEP, coincidence_ns=COINC_NS)
+    scan_trigs = threshold_scan(window_max, THRESHOLD_SCAN, n_channels_required=N_REQ_SCAN)
+    live_time_s = NUMBER_OF_RUNS * SIMULATION_DURATION_NS * 1e-9
+    print("threshold  " + "  ".join(f"N_REQ={n:<8}" for n in N_REQ_SCAN))
+    for thr, row in zip(THRESHOLD_SCAN, scan_trigs):
+        print(f"{thr:9}  " + "  ".join(f"{c:5d} ({c/NUMBER_OF_RUNS:4.2f})" for c in row))
+    print(f"(trigger counts out of {NUMBER_OF_RUNS} windows, {live_time_s*1e6:.1f} us live time)")
+
+#true noise trigger rate from continuous (streamed) noise, coincidences across block edges included
+if STREAM_LIVE_TIME_S is not None:
+    rate_hz, n_stream_trigs, stream_live_s = simulate_noise_trigger_rate(impulse_response_path, STREAM_LIVE_TIME_S,
+                                                threshold=THRESHOLD_V,
+                                                coincidence_ns=COINC_NS,
+                                                n_channels_required=N_REQ,
+                                                n_channels=N_of_channels,
+                                                adc_rate_ghz=SAMPLING_RATE,
+                                                target_rms_mV=NOISE_EQUALIZE)
+    print(f"\n streaming: {n_stream_trigs} triggers in {stream_live_s*1e3:.2f} ms → {rate_hz:.1f} Hz")
+
 """
 plt.figure(figsize=(12, 6))
 plt.plot(t, ch_signal, label='Signal with Noise', color='blue')
@@ -0,0 +1,103 @@
+import numpy as np
+import matplotlib.pyplot as plt
+import json
+from scipy.optimize import curve_fit
+from response_library import load_response
+from sim_functions import BandLimitedNoiseGenerator, PulseTemplateBank, digitize_signal
+from phased_sim_functions import (BEAM_ANGLES_DEG, plane_wave_delays_ns, beam_delays_samples,
+                                  shift_signals, beam_max_power, phased_triggered)
+
+
+#parameters
+SAMPLING_RATE   =  0.472            # GHz   (0.472 GS/s)
+TIME_STEP       = 1.0 / SAMPLING_RATE   # ns
+NOISE_EQUALIZE = 5 #ADC
+MAX_SIGNAL = 4095 #ADC
+WINDOW_SIZE = 18.75*1e6 #MHz
+n_of_windows = 3
+SIMULATION_DURATION_NS= n_of_windows/(WINDOW_SIZE) *1e9 #ns
+SIMULATION_DURATION_SAMPLES = int(SIMULATION_DURATION_NS / TIME_STEP)+1  # Number of samples in the simulation duration
+N_of_channels = 4
+POWER_WINDOW_SAMPLES = 8  # samples summed in the beam power
+NOISE_TRIGGER_FRACTION = 0.01  # fraction of noise-only windows allowed to trigger each beam, sets the thresholds
+N_NOISE_WINDOWS = 10000
+SCAN_RATE = 400  # trials per amplitude
+SEED = None
+ANGLES_DEG = np.arange(-60, 61, 5)
+PULSE_AMPLITUDES = np.arange(2, 31, 1)
+OUTPUT_JSON = "simulated_phased_snr_50.json"
+
+#preparring the sample pulse
+pulse_data = load_response("upsampled_2filter_pulse_example")
+impulse_response_path   = "impulse_response_Freauency_35_240"
+
+pulse_voltage = np.array(pulse_data['avg_wave'])
+pulse_time = np.array(pulse_data['t_axis_ns'])
+pulse_start_time, pulse_end_time = 450, 570  # ns
+pulse_voltage = pulse_voltage[(pulse_time >= pulse_start_time) & (pulse_time <= pulse_end_time)] / np.max(pulse_voltage)  # Normalized
+pulse_time = pulse_time[(pulse_time >= pulse_start_time) & (pulse_time <= pulse_end_time)]
+pulse_time = pulse_time - pulse_time[0]  # Start from 0 ns
+
+
+rng = np.random.default_rng(SEED)
+noise_generator = BandLimitedNoiseGenerator(impulse_response_path, channel_key="ch2_2x_amp")
+pulse_bank = PulseTemplateBank(pulse_voltage, pulse_time, TIME_STEP, SIMULATION_DURATION_SAMPLES)
+beam_delays = beam_delays_samples(BEAM_ANGLES_DEG, TIME_STEP, N_of_channels)
+
+def noise_block(n_trials):
+    _, noise = noise_generator.generate(n_trials, N_of_channels,
+                                        window_ns=SIMULATION_DURATION_NS,
+                                        adc_rate_ghz=SAMPLING_RATE,
+                                        target_rms_mV=NOISE_EQUALIZE,
+                                        rng=rng)
+    return noise[..., :SIMULATION_DURATION_SAMPLES]
+
+#per-beam power thresholds from a noise-only ensemble
+noise_max_power = beam_max_power(noise_block(N_NOISE_WINDOWS), beam_delays, POWER_WINDOW_SAMPLES)
+BEAM_THRESHOLDS = np.quantile(noise_max_power, 1 - NOISE_TRIGGER_FRACTION, axis=0)
+print("beam power thresholds:", np.round(BEAM_THRESHOLDS, 1))
+
+
+def sigmoid(x, a, b):
+    return 1 / (1 + np.exp(-a * (x - b)))
+
+results = []
+SNR_values = PULSE_AMPLITUDES / NOISE_EQUALIZE
+for i, angle in enumerate(ANGLES_DEG):
+    arrival = plane_wave_delays_ns([angle], N_of_channels)[0] / TIME_STEP
+    arrival = arrival - arrival.min()
+    pass_fraction = []
+    for amplitude in PULSE_AMPLITUDES:
+        # same pulse phase on every channel, then delayed by the plane-wave arrival time
+        pulses = np.repeat(pulse_bank.draw(amplitude, (SCAN_RATE, 1), rng=rng), N_of_channels, axis=1)
+        pulses = shift_signals(pulses, -arrival)
+        signals = digitize_signal(noise_block(SCAN_RATE) + pulses, MAX_SIGNAL)
+        triggered, _ = phased_triggered(signals, beam_delays, threshold=BEAM_THRESHOLDS,
+                                        power_window_samples=POWER_WINDOW_SAMPLES)
+        pass_fraction.append(np.count_nonzero(triggered) / SCAN_RATE)
+
+    try:
+        params, _ = curve_fit(sigmoid, SNR_values, pass_fraction, p0=[1, np.mean(SNR_values)])
+        snr_50 = float(params[1])
+    except (RuntimeError, ValueError) as e:
+        # flat or degenerate curve (e.g. never triggers): keep the angle, without a 50% point
+        print(f"\n[WARN] sigmoid fit failed at {angle:+.0f}°: {e}")
+        snr_50 = float("nan")
+    results.append({"angle_deg": float(angle), "snr_50": snr_50,
+                    "snr": SNR_values.tolist(), "pass_fraction": pass_fraction})
+    print(f"\r Progress: {i+1}/{len(ANGLES_DEG)} completed", end='')
+
+with open(OUTPUT_JSON, 'w') as f:
+    json.dump(results, f, indent=2)
+
+
+plt.figure(figsize=(10, 6))
+plt.plot([r["angle_deg"] for r in results], [r["snr_50"] for r in results], 'o', label='Simulated Phased Array')
+for beam in BEAM_ANGLES_DEG:
+    plt.axvline(x=beam, color='green', linestyle=':', linewidth=0.7)
+plt.title('Simulated Phased Array SNR at 50% Efficiency')
+plt.xlabel('Angle (deg)')
+plt.ylabel('SNR at 50% efficiency')
+plt.grid()
+plt.legend()
+plt.savefig("Phased_trigger_efficiency_scan.png")
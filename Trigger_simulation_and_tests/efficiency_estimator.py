@@ -0,0 +1,171 @@
+import numpy as np
+
+CHUNK_BYTES = 64 * 2**20  # noise + pulse block built at once by ExceedanceTable
+
+
+def n_of_m_probability(p, n_required):
+    """
+    Probability that at least `n_required` of M independent channels fire.
+
+    Parameters
+    ----------
+    p : ndarray
+        Per-channel firing probabilities, channels on the last axis.
+    n_required : int
+
+    Returns
+    -------
+    prob : ndarray, shape p.shape[:-1]
+    """
+    p = np.asarray(p, dtype=float)
+    # dist[..., k] = P(exactly k channels fired so far)
+    dist = np.zeros(p.shape[:-1] + (p.shape[-1] + 1,))
+    dist[..., 0] = 1.0
+    for ch in range(p.shape[-1]):
+        pc = p[..., ch, None]
+        dist[..., 1:] = dist[..., 1:] * (1 - pc) + dist[..., :-1] * pc
+        dist[..., 0] *= (1 - p[..., ch])
+    return dist[..., n_required:].sum(axis=-1)
+
+def wilson_interval(k, n, z=1.0):
+    """
+    Wilson score interval for k successes out of n (z=1 → 68%).
+    """
+    k = np.asarray(k, dtype=float)
+    p = k / n
+    denom = 1 + z**2 / n
+    centre = (p + z**2 / (2*n)) / denom
+    half = z * np.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / denom
+    return np.clip(centre - half, 0, 1), np.clip(centre + half, 0, 1)
+
+
+class ExceedanceTable:
+    """
+    Per-channel exceedance probabilities of band-limited noise plus pulse,
+    conditioned on the pulse phase.
+
+    The table keeps, for every phase k and amplitude a, the maximum of
+    noise + amplitudes[a] * template_k over each of the `n_noise` noise
+    traces, sorted (`maxima`, float32). The number of traces above any
+    threshold is then a `searchsorted`, so thresholds can be changed
+    without a rebuild; counts[ch, k, a] uses the current `threshold`. The
+    traces are built a few amplitudes at a time, so memory stays at about
+    `chunk_bytes` besides the table itself. Efficiency curves for any N-of-M
+    setting follow analytically (see `efficiency_curve`).
+
+    Parameters
+    ----------
+    noise_traces : ndarray
+        Shape (n_noise, n_samples), noise-only traces with the right spectrum
+        and RMS (any channel; the channels share the noise model).
+    pulse_bank : PulseTemplateBank
+        Pulse templates, one per sub-sample phase.
+    amplitudes : array-like
+        Pulse amplitudes (ADC) to tabulate.
+    threshold : array-like, optional
+        One threshold per channel; can be set (or passed to counts_for) later.
+    max_signal : float | None
+        ADC range, applied as in `digitize_signal`.
+    chunk_bytes : int
+        Size of the noise + pulse block built at once.
+    """
+
+    def __init__(self, noise_traces, pulse_bank, amplitudes, threshold=None, max_signal=None,
+                 chunk_bytes=CHUNK_BYTES):
+        noise_traces = np.asarray(noise_traces, dtype=np.float32)
+        self.amplitudes = np.asarray(amplitudes, dtype=float)
+        self.threshold = threshold
+        self.n_noise, n_samples = noise_traces.shape
+
+        n_phases = pulse_bank.templates.shape[0]
+        chunk = max(1, int(chunk_bytes // (4 * self.n_noise * n_samples)))
+        self.maxima = np.empty((n_phases, self.amplitudes.size, self.n_noise), dtype=np.float32)
+        traces = np.empty((chunk, self.n_noise, n_samples), dtype=np.float32)
+        for k, template in enumerate(np.asarray(pulse_bank.templates, dtype=np.float32)):
+            for a0 in range(0, self.amplitudes.size, chunk):
+                pulses = self.amplitudes[a0:a0 + chunk, None].astype(np.float32) * template   # (n, n_samples)
+                block = traces[:len(pulses)]                                              # (n, n_noise, n_samples)
+                np.add(noise_traces[None, :, :], pulses[:, None, :], out=block)
+                block.max(axis=-1, out=self.maxima[k, a0:a0 + chunk])
+        if max_signal is not None:
+            # clipping commutes with the maximum
+            np.clip(self.maxima, -max_signal//2, max_signal//2, out=self.maxima)
+        self.maxima.sort(axis=-1)
+
+    @property
+    def threshold(self):
+        return self._threshold
+
+    @threshold.setter
+    def threshold(self, threshold):
+        self._threshold = None if threshold is None else np.atleast_1d(np.asarray(threshold, dtype=float))
+        self._counts = None
+
+    def counts_for(self, threshold):
+        """(n_channels, n_phases, n_amplitudes) number of noise traces above each threshold."""
+        threshold = np.atleast_1d(np.asarray(threshold, dtype=np.float32))
+        rows = self.maxima.reshape(-1, self.n_noise)
+        below = np.array([[np.searchsorted(row, thr, side="right") for row in rows] for thr in threshold])
+        return (self.n_noise - below).reshape((threshold.size,) + self.maxima.shape[:2])
+
+    @property
+    def counts(self):
+        """counts_for(threshold), kept until the threshold changes."""
+        if self._threshold is None:
+            raise ValueError("no threshold set; assign table.threshold or use counts_for")
+        if self._counts is None:
+            self._counts = self.counts_for(self._threshold)
+        return self._counts
+
+    @property
+    def probability(self):
+        """(n_channels, n_phases, n_amplitudes) exceedance probabilities."""
+        return self.counts / self.n_noise
+
+
+def efficiency_curve(table, n_channels_required=2, common_phase=False, z=1.0):
+    """
+    N-of-M coincidence efficiency vs pulse amplitude from an ExceedanceTable.
+
+    Channels are combined as independent trials. A channel counts as hit if
+    it is above threshold anywhere in the trace, which matches the
+    coincidence trigger when the coincidence window covers the pulse (as in
+    the Hi-Lo scans, COINC_NS = SIMULATION_DURATION_NS).
+
+    Parameters
+    ----------
+    table : ExceedanceTable
+    n_channels_required : int
+    common_phase : bool
+        True if all channels see the same pulse phase (phase-averaged after
+        combining channels); False if each channel draws its own phase, as
+        in `make_full_signal_batch`.
+    z : float
+        Width of the binomial band in sigma, from the table's sample counts.
+
+    Returns
+    -------
+    efficiency, lower, upper : ndarray, shape (n_amplitudes,)
+    """
+    lo_k, hi_k = wilson_interval(table.counts, table.n_noise, z)
+    bands = []
+    for p in (table.probability, lo_k, hi_k):
+        p = np.moveaxis(p, 0, -1)                              # (n_phases, n_amplitudes, n_channels)
+        if common_phase:
+            eff = n_of_m_probability(p, n_channels_required).mean(axis=0)
+        else:
+            eff = n_of_m_probability(p.mean(axis=0), n_channels_required)
+        bands.append(eff)
+    # efficiency is monotone in every channel probability, so the channel
+    # bounds map onto efficiency bounds
+    return bands[0], bands[1], bands[2]
+
+def efficiency_at(target, amplitudes, efficiency):
+    """
+    Amplitude at which a monotone efficiency curve crosses `target`
+    (linear interpolation); nan if it never does.
+    """
+    efficiency = np.maximum.accumulate(np.asarray(efficiency, dtype=float))
+    if efficiency[0] > target or efficiency[-1] < target:
+        return np.nan
+    return float(np.interp(target, efficiency, amplitudes))
@@ -0,0 +1,154 @@
+import numpy as np
+
+
+# beam directions of the FLOWER phased trigger (degrees)
+BEAM_ANGLES_DEG = [
+    -60.0, -45.11838005, -33.44299614, -23.18167437, -13.66170567,
+    -4.51554582, 4.51554582, 13.66170567, 23.18167437, 33.44299614,
+    45.11838005, 60.0
+]
+
+n_ice = 1.78  #index of refraction in ice
+vertical_seperation = 1  #distance betwwen channel in meters
+c = 299792458  #speed of light in a vaccum in m/s
+EVENT_CHUNK = 1000  # events beamformed at once in beam_max_power (each makes ~n_beams x n_channels shifted copies)
+
+
+def plane_wave_delays_ns(angles_deg, n_channels=4, index=n_ice, distance=vertical_seperation, speed=c):
+    """
+    Arrival delay of a plane wave at each channel, relative to channel 0.
+
+    Parameters
+    ----------
+    angles_deg : array-like
+        Elevation angles in degrees.
+
+    Returns
+    -------
+    delays_ns : ndarray, shape (n_angles, n_channels)
+        ch * index * distance * sin(angle) / speed, in ns.
+    """
+    angles = np.deg2rad(np.atleast_1d(np.asarray(angles_deg, dtype=float)))
+    step_ns = index * distance * np.sin(angles) / speed * 1e9
+    return step_ns[:, None] * np.arange(n_channels)[None, :]
+
+def beam_delays_samples(beam_angles_deg, time_step, n_channels=4, **geometry):
+    """
+    Per-beam, per-channel delays in (fractional) samples used to phase up the
+    channels, shifted so the earliest channel of every beam has delay 0.
+
+    Returns
+    -------
+    delays : ndarray, shape (n_beams, n_channels)
+    """
+    delays = plane_wave_delays_ns(beam_angles_deg, n_channels, **geometry) / time_step
+    return delays - delays.min(axis=1, keepdims=True)
+
+def shift_signals(channel_signals, delays_samples):
+    """
+    Read every channel `delays_samples` later, with integer plus linear
+    fractional-sample shifts; samples shifted in from outside the window are 0.
+
+    Parameters
+    ----------
+    channel_signals : ndarray
+        Shape (..., n_channels, n_samples).
+    delays_samples : ndarray
+        Shape (n_channels,) or (n_beams, n_channels); negative values shift
+        the other way.
+
+    Returns
+    -------
+    shifted : ndarray, shape (..., [n_beams,] n_channels, n_samples)
+        shifted[..., ch, i] = x[..., ch, i + delay[ch]].
+    """
+    signals = np.asarray(channel_signals, dtype=float)
+    delays = np.asarray(delays_samples, dtype=float)
+    n_channels, n = signals.shape[-2:]
+
+    k = np.floor(delays).astype(int)
+    f = (delays - k)[..., None]
+    pad = int(np.max(np.abs(k))) + 1
+    padded = np.pad(signals, [(0, 0)] * (signals.ndim - 1) + [(pad, pad)])
+
+    ch = np.arange(n_channels)[:, None]
+    idx = np.arange(n)[None, :] + k[..., None] + pad          # (..., n_channels, n)
+    return (1 - f) * padded[..., ch, idx] + f * padded[..., ch, idx + 1]
+
+def beamform(channel_signals, delays_samples):
+    """
+    Delay-and-sum the channels for every beam.
+
+    Parameters
+    ----------
+    channel_signals : ndarray
+        Shape (..., n_channels, n_samples).
+    delays_samples : ndarray
+        Shape (n_beams, n_channels), see `beam_delays_samples`.
+
+    Returns
+    -------
+    beams : ndarray, shape (..., n_beams, n_samples)
+    """
+    return shift_signals(channel_signals, delays_samples).sum(axis=-2)
+
+def beam_power(beams, power_window_samples=8):
+    """
+    Power (sum of squares) of each beam in a sliding window of
+    `power_window_samples`, for every window start that fits in the trace.
+
+    Returns
+    -------
+    power : ndarray, shape (..., n_beams, n_samples - power_window_samples + 1)
+    """
+    sq = np.asarray(beams, dtype=float) ** 2
+    csum = np.zeros(sq.shape[:-1] + (sq.shape[-1] + 1,))
+    np.cumsum(sq, axis=-1, out=csum[..., 1:])
+    return csum[..., power_window_samples:] - csum[..., :-power_window_samples]
+
+def beam_max_power(channel_signals, delays_samples, power_window_samples=8, chunk_size=EVENT_CHUNK):
+    """
+    Maximum windowed power of every beam, the only statistic the phased
+    trigger decision needs; compute it once and compare against as many
+    threshold sets as needed.
+
+    An event ensemble (n_events, n_channels, n_samples) is beamformed
+    `chunk_size` events at a time, so the shifted copies stay small however
+    many events there are.
+
+    Returns
+    -------
+    max_power : ndarray, shape (..., n_beams)
+    """
+    channel_signals = np.asarray(channel_signals)
+    if channel_signals.ndim == 3 and channel_signals.shape[0] > chunk_size:
+        return np.concatenate([beam_max_power(channel_signals[i:i + chunk_size], delays_samples,
+                                              power_window_samples, chunk_size)
+                               for i in range(0, channel_signals.shape[0], chunk_size)])
+    beams = beamform(channel_signals, delays_samples)
+    return beam_power(beams, power_window_samples).max(axis=-1)
+
+def phased_triggered(channel_signals, delays_samples, *, threshold, power_window_samples=8):
+    """
+    Phased-array trigger decision.
+
+    Parameters
+    ----------
+    channel_signals : ndarray
+        Shape (n_channels, n_samples) or (n_events, n_channels, n_samples),
+        pedestal subtracted.
+    delays_samples : ndarray
+        Shape (n_beams, n_channels), see `beam_delays_samples`.
+    threshold : float | array-like
+        Power threshold, common or one per beam.
+    power_window_samples : int
+        Length of the power-sum window in samples.
+
+    Returns
+    -------
+    triggered : bool or ndarray of bool, shape (n_events,)
+    beams_fired : ndarray of bool, shape (..., n_beams)
+    """
+    max_power = beam_max_power(channel_signals, delays_samples, power_window_samples)
+    beams_fired = max_power > np.asarray(threshold, dtype=float)
+    return beams_fired.any(axis=-1), beams_fired
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import numpy as np
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:   # Windows: no lock, convert the caches before running in parallel
+    fcntl = None
+
+
+HERE = Path(__file__).resolve().parent
+REPO_ROOT = HERE.parent
+
+# directories searched for <name>.json, in order; extra directories can be
+# put in front with NUDELAY_RESPONSE_PATH (os.pathsep separated)
+RESPONSE_DIRS = [
+    HERE / "jsons",
+    REPO_ROOT / "Shams_analyzing_scripts" / "Hi_Lo_trigger" / "impulse_response_extraction",
+    REPO_ROOT / "Shams_analyzing_scripts" / "Hi_Lo_trigger",   # "sys_response_radiant_v3/<name>"
+]
+
+CACHE_SUFFIX = ".npcache"
+CACHE_VERSION = 1
+
+
+def _search_dirs():
+    extra = os.environ.get("NUDELAY_RESPONSE_PATH", "")
+    return [Path(p) for p in extra.split(os.pathsep) if p] + RESPONSE_DIRS
+
+def response_path(name):
+    """
+    Resolve a response name (JSON file name without extension, e.g.
+    "impulse_response_Freauency_35_240" or
+    "sys_response_radiant_v3/ch3_response_deep_atten62") or an explicit path
+    to the source JSON file.
+    """
+    path = Path(name)
+    if path.suffix == ".json" and path.exists():
+        return path
+    for directory in _search_dirs():
+        candidate = directory / f"{name}.json"
+        if candidate.exists():
+            return candidate
+    raise FileNotFoundError(f"response '{name}' not found in {[str(d) for d in _search_dirs()]}")
+
+def list_responses():
+    """Names of all responses found in the search directories."""
+    names = set()
+    for directory in _search_dirs():
+        if directory.is_dir():
+            names.update(str(p.relative_to(directory).with_suffix(""))
+                         for p in directory.glob("*.json"))
+            names.update(str(p.relative_to(directory).with_suffix(""))
+                         for p in directory.glob("sys_response_*/*.json"))
+    return sorted(names)
+
+
+def _sha1(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _json_to_arrays(data):
+    """
+    A dict of lists becomes one array per key; a list of records (as in the
+    RADIANT sys_response files) becomes one array per field, stacked over
+    the records. Ragged fields cannot be stored as plain arrays and are
+    skipped.
+    """
+    if isinstance(data, list):
+        keys = list(data[0]) if data and isinstance(data[0], dict) else []
+        fields = {key: [record.get(key) for record in data] for key in keys} if keys else {"data": data}
+    else:
+        fields = data
+
+    arrays = {}
+    for key, value in fields.items():
+        try:
+            array = np.asarray(value)
+        except ValueError:
+            array = None
+        if array is None or array.dtype == object:
+            print(f"[RESPONSE] skipping ragged field '{key}'")
+            continue
+        arrays[key] = array
+    return arrays, isinstance(data, list)
+
+def _write_cache(source, cache_dir, meta):
+    with open(source) as f:
+        arrays, is_records = _json_to_arrays(json.load(f))
+
+    cache_dir.mkdir(exist_ok=True)
+    # stale metadata goes first, so a half-written cache is never trusted
+    (cache_dir / "meta.json").unlink(missing_ok=True)
+    for old in cache_dir.glob("*.npy"):
+        old.unlink()
+    for i, (key, array) in enumerate(arrays.items()):
+        tmp = cache_dir / f".{i}.npy.tmp{os.getpid()}"
+        with open(tmp, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp, cache_dir / f"{i}.npy")
+
+    meta = dict(meta, keys=list(arrays), records=is_records)
+    tmp = cache_dir / f".meta.json.tmp{os.getpid()}"
+    tmp.write_text(json.dumps(meta, indent=2))
+    os.replace(tmp, cache_dir / "meta.json")
+    return meta
+
+@contextmanager
+def _cache_lock(cache_dir):
+    """
+    Exclusive lock on a cache directory across processes (e.g. the
+    scan_runner workers converting the same response on their first run),
+    held while the cache is checked, rebuilt and mapped.
+    """
+    cache_dir.mkdir(exist_ok=True)
+    if fcntl is None:
+        yield
+        return
+    with open(cache_dir / ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _cache_meta(source):
+    """
+    Metadata of an up-to-date cache for `source`, (re)building it if the
+    JSON changed. mtime and size are checked first; only when they differ
+    is the content hash compared, so a touched but unchanged file is not
+    converted again. Call with the _cache_lock of the cache held.
+    """
+    cache_dir = source.with_suffix(CACHE_SUFFIX)
+    stat = source.stat()
+    meta_path = cache_dir / "meta.json"
+    meta = json.loads(meta_path.read_text()) if meta_path.exists() else None
+
+    if meta is not None and meta.get("version") == CACHE_VERSION \
+            and meta["mtime_ns"] == stat.st_mtime_ns and meta["size"] == stat.st_size:
+        return cache_dir, meta
+
+    sha1 = _sha1(source)
+    if meta is not None and meta.get("version") == CACHE_VERSION and meta["sha1"] == sha1:
+        meta.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        tmp = cache_dir / f".meta.json.tmp{os.getpid()}"
+        tmp.write_text(json.dumps(meta, indent=2))
+        os.replace(tmp, meta_path)
+        return cache_dir, meta
+
+    print(f"[RESPONSE] converting {source.name} -> {cache_dir.name}")
+    meta = _write_cache(source, cache_dir, {"version": CACHE_VERSION, "source": source.name,
+                                            "mtime_ns": stat.st_mtime_ns, "size": stat.st_size,
+                                            "sha1": sha1})
+    return cache_dir, meta
+
+def load_response(name, mmap=True):
+    """
+    Load a response JSON through its binary cache.
+
+    The first call converts the JSON into one .npy per key in a
+    `<name>.npcache/` directory next to it; later calls read the arrays
+    directly (memory-mapped, read-only, if `mmap`). The cache is rebuilt
+    automatically when the JSON changes. Processes loading the same
+    response at the same time wait for each other (file lock), so only one
+    converts it and none reads a half-written cache.
+
+    Parameters
+    ----------
+    name : str | Path
+        Response name (see `response_path`) or path to the JSON file.
+    mmap : bool
+        Memory-map the arrays instead of reading them into memory.
+
+    Returns
+    -------
+    arrays : dict of ndarray
+        JSON keys -> arrays, e.g. {'freq_GHz': ..., 'ch2_2x_amp': ...}. For
+        a list of records (sys_response_radiant_v3) each field is stacked
+        over the records, e.g. arrays['radiant_waveforms'] has shape
+        (n_events, n_samples).
+    """
+    source = response_path(name)
+    mode = "r" if mmap else None
+    # a mapped array keeps its file alive, so a later rebuild cannot change it
+    with _cache_lock(source.with_suffix(CACHE_SUFFIX)):
+        cache_dir, meta = _cache_meta(source)
+        return {key: np.load(cache_dir / f"{i}.npy", mmap_mode=mode)
+                for i, key in enumerate(meta["keys"])}
@@ -0,0 +1,133 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from sim_functions import BandLimitedNoiseGenerator, PulseTemplateBank, make_full_signal_batch, coincidence_triggered
+
+
+# one noise generator per worker process, keyed by (json path, channel key)
+_NOISE_GENERATORS = {}
+
+def _get_noise_generator(impulse_json_path, channel_key):
+    key = (str(impulse_json_path), channel_key)
+    if key not in _NOISE_GENERATORS:
+        _NOISE_GENERATORS[key] = BandLimitedNoiseGenerator(impulse_json_path, channel_key=channel_key)
+    return _NOISE_GENERATORS[key]
+
+def _run_chunk(task):
+    """
+    Worker: simulate one chunk of trials at one amplitude and return
+    (amplitude_index, n_triggered).
+    """
+    amp_index, amplitude, n_trials, seed_seq, cfg = task
+    rng = np.random.default_rng(seed_seq)
+    noise_generator = _get_noise_generator(cfg["impulse_json_path"], cfg["channel_key"])
+    pulse_bank = PulseTemplateBank(cfg["pulse_voltage"], cfg["pulse_time"], cfg["time_step"],
+                                   cfg["simulation_duration_samples"], n_phases=cfg["n_pulse_phases"])
+
+    _, signals = make_full_signal_batch(noise_generator, n_trials, cfg["n_channels"],
+                                        SIMULATION_DURATION_NS=cfg["SIMULATION_DURATION_NS"],
+                                        SAMPLING_RATE=cfg["SAMPLING_RATE"],
+                                        NOISE_EQUALIZE=cfg["NOISE_EQUALIZE"],
+                                        pulse_voltage=cfg["pulse_voltage"],
+                                        pulse_time=cfg["pulse_time"],
+                                        time_step=cfg["time_step"],
+                                        simulation_duration_samples=cfg["simulation_duration_samples"],
+                                        amplitude_scale=amplitude,
+                                        max_signal=cfg["max_signal"],
+                                        rng=rng,
+                                        pulse_bank=pulse_bank)
+    triggered = coincidence_triggered(signals, cfg["time_step"],
+                                      threshold=cfg["threshold"],
+                                      coincidence_ns=cfg["coincidence_ns"],
+                                      n_channels_required=cfg["n_channels_required"])
+    return amp_index, int(np.count_nonzero(triggered))
+
+def run_efficiency_scan(impulse_json_path, pulse_voltage, pulse_time, amplitudes, *,
+                        threshold, coincidence_ns, n_channels_required,
+                        SIMULATION_DURATION_NS, SAMPLING_RATE, NOISE_EQUALIZE,
+                        simulation_duration_samples, max_signal,
+                        n_trials=40, n_channels=4, channel_key="ch2_2x_amp",
+                        n_pulse_phases=64, chunk_size=250, max_workers=None, seed=None, pool=None):
+    """
+    Trigger-efficiency scan spread over a process pool.
+
+    The trials of every amplitude are cut into chunks of at most
+    `chunk_size`, and each chunk gets its own generator spawned from
+    SeedSequence(seed). The chunking does not depend on `max_workers`, so
+    the same seed gives the same result on any number of workers.
+
+    Parameters
+    ----------
+    impulse_json_path : str | Path
+        Impulse-response JSON used for the noise spectrum.
+    pulse_voltage, pulse_time : ndarray
+        Normalised pulse template and its time axis (ns).
+    amplitudes : array-like
+        Pulse amplitudes (ADC) to scan.
+    n_trials : int
+        Trials per amplitude.
+    n_pulse_phases : int
+        Sub-sample pulse start offsets in the template bank.
+    max_workers : int | None
+        Worker processes (defaults to the number of cores); 1 runs serially
+        in this process.
+    pool : concurrent.futures.Executor | None
+        Process pool to run the chunks on instead of starting one (and
+        ignoring max_workers), for callers that run many small scans, such
+        as one adaptive point at a time.
+    seed : int | None
+        Root seed; None draws fresh entropy (recorded in the return value).
+
+    Returns
+    -------
+    pass_fraction : ndarray
+        Fraction of triggered trials per amplitude.
+    n_pass : ndarray
+        Number of triggered trials per amplitude (out of `n_trials`).
+    seed : int
+        Root entropy actually used, to reproduce the scan.
+    """
+    amplitudes = np.asarray(amplitudes)
+    root = np.random.SeedSequence(seed)
+    cfg = {
+        "impulse_json_path": str(impulse_json_path),
+        "channel_key": channel_key,
+        "n_channels": n_channels,
+        "pulse_voltage": np.asarray(pulse_voltage),
+        "pulse_time": np.asarray(pulse_time),
+        "threshold": list(threshold),
+        "coincidence_ns": coincidence_ns,
+        "n_channels_required": n_channels_required,
+        "SIMULATION_DURATION_NS": SIMULATION_DURATION_NS,
+        "SAMPLING_RATE": SAMPLING_RATE,
+        "NOISE_EQUALIZE": NOISE_EQUALIZE,
+        "time_step": 1.0 / SAMPLING_RATE,
+        "simulation_duration_samples": simulation_duration_samples,
+        "max_signal": max_signal,
+        "n_pulse_phases": n_pulse_phases,
+    }
+
+    chunk_sizes = [chunk_size] * (n_trials // chunk_size)
+    if n_trials % chunk_size:
+        chunk_sizes.append(n_trials % chunk_size)
+
+    tasks = []
+    for amp_index, (amplitude, amp_seq) in enumerate(zip(amplitudes, root.spawn(len(amplitudes)))):
+        for size, chunk_seq in zip(chunk_sizes, amp_seq.spawn(len(chunk_sizes))):
+            tasks.append((amp_index, float(amplitude), size, chunk_seq, cfg))
+
+    if pool is not None:
+        _get_noise_generator(impulse_json_path, channel_key)
+        results = list(pool.map(_run_chunk, tasks))
+    elif max_workers == 1:
+        results = list(map(_run_chunk, tasks))
+    else:
+        # convert the response cache here, once, rather than in every worker
+        _get_noise_generator(impulse_json_path, channel_key)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_run_chunk, tasks))
+
+    n_pass = np.zeros(len(amplitudes), dtype=int)
+    for amp_index, n_triggered in results:
+        n_pass[amp_index] += n_triggered
+
+    return n_pass / n_trials, n_pass, root.entropy
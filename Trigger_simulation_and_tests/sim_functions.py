@@ -6,8 +6,80 @@ import random
 import math
 import os
 import sys
+from response_library import load_response
 
 
+class BandLimitedNoiseGenerator:
+    """
+    Batched band-limited noise source.
+
+    Loads the magnitude response once and caches the interpolated Rayleigh
+    sigma for every (window_ns, adc_rate_ghz, oversample) grid it is asked
+    for, so repeated calls only cost one random draw and one irfft.
+
+    Parameters
+    ----------
+    json_path : str | Path
+        Impulse-response JSON containing keys 'freq_GHz' + channels, as a
+        path or a response_library name; read through the binary cache.
+    channel_key : str
+        Which channel’s magnitude to use as the band-pass shape.
+    """
+
+    def __init__(self, json_path, channel_key="ch0"):
+        data = load_response(json_path)
+        self.freq_ref = np.asarray(data["freq_GHz"])     # GHz
+        self.mag_ref  = np.asarray(data[channel_key])
+        self._grids = {}
+
+    def grid(self, window_ns, adc_rate_ghz=0.472, oversample=1):
+        """
+        Return (time_ns, sigma) for the requested FFT grid, building it on
+        first use.
+        """
+        key = (float(window_ns), float(adc_rate_ghz), int(oversample))
+        if key not in self._grids:
+            dt_ns   = 1.0 / (adc_rate_ghz * oversample)  # ns
+            N       = int(round(window_ns / dt_ns))
+            freq_GHz = np.fft.rfftfreq(N, d=dt_ns * 1e-9) / 1e9
+            sigma   = np.interp(freq_GHz, self.freq_ref, self.mag_ref, left=0.0, right=0.0)
+            self._grids[key] = (np.arange(N) * dt_ns, sigma)
+        return self._grids[key]
+
+    def generate(self, n_trials=1, n_channels=1, *,
+                 window_ns=1000.0,
+                 adc_rate_ghz=0.472,
+                 oversample=1,
+                 target_rms_mV=1.0,
+                 rng=None):
+        """
+        Return (time_ns, noise_mV) with noise_mV of shape
+        (n_trials, n_channels, n_samples).
+
+        Every trace is an independent realisation normalised to
+        `target_rms_mV`, drawn with one vectorised Rayleigh/phase draw and
+        one batched irfft.
+        """
+        time_ns, sigma = self.grid(window_ns, adc_rate_ghz, oversample)
+        N = time_ns.size
+        shape = (n_trials, n_channels, sigma.size)
+
+        # ---------- draw random spectrum ---------------
+        rng = rng or np.random.default_rng()
+        amp   = rng.rayleigh(scale=np.broadcast_to(sigma, shape))
+        phase = rng.uniform(0, 2*np.pi, size=shape)
+        spec  = amp * np.exp(1j * phase)
+
+        # ---------- IFFT to time domain ----------------
+        noise = np.fft.irfft(spec, n=N, axis=-1)
+
+        # ---------- normalise RMS ----------------------
+        rms = np.sqrt(np.mean(noise ** 2, axis=-1, keepdims=True))
+        rms[rms == 0] = 1.0
+        noise_mV = noise / rms * target_rms_mV
+
+        return time_ns, noise_mV
+
 def make_band_limited_noise(json_path,
                             channel_key="ch0",
                             window_ns=1000.0,  # length of the output trace in ns
@@ -43,40 +115,18 @@ def make_band_limited_noise(json_path,
     noise_mV : 1-D ndarray
         Band-limited noise in millivolts, rms ≈ `target_rms_mV`.
     """
-    # ---------- load magnitude response ------------
-    data = json.loads(Path(json_path).read_text())
-    freq_ref   = np.asarray(data["freq_GHz"])        # GHz
-    mag_ref    = np.asarray(data[channel_key])
-
-    # ---------- define FFT grid --------------------
-    dt_ns  = 1.0 / (adc_rate_ghz * oversample)       # ns
-    N      = int(round(window_ns / dt_ns))
-    dt_s   = dt_ns * 1e-9
-    freq_Hz = np.fft.rfftfreq(N, d=dt_s)
-    freq_GHz = freq_Hz / 1e9
+    generator = BandLimitedNoiseGenerator(json_path, channel_key=channel_key)
+    time_ns, noise_mV = generator.generate(n_trials=1, n_channels=1,
+                                           window_ns=window_ns,
+                                           adc_rate_ghz=adc_rate_ghz,
+                                           oversample=oversample,
+                                           target_rms_mV=target_rms_mV,
+                                           rng=rng)
+    return time_ns, noise_mV[0, 0]
 
-    # ---------- interpolate → Rayleigh σ -----------
-    sigma = np.interp(freq_GHz, freq_ref, mag_ref, left=0.0, right=0.0)
-
-    # ---------- draw random spectrum ---------------
-    rng = rng or np.random.default_rng()
-    amp   = rng.rayleigh(scale=sigma)
-    phase = rng.uniform(0, 2*np.pi, size=amp.size)
-    spec  = amp * np.exp(1j * phase)
-
-    # ---------- IFFT to time domain ----------------
-    noise = np.fft.irfft(spec, n=N)
-
-    # ---------- normalise RMS ----------------------
-    rms = np.sqrt(np.mean(noise ** 2)) or 1.0
-    noise_mV = noise / rms * target_rms_mV
-
-    time_ns = np.arange(N) * dt_ns
-    return time_ns, noise_mV
-
-def generate_pulse (pulse_v, pulse_t , STEP, simulation_index_duration, amplitude_scale):
-    start_time= random.uniform(0, STEP)
-    start_index= np.argmin(np.where(pulse_t >= start_time)[0])
+def generate_pulse (pulse_v, pulse_t , STEP, simulation_index_duration, amplitude_scale, rng=None):
+    start_time= rng.uniform(0, STEP) if rng is not None else random.uniform(0, STEP)
+    start_index= np.searchsorted(pulse_t, start_time)   # first sample at or after start_time
     pulse_indices= np.linspace(start_index, len(pulse_v)-1, simulation_index_duration, dtype=int)
     
 
@@ -86,6 +136,51 @@ def generate_pulse (pulse_v, pulse_t , STEP, simulation_index_duration, amplitud
     signal = pulse_v[pulse_indices] * amplitude_scale  # Scale the pulse voltage
     return signal
 
+class PulseTemplateBank:
+    """
+    Pulse templates precomputed at `n_phases` sub-sample start offsets.
+
+    Each template is resampled exactly as in `generate_pulse`, for start
+    times k * STEP / n_phases, k = 0 … n_phases-1; drawing pulses is then a
+    gather from the bank and a broadcast amplitude scale. `n_phases` sets
+    the timing-jitter resolution.
+
+    Parameters
+    ----------
+    pulse_v, pulse_t : ndarray
+        Normalised pulse voltage and its time axis (ns, ascending).
+    STEP : float
+        ADC sample spacing (ns); start offsets are drawn from [0, STEP).
+    simulation_index_duration : int
+        Samples per template.
+    n_phases : int
+        Number of sub-sample offsets in the bank.
+    """
+
+    def __init__(self, pulse_v, pulse_t, STEP, simulation_index_duration, n_phases=64):
+        pulse_v = np.asarray(pulse_v)
+        start_times = np.arange(n_phases) * STEP / n_phases
+        start_indices = np.searchsorted(np.asarray(pulse_t), start_times)
+        self.templates = np.stack([
+            pulse_v[np.linspace(start_index, len(pulse_v)-1, simulation_index_duration, dtype=int)]
+            for start_index in start_indices
+        ])                                                  # (n_phases, n_samples)
+        self.start_times = start_times
+        self.n_phases = n_phases
+
+    def draw(self, amplitude_scale, size, rng=None):
+        """
+        Return pulses of shape size + (n_samples,) with random phases.
+
+        `amplitude_scale` is broadcast against `size`, so a per-trial or
+        per-channel amplitude array can be passed, e.g. shape (n_trials,)
+        for size (n_trials,) or (n_trials, 1) for size (n_trials, n_channels).
+        """
+        rng = rng or np.random.default_rng()
+        phase_index = rng.integers(self.n_phases, size=size)
+        amplitude = np.broadcast_to(np.asarray(amplitude_scale, dtype=float), phase_index.shape)
+        return self.templates[phase_index] * amplitude[..., None]
+
 def digitize_signal(signal, max_signal):
     """
     Digitize the signal to the ADC range.
@@ -110,6 +205,34 @@ def make_full_signal(impulse_json_path, SIMULATION_DURATION_NS, SAMPLING_RATE, N
     full_signal = full_signal[:simulation_duration_samples]  # Ensure the signal length matches the
     return t, full_signal
 
+def make_full_signal_batch(noise_generator, n_trials, n_channels, SIMULATION_DURATION_NS, SAMPLING_RATE, NOISE_EQUALIZE,
+                           pulse_voltage, pulse_time, time_step, simulation_duration_samples, amplitude_scale, max_signal,
+                           rng=None, pulse_bank=None):
+    """
+    Batched version of `make_full_signal`.
+
+    Returns (time_ns, signals) with signals of shape
+    (n_trials, n_channels, simulation_duration_samples), using one draw from
+    `noise_generator` (a BandLimitedNoiseGenerator) for the whole block and
+    one gather from `pulse_bank` (a PulseTemplateBank, built from
+    pulse_voltage/pulse_time if not given) for the pulses.
+    """
+    rng = rng or np.random.default_rng()
+    t, noise = noise_generator.generate(n_trials, n_channels,
+                                        window_ns=SIMULATION_DURATION_NS,
+                                        adc_rate_ghz=SAMPLING_RATE,
+                                        oversample=1,
+                                        target_rms_mV=NOISE_EQUALIZE,
+                                        rng=rng)
+    noise = noise[..., :simulation_duration_samples]
+
+    if pulse_bank is None:
+        pulse_bank = PulseTemplateBank(pulse_voltage, pulse_time, time_step, noise.shape[-1])
+    pulses = pulse_bank.draw(amplitude_scale, noise.shape[:-1], rng=rng)
+
+    full_signal = digitize_signal(noise + pulses, max_signal)
+    return t[:simulation_duration_samples], full_signal
+
 def plot_4_channels_signals(time_axis, channel_signals, title="4 Channels Signals"):
     """
     Plot signals from 4 channels on the same graph.
@@ -195,4 +318,122 @@ def find_triggers(channel_signals, time_axis, *,            # ← positional, ke
         while i < len(hits) and hits[i][0] - t0 <= half_window:
             i += 1
 
-    return triggers
\ No newline at end of file
+    return triggers
+
+def channel_hit_windows(channel_signals, threshold, window_samples):
+    """
+    Per-channel "hit within window" masks.
+
+    Parameters
+    ----------
+    channel_signals : ndarray
+        Shape (..., n_channels, n_samples); a single event or a batch.
+    threshold : array-like
+        One threshold per channel.
+    window_samples : int
+        Window length in samples, counted forward from each sample.
+
+    Returns
+    -------
+    hit_window : ndarray of bool, shape (..., n_channels, n_samples)
+        True at sample i if the channel is above threshold anywhere in
+        samples [i, i + window_samples].
+    """
+    signals = np.asarray(channel_signals)
+    hits = signals > np.asarray(threshold)[:, None]
+
+    n = hits.shape[-1]
+    csum = np.zeros(hits.shape[:-1] + (n + 1,), dtype=np.int32)
+    np.cumsum(hits, axis=-1, out=csum[..., 1:])
+    stop = np.minimum(np.arange(n) + window_samples + 1, n)
+    return (csum[..., stop] - csum[..., :n]) > 0
+
+def coincidence_triggered(channel_signals, time_step, *,
+                          threshold, coincidence_ns=160,
+                          n_channels_required=2):
+    """
+    Vectorised coincidence trigger decision.
+
+    Same `threshold`, `coincidence_ns` and `n_channels_required` meaning as
+    `find_triggers`: an event triggers if at least `n_channels_required`
+    distinct channels are hit within coincidence_ns/2 of an opening hit.
+    Unlike the greedy grouping in `find_triggers`, every hit may open a
+    window, so coincidences straddling two groups are not lost.
+
+    Parameters
+    ----------
+    channel_signals : ndarray
+        Shape (n_channels, n_samples) or (n_events, n_channels, n_samples).
+    time_step : float
+        Sample spacing (ns).
+
+    Returns
+    -------
+    triggered : bool or ndarray of bool, shape (n_events,)
+    """
+    window_samples = int(np.floor(coincidence_ns / 2.0 / time_step + 1e-9))
+    hit_window = channel_hit_windows(channel_signals, threshold, window_samples)
+    n_hit = hit_window.sum(axis=-2)
+    return np.any(n_hit >= n_channels_required, axis=-1)
+
+def coincidence_window_max(channel_signals, time_step, coincidence_ns=160):
+    """
+    Per-channel maximum inside the coincidence window opened at every sample.
+
+    These summaries are all a threshold scan needs: a channel is hit in the
+    window opened at sample i exactly when window_max[..., ch, i] is above
+    its threshold, so trigger rates for any threshold set can be computed
+    from them without regenerating noise (see `threshold_scan`).
+
+    Parameters
+    ----------
+    channel_signals : ndarray
+        Shape (..., n_channels, n_samples).
+    time_step : float
+        Sample spacing (ns).
+    coincidence_ns : float
+        Coincidence window, same meaning as in `find_triggers`.
+
+    Returns
+    -------
+    window_max : ndarray, shape (..., n_channels, n_samples)
+        Max of samples [i, i + coincidence_ns/2] per channel.
+    """
+    window_samples = int(np.floor(coincidence_ns / 2.0 / time_step + 1e-9))
+    signals = np.asarray(channel_signals, dtype=float)
+    pad = [(0, 0)] * (signals.ndim - 1) + [(0, window_samples)]
+    padded = np.pad(signals, pad, constant_values=-np.inf)
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window_samples + 1, axis=-1)
+    return windows.max(axis=-1)
+
+def threshold_scan(window_max, thresholds, n_channels_required=(2,)):
+    """
+    Count triggered events for a grid of thresholds and N-of-M settings.
+
+    Parameters
+    ----------
+    window_max : ndarray
+        Output of `coincidence_window_max`, shape (n_events, n_channels, n_samples).
+    thresholds : array-like
+        Shape (n_thresholds, n_channels); a 1-D array is taken as a common
+        threshold applied to every channel.
+    n_channels_required : sequence of int
+        N_REQ values to evaluate.
+
+    Returns
+    -------
+    n_triggered : ndarray of int, shape (n_thresholds, len(n_channels_required))
+    """
+    window_max = np.asarray(window_max)
+    n_channels = window_max.shape[-2]
+    thresholds = np.asarray(thresholds, dtype=float)
+    if thresholds.ndim == 1:
+        thresholds = np.repeat(thresholds[:, None], n_channels, axis=1)
+
+    n_triggered = np.zeros((len(thresholds), len(n_channels_required)), dtype=int)
+    for i, thr in enumerate(thresholds):
+        n_hit = (window_max > thr[:, None]).sum(axis=-2)      # (n_events, n_samples)
+        max_hit = n_hit.max(axis=-1)                          # best window per event
+        for j, n_req in enumerate(n_channels_required):
+            n_triggered[i, j] = np.count_nonzero(max_hit >= n_req)
+    return n_triggered
@@ -8,6 +8,7 @@ import time
 import random
 import json
 from pathlib import Path
+from response_library import load_response
 from sim_functions import make_band_limited_noise, generate_pulse, digitize_signal, make_full_signal
 
 #parameters
@@ -23,8 +24,7 @@ print(TIME_STEP, SIMULATION_DURATION_NS, SIMULATION_DURATION_SAMPLES)
 
 
 #preparring the sample pulse
-with open('/home/shamshassiki/Shams_Analyzing_scripts/Trigger_simulation_and_tests/jsons/upsampled_2filter_pulse_example.json') as f:
-    pulse_data = json.load(f)
+pulse_data = load_response("upsampled_2filter_pulse_example")
 
 pulse_voltage = np.array(pulse_data['avg_wave'])
 pulse_time = np.array(pulse_data['t_axis_ns'])
@@ -35,7 +35,7 @@ pulse_time = pulse_time - pulse_time[0]  # Start from 0 ns
 
 
 #Noise makier
-impulse_response_path   = Path("/home/shamshassiki/Shams_Analyzing_scripts/Trigger_simulation_and_tests/jsons/impulse_response_Freauency_35_240.json")
+impulse_response_path   = "impulse_response_Freauency_35_240"
 
 
 
@@ -0,0 +1,158 @@
+import numpy as np
+from scipy.fft import next_fast_len
+from sim_functions import BandLimitedNoiseGenerator
+
+
+class StreamingNoiseGenerator:
+    """
+    Continuous band-limited noise, produced block by block.
+
+    White Gaussian noise is filtered with an FIR kernel built from the
+    magnitude response (overlap-save), so the spectrum is correct across
+    block edges and memory stays bounded by one block plus the kernel.
+    Drawing Gaussian white noise and shaping it by |H| gives the same
+    statistics as the Rayleigh-amplitude / uniform-phase draw in
+    `make_band_limited_noise`.
+
+    Parameters
+    ----------
+    json_path : str | Path
+        Path to impulse-response JSON containing keys 'freq_GHz' + channels.
+    channel_key : str
+        Which channel’s magnitude to use as the band-pass shape.
+    n_channels : int
+        Independent channels per block.
+    adc_rate_ghz : float
+        Sampling rate (GHz).
+    target_rms_mV : float
+        RMS of the output stream.
+    kernel_samples : int
+        Length of the FIR kernel; sets the frequency resolution of the shape.
+    rng : numpy.random.Generator | None
+    """
+
+    def __init__(self, json_path, channel_key="ch0", n_channels=4, adc_rate_ghz=0.472,
+                 target_rms_mV=1.0, kernel_samples=1024, rng=None):
+        dt_ns = 1.0 / adc_rate_ghz
+        _, sigma = BandLimitedNoiseGenerator(json_path, channel_key).grid(kernel_samples * dt_ns, adc_rate_ghz)
+
+        # zero-phase response → centred, windowed FIR kernel
+        kernel = np.roll(np.fft.irfft(sigma, n=kernel_samples), kernel_samples // 2)
+        kernel *= np.hanning(kernel_samples)
+        self.kernel = kernel * target_rms_mV / np.sqrt(np.sum(kernel ** 2))
+
+        self.n_channels = n_channels
+        self.dt_ns = dt_ns
+        self.rng = rng or np.random.default_rng()
+        self._history = self.rng.standard_normal((n_channels, kernel_samples - 1))
+        self._fft_cache = {}
+        self.samples_generated = 0
+
+    def _kernel_fft(self, n_fft):
+        if n_fft not in self._fft_cache:
+            self._fft_cache[n_fft] = np.fft.rfft(self.kernel, n=n_fft)
+        return self._fft_cache[n_fft]
+
+    def next_block(self, n_samples):
+        """
+        Return the next (n_channels, n_samples) block of the stream.
+
+        The FFT is zero-padded to a fast length; n_samples + kernel_samples - 1
+        a power of two (see fast_block_samples) avoids the padding.
+        """
+        white = self.rng.standard_normal((self.n_channels, n_samples))
+        extended = np.concatenate([self._history, white], axis=-1)
+        n_extended = extended.shape[-1]
+        n_fft = next_fast_len(n_extended, real=True)
+
+        filtered = np.fft.irfft(np.fft.rfft(extended, n=n_fft, axis=-1) * self._kernel_fft(n_fft), n=n_fft, axis=-1)
+        self._history = extended[:, -(self.kernel.size - 1):]
+        self.samples_generated += n_samples
+        return filtered[:, self.kernel.size - 1:n_extended]
+
+    def fast_block_samples(self, n_fft=2**16):
+        """Block length whose FFT (block + kernel history) is exactly n_fft points."""
+        return n_fft - self.kernel.size + 1
+
+
+class StreamingCoincidenceTrigger:
+    """
+    Hi-Lo coincidence trigger run over consecutive blocks with carry-over.
+
+    Same `threshold`, `coincidence_ns` and `n_channels_required` meaning as
+    `sim_functions.coincidence_triggered`. The last coincidence window of
+    hits is carried into the next block, so coincidences across block edges
+    are found, and a trigger is counted once per continuous stretch of
+    satisfied windows (also across edges).
+    """
+
+    def __init__(self, time_step, *, threshold, coincidence_ns=160, n_channels_required=2):
+        self.window_samples = int(np.floor(coincidence_ns / 2.0 / time_step + 1e-9))
+        self.threshold = np.asarray(threshold, dtype=float)[:, None]
+        self.n_channels_required = n_channels_required
+        self._carry = np.zeros((len(threshold), self.window_samples), dtype=bool)
+        self._carry_start = -self.window_samples   # absolute sample index of _carry[:, 0]
+        self._last_state = False
+        self.n_triggers = 0
+        self.trigger_samples = []
+
+    def process(self, block):
+        """
+        Feed the next (n_channels, n_samples) block; returns the absolute
+        sample indices of triggers that started in it.
+        """
+        W = self.window_samples
+        hits = np.concatenate([self._carry, np.asarray(block) > self.threshold], axis=-1)
+        n = hits.shape[-1]
+
+        # only windows that are complete in this buffer are decided now
+        n_starts = n - W
+        csum = np.zeros((hits.shape[0], n + 1), dtype=np.int32)
+        np.cumsum(hits, axis=-1, out=csum[:, 1:])
+        starts = np.arange(n_starts)
+        in_window = (csum[:, starts + W + 1] - csum[:, starts]) > 0
+        state = in_window.sum(axis=0) >= self.n_channels_required
+
+        rising = state & ~np.concatenate([[self._last_state], state[:-1]])
+        new_triggers = (np.nonzero(rising)[0] + self._carry_start).tolist()
+
+        if n_starts:
+            self._last_state = bool(state[-1])
+        self._carry = hits[:, n_starts:]
+        self._carry_start += n_starts
+        self.n_triggers += len(new_triggers)
+        self.trigger_samples.extend(new_triggers)
+        return new_triggers
+
+
+def simulate_noise_trigger_rate(json_path, live_time_s, *, threshold, coincidence_ns=160,
+                                n_channels_required=2, channel_key="ch2_2x_amp", n_channels=4,
+                                adc_rate_ghz=0.472, target_rms_mV=5.0, block_samples=None,
+                                rng=None, progress=True):
+    """
+    Noise-only trigger rate from `live_time_s` of continuous simulated data,
+    in constant memory. block_samples defaults to a block whose FFT is
+    2**16 points (StreamingNoiseGenerator.fast_block_samples).
+
+    Returns
+    -------
+    rate_hz : float
+        Triggers per second of live time.
+    n_triggers : int
+    live_time_s : float
+        Live time actually simulated (whole blocks).
+    """
+    noise = StreamingNoiseGenerator(json_path, channel_key, n_channels=n_channels,
+                                    adc_rate_ghz=adc_rate_ghz, target_rms_mV=target_rms_mV, rng=rng)
+    trigger = StreamingCoincidenceTrigger(noise.dt_ns, threshold=threshold, coincidence_ns=coincidence_ns,
+                                          n_channels_required=n_channels_required)
+
+    block_samples = block_samples or noise.fast_block_samples()
+    n_blocks = int(np.ceil(live_time_s / (block_samples * noise.dt_ns * 1e-9)))
+    for i in range(n_blocks):
+        trigger.process(noise.next_block(block_samples))
+        if progress and (i % 100 == 0 or i == n_blocks - 1):
+            print(f"\r Progress: {i+1}/{n_blocks} blocks, {trigger.n_triggers} triggers", end='')
+
+    simulated_s = noise.samples_generated * noise.dt_ns * 1e-9
+    return trigger.n_triggers / simulated_s, trigger.n_triggers, simulated_s